@@ -0,0 +1,501 @@
+"""
+WebUI 基准测试：本地 SQLite + 进程内 ASGI 调用，不经过网络
+
+    python benchmarks/bench.py --duration 10 --output result.json
+    python benchmarks/bench.py --duration 10 --baseline result.json
+
+以下场景在 `--duration` 秒内同时运行：
+- events：按 `--event-rate` 通过事件系统发布合成的 SendResponse，经 count_sent 计数
+- http：`--concurrency` 个协程轮流请求首页与插件接口
+- ws_log：`--subscribers` 个 /ws/log 订阅者，按 `--log-rate` 写日志，统计推送延迟
+
+正式计时前还会测量插件的导入与加载耗时（子进程中），以及无人订阅 / 有人订阅
+日志时单次日志调用的开销。结果为 JSON（吞吐、p50 / p99 延迟、峰值内存），指定 `--baseline` 时与基线比较，
+超出 `--tolerance` 的退化会列在 `regressions` 中并以退出码 1 结束
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+ENDPOINTS = [
+    "/api/init_data",
+    "/api/stats/range",
+    "/api/plugins",
+    "/api/plugins?fields=id,status",
+]
+LOG_MARK = re.compile(r"bench-log ([0-9.]+)")
+
+CONFIG = """\
+basic:
+  network: []
+  log:
+    level: INFO
+plugins:
+  database:
+    type: sqlite
+    name: {database}
+    driver: aiosqlite
+  server:
+    host: 127.0.0.1
+    port: 5100
+  webui: {{}}
+"""
+
+
+# ---------- 统计 ----------
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    def observe(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def summary(self, elapsed: float, **extra) -> dict:
+        values = sorted(self.latencies)
+        ms = lambda v: round(v * 1000, 3)
+        return {
+            "count": len(values),
+            "errors": self.errors,
+            "throughput": round(len(values) / elapsed, 1) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "p50": ms(percentile(values, 50)),
+                "p99": ms(percentile(values, 99)),
+                "max": ms(values[-1]) if values else 0.0,
+                "mean": ms(sum(values) / len(values)) if values else 0.0,
+            },
+            **extra,
+        }
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ---------- 启动与日志调用开销 ----------
+IMPORT_PROBE = """\
+import sys, time
+from arclet.entari import Entari
+from launart import Launart
+app = Entari.load(sys.argv[1])
+begin = time.perf_counter()
+app.ensure_manager(Launart())  # 在这里导入并加载配置中的插件
+print("LOAD_SECONDS", time.perf_counter() - begin)
+"""
+
+
+def _load_seconds(config: Path) -> Optional[float]:
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE, str(config)],
+        cwd=config.parent,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("LOAD_SECONDS "):
+            return float(line.split()[1])
+    return None
+
+
+def measure_import(config: Path, repeat: int = 3) -> Optional[float]:
+    """插件的导入与加载耗时（毫秒）：分别在子进程中加载带 / 不带 webui 的配置，取各自最小值之差"""
+    without = config.with_name("entari-without-webui.yml")
+    without.write_text(
+        "".join(line for line in config.read_text(encoding="utf-8").splitlines(True) if not line.strip().startswith("webui:")),
+        encoding="utf-8",
+    )
+    samples = {}
+    for name, path in (("with", config), ("without", without)):
+        values = [v for v in (_load_seconds(path) for _ in range(repeat)) if v is not None]
+        if not values:
+            return None
+        samples[name] = min(values)
+    return round((samples["with"] - samples["without"]) * 1000, 1)
+
+
+async def measure_log_calls(webui, calls: int) -> dict:
+    """单次日志调用耗时（微秒）；控制台 sink 换成同样格式、直接丢弃输出的 sink，避免终端 IO 干扰"""
+    import arclet.entari.logger as entari_log
+    from loguru import logger
+
+    console = logger.add(
+        lambda _: None, level=0, colorize=True, filter=entari_log.default_filter, format=entari_log._custom_format
+    )
+
+    def measure(level: str) -> float:
+        log = logger.opt().log
+        begin = time.perf_counter()
+        for i in range(calls):
+            log(level, "bench-call {}", i)
+        return round((time.perf_counter() - begin) / calls * 1e6, 2)
+
+    result = {"calls": calls, "sink_attached_idle": webui.log_capture.attached}
+    try:
+        for level in ("DEBUG", "INFO"):
+            idle = measure(level)
+            sub = webui.log_buffer.subscribe()
+            try:
+                subscribed = measure(level)
+            finally:
+                webui.log_buffer.unsubscribe(sub)
+            result[level] = {"idle_us": idle, "subscribed_us": subscribed}
+    finally:
+        logger.remove(console)
+    return result
+
+
+# ---------- 进程内 WebSocket 客户端 ----------
+class WebSocketClient:
+    """直接驱动 ASGI 应用的 WebSocket 连接，收到的每一帧交给 on_frame"""
+
+    def __init__(self, app, path: str, on_frame):
+        self.app = app
+        self.path = path
+        self.on_frame = on_frame
+        self.frames = 0
+        self.kicked = False
+        self._connected = False
+        self._closed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _receive(self):
+        if not self._connected:
+            self._connected = True
+            return {"type": "websocket.connect"}
+        await self._closed.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def _send(self, message):
+        if message["type"] == "websocket.send":
+            self.frames += 1
+            text = message.get("text") or ""
+            if text.startswith("日志推送积压过多"):
+                self.kicked = True
+            self.on_frame(text)
+        elif message["type"] == "websocket.close":
+            self._closed.set()
+
+    def start(self):
+        path, _, query = self.path.partition("?")
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": [],
+        }
+        self._task = asyncio.create_task(self.app(scope, self._receive, self._send))
+
+    async def close(self):
+        self._closed.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, 5)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+
+
+# ---------- 场景 ----------
+async def run_events(rate: float, deadline: float, platforms: int) -> Recorder:
+    """开环发布：落后于计划时不再等待，实际吞吐即为处理能力"""
+    from arclet.letoderea import es
+    from arclet.entari import MessageChain
+    from arclet.entari.event.send import SendResponse
+    from satori.client import Account
+    from satori.client.config import WebsocketsInfo
+    from satori.model import Login, LoginStatus, User
+
+    accounts = [
+        Account(Login(i, LoginStatus.ONLINE, "bench", f"bench-{i}", User(str(10000 + i))), WebsocketsInfo(), [])
+        for i in range(platforms)
+    ]
+    message = MessageChain("bench")
+    recorder = Recorder()
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        target = start + sent / rate
+        if target > now:
+            await asyncio.sleep(target - now)
+        begin = time.perf_counter()
+        try:
+            await es.publish(SendResponse(accounts[sent % platforms], "bench", message, []))
+        except Exception:
+            recorder.errors += 1
+        else:
+            recorder.observe(time.perf_counter() - begin)
+        sent += 1
+    return recorder
+
+
+async def run_http(client, endpoints: list[str], concurrency: int, deadline: float, etag: bool) -> dict[str, Recorder]:
+    recorders = {path: Recorder() for path in endpoints}
+
+    async def worker(offset: int):
+        etags: dict[str, str] = {}
+        i = offset
+        while time.perf_counter() < deadline:
+            path = endpoints[i % len(endpoints)]
+            i += 1
+            headers = {"If-None-Match": etags[path]} if etag and path in etags else None
+            begin = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            elapsed = time.perf_counter() - begin
+            if response.status_code >= 400:
+                recorders[path].errors += 1
+                continue
+            recorders[path].observe(elapsed)
+            if "etag" in response.headers:
+                etags[path] = response.headers["etag"]
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return recorders
+
+
+async def run_log_fanout(app, subscribers: int, rate: float, deadline: float, token: str, log_format: str = "text"):
+    from loguru import logger
+
+    recorder = Recorder()
+    received = 0
+
+    def on_frame(text: str):
+        nonlocal received
+        now = time.perf_counter()
+        for stamp in LOG_MARK.findall(text):
+            received += 1
+            recorder.observe(now - float(stamp))
+
+    clients = [WebSocketClient(app, f"/ws/log?format={log_format}&token={token}", on_frame) for _ in range(subscribers)]
+    for client in clients:
+        client.start()
+    await asyncio.sleep(0.1)  # 等待订阅建立，回放的历史日志不计入
+
+    written = 0
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        target = start + written / rate
+        now = time.perf_counter()
+        if target > now:
+            await asyncio.sleep(target - now)
+        logger.info(f"bench-log {time.perf_counter()!r}")
+        written += 1
+    await asyncio.sleep(0.2)  # 让最后一批推送送达
+    for client in clients:
+        await client.close()
+    return recorder, {
+        "subscribers": subscribers,
+        "format": log_format,
+        "lines_written": written,
+        "lines_received": received,
+        "expected": written * subscribers,
+        "frames": sum(c.frames for c in clients),
+        "kicked": sum(1 for c in clients if c.kicked),
+    }
+
+
+# ---------- 基线比较 ----------
+def compare(current: dict, baseline: dict, tolerance: float) -> tuple[dict, list[str]]:
+    comparison: dict[str, dict] = {}
+    regressions: list[str] = []
+
+    def check(key: str, old, new, higher_is_better: bool):
+        if not old or new is None:
+            return
+        change = (new - old) / old
+        comparison[key] = {"baseline": old, "current": new, "change": round(change, 3)}
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(key)
+
+    for name, scenario in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        check(f"{name}.throughput", old["throughput"], scenario["throughput"], True)
+        check(f"{name}.p99_ms", old["latency_ms"]["p99"], scenario["latency_ms"]["p99"], False)
+    check("startup.import_ms", baseline.get("startup", {}).get("import_ms"), current["startup"].get("import_ms"), False)
+    check("memory.peak_rss_mb", baseline.get("memory", {}).get("peak_rss_mb"), current["memory"]["peak_rss_mb"], False)
+    return comparison, regressions
+
+
+# ---------- 入口 ----------
+async def bench(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="webui-bench-"))
+    config = workdir / "entari.yml"
+    config.write_text(CONFIG.format(database=(workdir / "bench.db").as_posix()), encoding="utf-8")
+    # 插件在当前目录下创建 logs / configs / instances
+    os.chdir(workdir)
+
+    import httpx
+    from launart import Launart
+    from arclet.entari import Entari
+    import arclet.entari.logger as entari_log
+    from loguru import logger
+
+    # 控制台输出会干扰计时，也会污染 stdout 上的 JSON
+    try:
+        logger.remove(entari_log.logger_id)
+    except ValueError:
+        pass
+    app = Entari.load(str(config))
+    app.ensure_manager(Launart())
+
+    import entari_plugin_webui as webui
+    from entari_plugin_database import service
+    from entari_plugin_server import server
+
+    # init_db 会改写打包目录中的 runtime.json，结束后还原
+    runtime = webui.RUNTIME_CONF.read_bytes() if webui.RUNTIME_CONF.exists() else None
+    startup = {"import_ms": measure_import(config) if args.import_time else None}
+    await service.initialize()
+    # 正常运行时由 database 插件的服务建表
+    async with service.engines[""].begin() as conn:
+        await conn.run_sync(service.base_class.metadata.create_all)
+    await webui.init_db.callable_target()
+
+    if args.tracemalloc:
+        import tracemalloc
+
+        tracemalloc.start()
+    rss_start = webui.resource_sampler.probe.rss()
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.post("/api/login", json={"name": "Entari", "password": "114514"})
+            client.headers["Authorization"] = response.json()["token"]
+            endpoints = args.endpoint or ENDPOINTS
+            for path in endpoints:  # 预热：首个请求会填充缓存
+                await client.get(path)
+            if args.log_calls > 0:
+                startup["log_calls"] = await measure_log_calls(webui, args.log_calls)
+
+            started = time.perf_counter()
+            deadline = started + args.duration
+            jobs = [
+                run_events(args.event_rate, deadline, args.platforms) if args.event_rate > 0 else None,
+                run_http(client, endpoints, args.concurrency, deadline, args.etag) if args.concurrency > 0 else None,
+                run_log_fanout(server.app, args.subscribers, args.log_rate, deadline, client.headers["Authorization"], args.log_format)
+                if args.subscribers > 0 and args.log_rate > 0
+                else None,
+            ]
+            events, http, logs = await asyncio.gather(*(job if job else asyncio.sleep(0) for job in jobs))
+            elapsed = time.perf_counter() - started
+    finally:
+        await webui.flush_on_cleanup.callable_target()
+        for engine in service.engines.values():
+            await engine.dispose()
+        if runtime is not None:
+            webui.RUNTIME_CONF.write_bytes(runtime)
+
+    scenarios: dict[str, dict] = {}
+    if events:
+        scenarios["events"] = events.summary(elapsed, target_rate=args.event_rate)
+    for path, recorder in (http or {}).items():
+        scenarios[f"http {path}"] = recorder.summary(elapsed)
+    if logs:
+        recorder, extra = logs
+        scenarios["ws_log"] = recorder.summary(elapsed, **extra)
+
+    memory = {
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_start_mb": round(rss_start / 1024 / 1024, 1) if rss_start else None,
+        "rss_end_mb": round((webui.resource_sampler.probe.rss() or 0) / 1024 / 1024, 1),
+    }
+    if args.tracemalloc:
+        memory["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "duration": round(elapsed, 3),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "startup": startup,
+        "scenarios": scenarios,
+        "memory": memory,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="entari-plugin-webui 基准测试")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个场景的运行时长（秒）")
+    parser.add_argument("--event-rate", type=float, default=2000.0, help="每秒发布的 SendResponse 数，0 表示不运行")
+    parser.add_argument("--platforms", type=int, default=4, help="合成事件轮流使用的平台数量")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发请求接口的协程数，0 表示不运行")
+    parser.add_argument("--endpoint", action="append", help="要请求的接口，可重复；默认为首页与插件接口")
+    parser.add_argument("--etag", action="store_true", help="携带上次响应的 ETag，模拟前端轮询")
+    parser.add_argument("--subscribers", type=int, default=20, help="/ws/log 订阅者数量，0 表示不运行")
+    parser.add_argument("--log-rate", type=float, default=200.0, help="每秒写入的日志行数")
+    parser.add_argument("--log-format", choices=("text", "html"), default="text", help="/ws/log 订阅者请求的格式")
+    parser.add_argument("--log-calls", type=int, default=20000, help="测量单次日志调用开销时的调用次数，0 表示不测量")
+    parser.add_argument("--no-import-time", dest="import_time", action="store_false", help="不测量插件导入耗时")
+    parser.add_argument("--tracemalloc", action="store_true", help="额外统计 Python 堆峰值（会拖慢测试）")
+    parser.add_argument("--output", "-o", help="结果写入文件，默认输出到 stdout")
+    parser.add_argument("--baseline", help="与之比较的基线结果文件")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+    args = parser.parse_args(argv)
+
+    output = Path(args.output).resolve() if args.output else None
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+
+    result = asyncio.run(bench(args))
+    exit_code = 0
+    if baseline is not None:
+        comparison, regressions = compare(result, baseline, args.tolerance)
+        result["comparison"] = comparison
+        result["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if output:
+        output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,39 +10,156 @@ Entari 插件：WebUI 服务
 """
 
 import os
-import yaml
 import logging
 import asyncio
 import secrets
+import time
+from collections import Counter
 from datetime import datetime,timedelta
-from io import StringIO
 from pathlib import Path
-import sys,uuid
-import subprocess
+import copy
 import json
-from dataclasses import dataclass, field
-
-from arclet.entari.event.lifespan import Startup
-from sqlalchemy import select, ForeignKey,Integer, String, JSON,func, and_
+import re
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Literal, Optional
+
+from arclet.entari.event.lifespan import Startup, Cleanup
+from arclet.entari.event.plugin import PluginLoadedSuccess, PluginUnloaded
+from arclet.entari.event.config import ConfigReload
+from sqlalchemy import select, update, insert, delete, bindparam, ForeignKey, Index, Integer, Float, String, Text, JSON,func, lambda_stmt
 from sqlalchemy.orm import relationship
-from sqlalchemy.orm.attributes import flag_modified
 from starlette.middleware import Middleware
-from starlette.responses import JSONResponse
-from fastapi import Request
+from starlette.responses import JSONResponse, Response
+from fastapi import Request, Depends
 from fastapi.websockets import WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import FileResponse
-from ansi2html import Ansi2HTMLConverter
 
-from entari_plugin_database import SqlalchemyService, Base, mapped_column, Mapped, get_session
+from entari_plugin_database import SqlalchemyService, Base, mapped_column, Mapped, get_session as db_get_session, service as db_service
 from entari_plugin_server import add_route, replace_fastapi, add_websocket_route,server
-from arclet.entari.plugin import get_plugins,find_plugin
-from arclet.entari.config import EntariConfig
+from arclet.entari.plugin import get_plugins,find_plugin, load_plugin, unload_plugin
+from arclet.entari.config import EntariConfig, config_model_validate
+from arclet.entari.config.file import BasicConfig
+from arclet.letoderea import es
 from arclet.entari.event.send import SendResponse
-from arclet.entari import plugin, inject
+from arclet.entari import plugin, inject, BasicConfModel
 import arclet.entari.logger as entari_log
 from loguru import logger
 
+from .counter import MessageCounter
+from .logbuffer import LogBuffer, LogCapture, LogFilter
+from .stats import DashboardStats
+from .inventory import DistributionInventory
+from .market import MarketIndex, parse_catalog, read_catalog, read_distribution
+from .auth import AuthError, AuthUser, TokenCache
+from .tasks import InstallTask, PipScheduler
+from .plugincache import PluginListCache
+from .configstore import ConfigStore, PatchError, apply_patch
+from .bundle import pack_configs, unpack_configs
+from .reload import ConfigReloader, ConfigValidationError, PluginChange, check_fields, config_root, diff_basic, plugin_section_key
+from .logstore import LogStore, LEVELS
+from .profiler import SamplingProfiler
+from .sampler import ResourceSampler
+from .registry import InstanceRecord, InstanceRegistry
+from .supervisor import Supervisor, RUNNING, STARTING, STOPPED, BACKOFF
+from .static import StaticFrontend, IndexPage
+from .metrics import FINE_BUCKETS, Metrics, TimingMiddleware, LoopLagMonitor
+from .live import FORMATS, Frame, LiveHub, LiveSubscriber, decode as live_decode, encode as live_encode
+from .repository import QueryStats, Repository, SqlitePragmas, pool_status
+from .rollup import MINUTE, HOUR, DAY, minute_key, key_epoch, parse_time, parse_step, auto_step, build_series
+
+
+class Config(BasicConfModel):
+    stat_flush_interval: float = 5.0
+    """消息计数落库间隔（秒）"""
+    stat_max_keys: int = 1024
+    """内存中最多缓冲的计数键数量，达到后立即落库"""
+    log_buffer_lines: int = 2000
+    """日志环形缓冲保留的最大行数，0 表示不限制"""
+    log_buffer_bytes: int = 4 * 1024 * 1024
+    """日志环形缓冲占用的最大字节数，0 表示不限制"""
+    log_replay_lines: int = 200
+    """新连接的日志客户端回放的最近行数"""
+    log_client_queue: int = 1000
+    """每个日志客户端最多积压的记录数"""
+    log_slow_client: Literal["drop", "disconnect"] = "drop"
+    """客户端积压超限时的处理方式：drop 丢弃最旧记录，disconnect 断开连接"""
+    log_sink_level: str = "INFO"
+    """日志页采集的最低级别"""
+    log_sink_diagnose: bool = False
+    """采集异常时附带完整调用栈与变量值（开销较大）"""
+    log_capture_idle: bool = False
+    """没有日志页连接时也持续采集，打开日志页时可回放此前的日志；关闭时只在有连接期间采集"""
+    log_dir: str = "logs"
+    """历史日志目录（entari 的 log.save 写入 logs/latest.log 并按天轮转）"""
+    log_search_limit: int = 500
+    """日志检索单页最多返回的条数"""
+    rollup_minute_retention: float = 2 * 86400
+    """分钟粒度统计的保留时长（秒），过期后并入小时桶"""
+    rollup_hour_retention: float = 90 * 86400
+    """小时粒度统计的保留时长（秒），过期后并入天桶"""
+    rollup_compact_interval: float = 600
+    """统计降采样任务的执行间隔（秒）"""
+    stats_max_points: int = 5000
+    """/api/stats/range 单次返回的最大点数"""
+    market_cache_ttl: float = 0
+    """已安装包清单的缓存有效期（秒），0 表示只在安装 / 卸载后刷新"""
+    market_index_file: str = "market_index.json"
+    """插件市场索引的保存位置"""
+    market_catalog: str = ""
+    """额外的插件目录 JSON 文件（格式同内置的 market_catalog.json），修改后在下次访问市场时增量导入"""
+    market_search_limit: int = 100
+    """/api/plugins/search 单页的最大条目数"""
+    token_cache_ttl: float = 300
+    """token 鉴权结果的缓存有效期（秒）"""
+    token_cache_size: int = 256
+    """token 鉴权缓存的最大条目数，超出后按 LRU 淘汰"""
+    pip_concurrency: int = 2
+    """同时运行的 pip 安装 / 卸载任务数"""
+    pip_task_ttl: float = 3600
+    """已结束的 pip 任务保留时长（秒）"""
+    loop_lag_interval: float = 0.5
+    """事件循环延迟的采样间隔（秒）"""
+    metrics_public: bool = False
+    """为 True 时 /api/metrics 不校验 token，便于 Prometheus 直接抓取"""
+    instance_workdir: str = "instances"
+    """子进程实例的工作目录根路径，每个实例使用其中以 id 命名的子目录"""
+    instance_log_lines: int = 1000
+    """每个子进程实例保留的输出行数"""
+    instance_stop_timeout: float = 10.0
+    """停止实例时每一步（SIGINT -> terminate -> kill）的等待时间（秒）"""
+    instance_backoff_base: float = 1.0
+    """实例崩溃后首次重启的等待时间（秒），之后逐次翻倍"""
+    instance_backoff_max: float = 60.0
+    """实例崩溃重启的最长等待时间（秒）"""
+    instance_pin_cpu: bool = True
+    """是否把每个子进程实例绑定到各自的 CPU 核心（仅 Linux）"""
+    instance_resume: bool = True
+    """启动时是否自动恢复上次退出前处于运行状态的实例"""
+    instance_flush_interval: float = 2.0
+    """实例状态等字段回写数据库的间隔（秒），期间同一实例的多次修改合并为一次批量 UPDATE"""
+    instance_import_max_files: int = 256
+    """单次导入的归档中最多包含的配置文件数"""
+    instance_import_max_bytes: int = 16 * 1024 * 1024
+    """导入归档的大小上限（压缩前后都按此限制）"""
+    db_journal_mode: str = "WAL"
+    """SQLite 日志模式，WAL 下读写互不阻塞；留空表示不修改"""
+    db_synchronous: str = "NORMAL"
+    """SQLite 落盘级别，WAL 模式下 NORMAL 只在断电时可能丢失最近的提交；留空表示不修改"""
+    db_busy_timeout: int = 5000
+    """SQLite 遇到写锁时的等待时间（毫秒）"""
+    live_interval: float = 0.5
+    """/ws/live 合并推送的时间窗（秒），窗口内的多次变化只计算并推送一次增量"""
+    live_history: int = 64
+    """每个实时主题保留的增量帧数，断线重连时序号在此范围内可以续传"""
+    profile_max_seconds: float = 60
+    """/api/debug/profile 单次采样的最长时长（秒）"""
+    sampler_interval: float = 2.0
+    """进程资源采样间隔（秒）"""
+    sampler_history: int = 300
+    """保留的资源样本数"""
+
+
 plugin.metadata(
     "WebUI 服务",
     [{"name": "Utopia", "email": "utopia@qq.com"}],
@@ -51,45 +168,76 @@ plugin.metadata(
     urls={
         "homepage": "https://github.com/ArcletProject/entari-plugin-webui",
     },
+    config=Config,
 )
+conf = plugin.get_config(Config)
+
+background_tasks: set[asyncio.Task] = set()
+
+def start_background(coro) -> asyncio.Task:
+    """启动后台任务：保留引用防止被回收，插件卸载时统一取消"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+plugin.collect_disposes(lambda: [task.cancel() for task in list(background_tasks)])
 
 # ---------- 全局配置 ----------
 logging.getLogger("lagrange.utils.binary.protobuf").setLevel(logging.CRITICAL)
 UPLOAD_DIR = "configs"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CONFIG_FILE = EntariConfig.instance.path
-RUNTIME_CONF = Path(__file__).with_name('frontend') / 'runtime.json'
+FRONTEND_DIR = Path(__file__).with_name('frontend')
+RUNTIME_CONF = FRONTEND_DIR / 'runtime.json'
 START_TIME = datetime.utcnow()
-
-# # ---------- 设置静态目录 ----------
-server.mount("/assets", Path(os.path.join(BASE_DIR, 'entari_plugin_webui/frontend')))
-server.mount("/frontend", Path(os.path.join(BASE_DIR, 'entari_plugin_webui/frontend/assets')))
-
-@dataclass
-class InstallTask:
-    task_id: str
-    plugin_id: str
-    status: str = "pending"
-    percent: int = 0
-    log: str = field(default="")
+config_store = ConfigStore()
 
 task_map: dict[str, InstallTask] = {}
 
-@dataclass
-class UninstallTask:
-    task_id: str
-    plugin_id: str
-    status: str = "pending"
-    percent: int = 0
-    log: str = ""
-
-uninstall_task_map: dict[str, UninstallTask] = {}
-
 # ---------- 前端入口 ----------
+frontend_files = StaticFrontend(FRONTEND_DIR)
+index_page = IndexPage(FRONTEND_DIR / 'index.html')
+
 @add_route("/")
 async def vue_set(request: Request):
-    html_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'index.html')
-    return FileResponse(html_path)
+    return index_page.response(request.headers)
+
+@add_route("/frontend/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def frontend_static(request: Request):
+    """静态资源：优先返回预压缩副本，带哈希的文件长期缓存"""
+    return frontend_files.response(request.path_params["path"], request.headers)
+
+# ---------- 运行指标 ----------
+webui_metrics = Metrics()
+timing_middleware = Middleware(TimingMiddleware, metrics=webui_metrics)
+webui_metrics.histogram("db_session_acquire", "获取数据库连接耗时", FINE_BUCKETS)
+webui_metrics.histogram("db_session", "数据库会话占用时长", FINE_BUCKETS)
+webui_metrics.histogram("count_sent", "消息计数监听器耗时", FINE_BUCKETS)
+loop_monitor = LoopLagMonitor(webui_metrics, conf.loop_lag_interval)
+plugin.collect_disposes(loop_monitor.cancel)
+resource_sampler = ResourceSampler(conf.sampler_interval, conf.sampler_history, lag=lambda: loop_monitor.last)
+plugin.collect_disposes(resource_sampler.cancel)
+
+sqlite_pragmas = SqlitePragmas({
+    "journal_mode": conf.db_journal_mode,
+    "synchronous": conf.db_synchronous,
+    "busy_timeout": conf.db_busy_timeout,
+})
+
+@asynccontextmanager
+async def get_session():
+    """带计时的数据库会话：分别记录取得连接的耗时和整个会话的占用时长"""
+    await sqlite_pragmas.ensure(db_service.engines)
+    started = time.perf_counter()
+    async with db_get_session() as session:
+        await session.connection()
+        acquired = time.perf_counter()
+        webui_metrics.observe("db_session_acquire", acquired - started)
+        try:
+            yield session
+        finally:
+            webui_metrics.observe("db_session", time.perf_counter() - acquired)
 
 # ---------- CORS ----------
 cors_middleware = Middleware(
@@ -99,7 +247,11 @@ cors_middleware = Middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-replace_fastapi(middleware=[cors_middleware])
+
+async def auth_error_handler(request: Request, exc: AuthError):
+    return JSONResponse({"success": False, "message": exc.message}, status_code=exc.status_code)
+
+replace_fastapi(middleware=[timing_middleware, cors_middleware], exception_handlers={AuthError: auth_error_handler})
 
 # ---------- 数据库模型 ----------
 class User(Base):
@@ -109,7 +261,7 @@ class User(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(30), nullable=False)
     password: Mapped[str] = mapped_column(String(30), nullable=False)
-    token: Mapped[str] = mapped_column(String(512), default="")
+    token: Mapped[str] = mapped_column(String(512), default="", index=True)
     instances: Mapped[list["Instance"]] = relationship("Instance", back_populates="user", cascade="all, delete-orphan")
     email: Mapped[str] = mapped_column(String(120), default="user@example.com")
 
@@ -136,15 +288,93 @@ class Instance(Base):
     def as_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
+class PluginTask(Base):
+    """pip 安装 / 卸载任务，重启后据此恢复"""
+    __tablename__ = "plugin_tasks"
+    task_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    plugin_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    action: Mapped[str] = mapped_column(String(20), default="install")
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    percent: Mapped[int] = mapped_column(Integer, default=0)
+    log: Mapped[str] = mapped_column(Text, default="")
+    created_at: Mapped[float] = mapped_column(Float, default=0)
+    finished_at: Mapped[float] = mapped_column(Float, nullable=True)
+
 class MessageStat(Base):
     """每日各平台消息计数"""
     __tablename__ = "message_stat"
+    __table_args__ = (Index("ix_message_stat_date_platform_instance", "date", "platform", "instance_id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     platform: Mapped[str] = mapped_column(String(30), nullable=False)
     instance_id: Mapped[int] = mapped_column(Integer, ForeignKey("instances.id"), nullable=False)
     date: Mapped[str] = mapped_column(String(10), nullable=False, comment="YYYY-MM-DD")
     count: Mapped[int] = mapped_column(Integer, default=0)
 
+class MessageRollup(Base):
+    """分钟 / 小时 / 天 粒度的消息计数；同一时段只存在于一种粒度中，查询时直接求和"""
+    __tablename__ = "message_rollup"
+    __table_args__ = (
+        Index("ix_message_rollup_key", "granularity", "bucket", "platform", "instance_id", unique=True),
+        Index("ix_message_rollup_bucket", "bucket"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    granularity: Mapped[int] = mapped_column(Integer, nullable=False, comment="桶长度（秒）")
+    bucket: Mapped[int] = mapped_column(Integer, nullable=False, comment="桶起点 UTC 时间戳")
+    platform: Mapped[str] = mapped_column(String(30), nullable=False)
+    instance_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+# ---------- 数据访问 ----------
+# 常用查询集中在这里，语句由 lambda_stmt 缓存，耗时按查询名记入 query_stats（/api/debug/queries）
+query_stats = QueryStats()
+
+class UserRepo(Repository):
+    stats = query_stats
+
+    async def exists(self) -> bool:
+        return (await self.execute("user.exists", lambda_stmt(lambda: select(User.id).limit(1)))).first() is not None
+
+    async def by_token(self, token: str):
+        return (await self.execute("user.by_token", lambda_stmt(
+            lambda: select(User.id, User.name, User.email).where(User.token == token)
+        ))).one_or_none()
+
+    async def login(self, name: str, password: str) -> Optional[User]:
+        """登录响应中的实例列表来自 instance_registry，这里只查用户"""
+        result = await self.execute("user.login", lambda_stmt(
+            lambda: select(User).where(User.name == name, User.password == password)
+        ))
+        return result.scalar_one_or_none()
+
+class InstanceRepo(Repository):
+    """实例表只在启动时整体读入 instance_registry，之后的读取都走内存"""
+    stats = query_stats
+
+    async def all(self) -> list[Instance]:
+        return list((await self.execute("instance.all", lambda_stmt(lambda: select(Instance)))).scalars())
+
+class StatRepo(Repository):
+    stats = query_stats
+
+    async def total(self) -> int:
+        return (await self.execute("stat.total", lambda_stmt(
+            lambda: select(func.sum(MessageStat.count))
+        ))).scalar() or 0
+
+    async def day_total(self, day: str) -> int:
+        return (await self.execute("stat.day_total", lambda_stmt(
+            lambda: select(func.sum(MessageStat.count)).where(MessageStat.date == day)
+        ))).scalar() or 0
+
+    async def daily_totals(self, start: str, end: str) -> dict[str, int]:
+        """SELECT date, SUM(count) FROM message_stat WHERE date BETWEEN :start AND :end GROUP BY date"""
+        rows = (await self.execute("stat.daily_totals", lambda_stmt(
+            lambda: select(MessageStat.date, func.sum(MessageStat.count))
+            .where(MessageStat.date >= start, MessageStat.date <= end)
+            .group_by(MessageStat.date)
+        ))).all()
+        return {date: total for date, total in rows}
+
 # ---------- 工具 ----------
 def generate_token(length: int = 64) -> str:
     """生成随机 token"""
@@ -156,30 +386,119 @@ async def get_week_message_sum() -> list[int]:
     week_days = [monday + timedelta(days=i) for i in range(7)]
 
     async with get_session() as session:
-        # SELECT date, SUM(count) FROM message_stat
-        # WHERE date BETWEEN :monday AND :sunday GROUP BY date;
-        stmt = (
-            select(MessageStat.date, func.sum(MessageStat.count).label("total"))
-            .where(
-                and_(
-                    MessageStat.date >= monday.isoformat(),
-                    MessageStat.date <= week_days[-1].isoformat()
-                )
-            )
-            .group_by(MessageStat.date)
-        )
-        rows = (await session.execute(stmt)).all()
+        day_map = await StatRepo(session).daily_totals(monday.isoformat(), week_days[-1].isoformat())
 
-    day_map = {row.date: row.total for row in rows}
-    return [day_map.get(d.isoformat(), 0) for d in week_days]
+    return [day_map.get(d.isoformat(), 0) + message_counter.pending(d.isoformat()) for d in week_days]
 
 async def get_today_message() -> int:
     """今天 0 点至今的消息总量"""
     today_str = datetime.utcnow().date().isoformat()
     async with get_session() as session:
-        stmt = select(func.sum(MessageStat.count)).where(MessageStat.date == today_str)
-        total = (await session.execute(stmt)).scalar()
-    return total or 0
+        total = await StatRepo(session).day_total(today_str)
+    return total + message_counter.pending(today_str)
+
+async def increment_rows(session, model, keys: tuple[str, ...], batch: dict[tuple, int]):
+    """按 keys 定位行：已存在则 count = count + delta，否则批量插入"""
+    table = model.__table__
+    cols = [table.c[k] for k in keys]
+    rows = (await session.execute(
+        select(table.c.id, *cols).where(*(col.in_({key[i] for key in batch}) for i, col in enumerate(cols)))
+    )).all()
+    existing = {tuple(row[1:]): row[0] for row in rows}
+
+    updates = [{"row_id": existing[key], "delta": delta} for key, delta in batch.items() if key in existing]
+    inserts = [{**dict(zip(keys, key)), "count": delta} for key, delta in batch.items() if key not in existing]
+    if updates:
+        # count = count + delta，原子自增，不会覆盖其他写入
+        await session.execute(
+            update(table).where(table.c.id == bindparam("row_id")).values(count=table.c.count + bindparam("delta")),
+            updates,
+        )
+    if inserts:
+        await session.execute(insert(table), inserts)
+
+async def flush_message_stat(batch: dict[tuple[str, int, str], int]):
+    """把 (platform, instance_id, 分钟桶) -> 增量 写入 message_stat（按天）与 message_rollup（按分钟），单事务完成"""
+    daily: Counter = Counter()
+    minutes: Counter = Counter()
+    for (platform, instance_id, bucket), delta in batch.items():
+        daily[(platform, instance_id, bucket[:10])] += delta
+        minutes[(MINUTE, key_epoch(bucket), platform, instance_id)] += delta
+    async with get_session() as session:
+        await increment_rows(session, MessageStat, ("platform", "instance_id", "date"), daily)
+        await increment_rows(session, MessageRollup, ("granularity", "bucket", "platform", "instance_id"), minutes)
+        await session.commit()
+
+async def compact_rollups(now: Optional[int] = None):
+    """降采样：超过保留期的分钟数据并入小时桶，小时数据并入天桶，并删除原有细粒度行"""
+    now = now or int(time.time())
+    plan = [(MINUTE, HOUR, conf.rollup_minute_retention), (HOUR, DAY, conf.rollup_hour_retention)]
+    async with get_session() as session:
+        for fine, coarse, keep in plan:
+            cutoff = int(now - keep) // coarse * coarse
+            coarse_bucket = (MessageRollup.bucket - MessageRollup.bucket % coarse).label("coarse_bucket")
+            rows = (await session.execute(
+                select(coarse_bucket, MessageRollup.platform, MessageRollup.instance_id, func.sum(MessageRollup.count))
+                .where(MessageRollup.granularity == fine, MessageRollup.bucket < cutoff)
+                .group_by(coarse_bucket, MessageRollup.platform, MessageRollup.instance_id)
+            )).all()
+            if not rows:
+                continue
+            batch = {(coarse, bucket, platform, instance_id): total for bucket, platform, instance_id, total in rows}
+            await increment_rows(session, MessageRollup, ("granularity", "bucket", "platform", "instance_id"), batch)
+            await session.execute(
+                delete(MessageRollup).where(MessageRollup.granularity == fine, MessageRollup.bucket < cutoff)
+            )
+        await session.commit()
+
+async def backfill_rollups():
+    """rollup 表为空时，用 message_stat 的历史每日数据补齐天粒度的桶"""
+    async with get_session() as session:
+        if (await session.execute(select(MessageRollup.id).limit(1))).first():
+            return
+        rows = (await session.execute(
+            select(MessageStat.date, MessageStat.platform, MessageStat.instance_id, func.sum(MessageStat.count))
+            .group_by(MessageStat.date, MessageStat.platform, MessageStat.instance_id)
+        )).all()
+        batch = {
+            (DAY, key_epoch(f"{day}T00:00"), platform, instance_id): total
+            for day, platform, instance_id, total in rows
+        }
+        if batch:
+            await increment_rows(session, MessageRollup, ("granularity", "bucket", "platform", "instance_id"), batch)
+        await session.commit()
+
+async def rollup_maintenance():
+    while True:
+        await asyncio.sleep(conf.rollup_compact_interval)
+        try:
+            await compact_rollups()
+        except Exception as e:
+            logger.opt(exception=e).warning("消息统计降采样失败")
+
+message_counter = MessageCounter(flush_message_stat, conf.stat_flush_interval, conf.stat_max_keys)
+plugin.collect_disposes(message_counter.cancel)
+dashboard_stats = DashboardStats()
+live_hub = LiveHub(conf.live_interval, conf.live_history)
+plugin.collect_disposes(live_hub.cancel)
+
+async def load_dashboard_stats():
+    """从数据库加载历史总量和本周每日消息量，之后只做增量更新"""
+    async with get_session() as session:
+        total = await StatRepo(session).total()
+    week = await get_week_message_sum()
+    today = datetime.utcnow().date()
+    monday = today - timedelta(days=today.weekday())
+    days = {(monday + timedelta(days=i)).isoformat(): cnt for i, cnt in enumerate(week)}
+    dashboard_stats.load(total + message_counter.pending(), days)
+    refresh_plugin_stats()
+
+def refresh_plugin_stats(exclude: Optional[str] = None):
+    """重新统计已启用 / 全部插件数量；exclude 用于排除正在卸载的插件"""
+    plugins = [p for p in get_plugins() if p.id != exclude]
+    dashboard_stats.set_plugins(sum(1 for p in plugins if p.is_available), len(plugins))
+    live_hub.touch("stats")
+    live_hub.touch("plugins")
 
 # ---------- 初始化 ----------
 @plugin.listen(Startup)
@@ -190,12 +509,19 @@ async def init_db():
     async with get_session() as session:
         await session.run_sync(
             lambda sync_sess: Base.metadata.create_all(
-                bind=sync_sess.bind, tables=[MessageStat.__table__]
+                bind=sync_sess.bind, tables=[MessageStat.__table__, MessageRollup.__table__, PluginTask.__table__]
             )
         )
+        # 旧库的表已存在时 create_all 不会补建索引，这里单独补上
+        await session.run_sync(
+            lambda sync_sess: [
+                index.create(sync_sess.connection(), checkfirst=True)
+                for table in (User.__table__, MessageStat.__table__)
+                for index in table.indexes
+            ]
+        )
         # 若数据库为空，则插入一条默认用户
-        exists = (await session.scalars(select(User))).one_or_none()
-        if not exists:
+        if not await UserRepo(session).exists():
             token = generate_token()
             user = User(name="Entari", password="114514", token=token)
             instance = Instance(
@@ -221,6 +547,73 @@ async def init_db():
         json.dumps({'baseURL': f'http://{host}:{port}/api'}, ensure_ascii=False),
         encoding='utf-8'
     )
+    message_counter.start()
+    await load_instances()
+    instance_registry.start()
+    loop_monitor.start()
+    resource_sampler.start()
+    await load_dashboard_stats()
+    await backfill_rollups()
+    start_background(rollup_maintenance())
+    # 未完成的 pip 任务在后台恢复，不拖慢启动
+    start_background(restore_pip_tasks())
+    await resume_instances()
+
+@plugin.listen(PluginLoadedSuccess)
+async def on_plugin_loaded(event: PluginLoadedSuccess):
+    plugin_list_cache.bump(event.name)
+    refresh_plugin_stats()
+
+@plugin.listen(PluginUnloaded)
+async def on_plugin_unloaded(event: PluginUnloaded):
+    plugin_list_cache.bump(event.name)
+    refresh_plugin_stats(exclude=event.name)
+
+@plugin.listen(ConfigReload)
+async def on_config_reload(event: ConfigReload):
+    if event.scope == "plugin":
+        plugin_list_cache.bump()
+        live_hub.touch("plugins")
+
+@plugin.listen(Cleanup)
+async def flush_on_cleanup():
+    """退出前把缓冲中的消息计数写入数据库，停止全部子进程实例后写回实例状态"""
+    await message_counter.stop()
+    await supervisor.shutdown()
+    await instance_registry.stop()
+
+# ---------- 鉴权 ----------
+token_cache = TokenCache(conf.token_cache_ttl, conf.token_cache_size)
+
+def request_token(request: Request) -> str:
+    return request.headers.get("Authorization") or request.headers.get("token") or ""
+
+async def current_user(request: Request) -> AuthUser:
+    """`/api/*` 路由共用的鉴权依赖：先查缓存，未命中再按索引查库"""
+    return await user_for_token(request_token(request))
+
+async def user_for_token(token: str) -> AuthUser:
+    if not token:
+        raise AuthError("未登录")
+    user = token_cache.get(token)
+    if user is None:
+        async with get_session() as session:
+            row = await UserRepo(session).by_token(token)
+        if not row:
+            raise AuthError("Token 无效")
+        user = AuthUser(row.id, row.name, row.email)
+        token_cache.put(token, user)
+    return user
+
+async def websocket_user(websocket: WebSocket) -> Optional[AuthUser]:
+    """WebSocket 鉴权（调用方需已 accept）：token 取自 `?token=` 或请求头；失败时以 4401 关闭连接并返回 None"""
+    try:
+        return await user_for_token(websocket.query_params.get("token") or request_token(websocket))
+    except AuthError as e:
+        await websocket.close(code=4401, reason=e.message)
+        return None
+
+AUTH = [Depends(current_user)]
 
 # ---------- 登录 ----------
 @add_route("/api/login", methods=["POST"])
@@ -231,31 +624,32 @@ async def login(request: Request):
     password = data.get("password")
 
     async with get_session() as session:
-        result = await session.scalars(
-            select(User).where(User.name == username, User.password == password)
-        )
-        user = result.one_or_none()
+        user = await UserRepo(session).login(username, password)
         if not user:
             return JSONResponse({"success": False, "message": "用户名或密码错误"})
 
-        # 生成新 token 并保存
+        # 生成新 token 并保存，旧 token 随之失效
         token = generate_token()
         user.token = token
         await session.commit()
-        await session.refresh(user)
-        instances = (await session.scalars(select(Instance).where(Instance.user_id == user.id))).all()
-        return JSONResponse({"success": True, "token": token, "instances": [inst.as_dict() for inst in instances],
+        token_cache.invalidate_user(user.id)
+        return JSONResponse({"success": True, "token": token, "instances": [inst.as_dict() for inst in instance_registry.owned_by(user.id)],
                              "user": { "name": user.name, "email": user.email }})
 
 # ---------- 登出 ----------
-@add_route("/api/logout", methods=["POST"])
-async def logout():
-    """占位：前端可直接丢弃 token"""
+@add_route("/api/logout", methods=["POST"], dependencies=AUTH)
+async def logout(request: Request):
+    """吊销当前 token"""
+    token = request_token(request)
+    async with get_session() as session:
+        await session.execute(update(User).where(User.token == token).values(token=""))
+        await session.commit()
+    token_cache.invalidate(token)
     return True
 
 # ---------- 信息修改 ----------
 @add_route("/api/user/update", methods=["POST"])
-async def user_update(request: Request):
+async def user_update(request: Request, auth: AuthUser = Depends(current_user)):
     """修改当前登录用户的密码或邮箱 """
     body = await request.json()
     new_pwd = body.get("password")
@@ -264,13 +658,8 @@ async def user_update(request: Request):
     if not new_pwd and not new_email:
         return JSONResponse({"success": False, "message": "无修改内容"})
 
-    token = request.headers.get("Authorization") or request.headers.get("token")
-
-    if not token:
-        return JSONResponse({"success": False, "message": "未登录"}, status_code=401)
-
     async with get_session() as session:
-        user = (await session.execute(select(User).where(User.token == token))).scalar_one_or_none()
+        user = await session.get(User, auth.id)
         if not user:
             return JSONResponse({"success": False, "message": "Token 无效"}, status_code=401)
 
@@ -280,147 +669,562 @@ async def user_update(request: Request):
             user.email = new_email
 
         await session.commit()
+    token_cache.invalidate_user(auth.id)
 
     return JSONResponse({"success": True, "message": "更新成功"})
 
 # ---------- 实例增改 ----------
-@add_route("/api/menus", methods=["POST"])
-async def create_instance(request: Request):
-    """新增或更新实例配置"""
+@add_route("/api/menus", methods=["POST"], dependencies=AUTH)
+async def create_instance(request: Request, auth: AuthUser = Depends(current_user)):
+    """新增或更新实例配置：id 指向自己的实例时更新该实例，否则新建实例并由数据库分配 id"""
     data       = await request.json()
     instance_id = data.get("id")
     config_data = data.get("data")
     filename    = data.get("filename")
 
     # 参数校验
-    if not instance_id or not config_data or not filename:
+    if not config_data or not filename:
         return JSONResponse({
             "success": False,
             "token": data.get("token"),
-            "message": "缺少必要参数: id, data 或 filename"
+            "message": "缺少必要参数: data 或 filename"
         })
 
-    # 构造实例对象
-    new_instance = Instance(
-        id=instance_id,
-        name=filename.replace(".yml", ""),
-        type=data.get("type"),
-        host=data.get("host"),
-        port=data.get("port"),
-        path=data.get("path"),
-        ignoreSelfMessage=data.get("ignoreSelfMessage", True),
-        logLevel=data.get("logLevel", "INFO"),
-        prefix=data.get("prefix", "/"),
-        created_at=datetime.now().isoformat(),
-        filename=filename,
-        state="已停止"
-    )
+    # 不能借 id 或文件名覆盖其他用户的实例
+    existing = instance_registry.get(instance_id) if instance_id else None
+    if existing is not None and existing.user_id != auth.id:
+        return JSONResponse({"success": False, "message": "无权修改该实例"}, status_code=403)
+    same_file = instance_registry.by_filename([filename]).get(filename)
+    if same_file is not None and same_file.user_id != auth.id:
+        return JSONResponse({"success": False, "message": "同名实例已存在"}, status_code=409)
+
+    values = {
+        "name": filename.replace(".yml", ""),
+        "type": data.get("type"),
+        "host": data.get("host"),
+        "port": data.get("port"),
+        "path": data.get("path"),
+        "ignoreSelfMessage": data.get("ignoreSelfMessage", True),
+        "logLevel": data.get("logLevel", "INFO"),
+        "prefix": data.get("prefix", "/"),
+        "filename": filename,
+    }
 
     # 写入文件
     try:
         filepath = os.path.join(UPLOAD_DIR, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(config_data)
+        await config_store.write_text(filepath, config_data)
     except Exception as e:
         return JSONResponse({"success": False, "message": f"文件保存失败: {str(e)}"})
 
-    # 更新数据库
-    async with get_session() as session:
-        result = await session.scalars(select(User))
-        user = result.first()
-        if not user:
-            return JSONResponse({"success": False, "message": "用户不存在"})
-
-        user.instances.append(new_instance)
-        flag_modified(user, 'instances')
-        await session.commit()
+    # 已有实例只改内存，由 instance_registry 合并落库；新实例直接插入
+    if existing is not None:
+        instance_registry.update(existing.id, values)
+        record = existing
+    else:
+        async with get_session() as session:
+            new_instance = Instance(user_id=auth.id, created_at=datetime.now().isoformat(), state="已停止", **values)
+            session.add(new_instance)
+            await session.commit()
+        instance_registry.put(new_instance.as_dict())
+        record = instance_registry.get(new_instance.id)
+    live_hub.touch("instances")
 
     return JSONResponse({
         "success": True,
-        "message": "实例创建成功",
-        "instances": [new_instance.as_dict()]
+        "message": "实例已更新" if existing is not None else "实例创建成功",
+        "instances": [record.as_dict()]
     })
 
-# ---------- 插件 ----------
-MARKET_PLUGINS = {
-    "entari-plugin-browser",
-    "entari-plugin-database",
-    "entari-plugin-arkgacha",
-    "entari-plugin-server",
-    "entari-plugin-webui",
-}
-
-@add_route("/api/plugins", methods=["GET"])
-async def list_plugins():
-    def _serial(p):
-        m = p.metadata
-        key = p.id
-        enabled = find_plugin(key).is_available
-
-        cfg = getattr(p, 'config', None)
-        if cfg and hasattr(cfg, 'dict'):
-            cfg = cfg.dict()
-        elif cfg and hasattr(cfg, 'copy'):
-            cfg = dict(cfg)
+# ---------- 实例进程 ----------
+INSTANCE_NAME = re.compile(r"^[\w.-]{1,50}$")
+
+async def flush_instances(rows: list[dict]):
+    """按主键批量 UPDATE instance_registry 中的脏行：修改的列相同的行合并为一次 executemany。
+    用 Core 语句而非 ORM 批量更新，落库途中实例被删除时只是少更新一行，不会因行数不符整批失败"""
+    table = Instance.__table__
+    groups: dict[tuple[str, ...], list[dict]] = {}
+    for row in rows:
+        values = {key: value for key, value in row.items() if key != "id"}
+        groups.setdefault(tuple(values), []).append({"row_id": row["id"], **values})
+    async with get_session() as session:
+        for params in groups.values():
+            await session.execute(update(table).where(table.c.id == bindparam("row_id")), params)
+        await session.commit()
+
+instance_registry = InstanceRegistry(flush_instances, conf.instance_flush_interval)
+plugin.collect_disposes(instance_registry.cancel)
+
+async def load_instances():
+    async with get_session() as session:
+        rows = await InstanceRepo(session).all()
+    instance_registry.load(inst.as_dict() for inst in rows)
+
+async def save_instance_state(instance_id: int, state: str):
+    """supervisor 的状态回调：只改内存，由 instance_registry 合并后落库"""
+    instance_registry.update(instance_id, {"state": state})
+    live_hub.touch("instances")
+
+supervisor = Supervisor(
+    Path(conf.instance_workdir),
+    conf.instance_log_lines,
+    conf.instance_stop_timeout,
+    conf.instance_backoff_base,
+    conf.instance_backoff_max,
+    pin_cpu=conf.instance_pin_cpu,
+    on_state=save_instance_state,
+)
+
+def instance_config_path(inst: InstanceRecord) -> Path:
+    return Path(UPLOAD_DIR, inst.filename).resolve()
+
+def is_host_instance(inst: InstanceRecord) -> bool:
+    """初始化时写入的默认实例就是当前进程本身（没有独立的配置文件），不由 supervisor 管理"""
+    if instance_config_path(inst).is_file():
+        return False
+    return inst.filename == Path(CONFIG_FILE).name or inst.port == server.port
+
+def instance_view(inst: InstanceRecord) -> dict:
+    data = inst.as_dict()
+    if is_host_instance(inst):
+        latest = resource_sampler.latest() or {}
+        data["state"] = RUNNING
+        data["host_process"] = True
+        data["stats"] = {"cpu": latest.get("cpu") or 0, "memory": latest.get("memory") or 0}
+    elif proc := supervisor.get(inst.id):
+        data["state"] = proc.state
+        data["stats"] = proc.stats()
+        data["process"] = proc.as_dict()
+    return data
+
+def owned_instance(instance_id: int, auth: AuthUser) -> Optional[InstanceRecord]:
+    inst = instance_registry.get(instance_id)
+    if inst is None or inst.user_id != auth.id:
+        return None
+    return inst
+
+def network_fields(config: dict) -> dict:
+    """从实例配置的 basic.network 中取出第一项网络设置，填充实例表的展示字段"""
+    network = ((config.get("basic") or {}).get("network") or [{}])[0] or {}
+    return {
+        "type": str(network.get("type", "ws")),
+        "host": str(network.get("host", "127.0.0.1")),
+        "port": int(network.get("port", 5140)),
+        "path": network.get("path", ""),
+    }
+
+async def resume_instances():
+    """进程重启后按数据库中的状态恢复实例：上次在运行的重新拉起，其余标记为已停止"""
+    for inst in instance_registry.in_states([RUNNING, STARTING, BACKOFF]):
+        if is_host_instance(inst):
+            continue
+        if conf.instance_resume and instance_config_path(inst).is_file():
+            await supervisor.start(inst.id, instance_config_path(inst))
         else:
-            cfg = {}
+            await save_instance_state(inst.id, STOPPED)
 
-        return {
-            "name": getattr(m, 'name', None) or key,
-            "id": key,
-            "title": getattr(m, 'name', None) or key,
-            "desc": getattr(m, 'description', None) or "暂无描述",
-            "version": getattr(m, 'version', None) or "0.0.0",
-            "author": (
-                "; ".join(
-                    i if isinstance(i, str) else i.get("name", "unknown")
-                    for i in (getattr(m, 'author', None) or [])
-                )
-            ) or "unknown",
-            "status": enabled,
-            "builtin": True,
-            "urls": getattr(m, 'urls', None) or {},
-            "configurable": m and getattr(m, 'config', None) is not None,
-            "config": cfg,
-        }
+@add_route("/api/instances", methods=["GET"], dependencies=AUTH)
+async def list_instances(auth: AuthUser = Depends(current_user)):
+    """直接读 instance_registry，不访问数据库"""
+    return JSONResponse([instance_view(inst) for inst in instance_registry.owned_by(auth.id)])
 
-    plugins = get_plugins()
-    return JSONResponse([_serial(p) for p in plugins])
-
-@add_route("/api/market/plugins", methods=["GET"])
-async def market_plugins():
-    pip_list = subprocess.run(
-        [sys.executable, "-m", "pip", "list", "--format=json"],
-        stdout=subprocess.PIPE,
-        text=True,
-        check=True
-    ).stdout
-
-    installed_packages = json.loads(pip_list)
-    installed_plugins = {
-        pkg["name"]: True for pkg in installed_packages
-        if pkg["name"].startswith("entari-plugin-") or pkg["name"].startswith("entari_plugin_")
+@add_route("/api/instances", methods=["POST"], dependencies=AUTH)
+async def create_instance_process(request: Request, auth: AuthUser = Depends(current_user)):
+    """新建实例：写入 configs/<name>.yml 并登记到实例表，创建后处于停止状态"""
+    body = await request.json()
+    name = str(body.get("name") or "")
+    config = body.get("config") or {}
+    if not INSTANCE_NAME.match(name) or not isinstance(config, dict):
+        return JSONResponse({"success": False, "message": "实例名只能包含字母、数字、下划线、点和横线"}, status_code=400)
+    filename = f"{name}.yml"
+    path = Path(UPLOAD_DIR, filename)
+    if path.exists():
+        return JSONResponse({"success": False, "message": "同名实例已存在"}, status_code=409)
+    await config_store.save(path, config)
+    async with get_session() as session:
+        inst = Instance(
+            user_id=auth.id,
+            name=name,
+            created_at=datetime.now().isoformat(),
+            filename=filename,
+            state=STOPPED,
+            **network_fields(config),
+        )
+        session.add(inst)
+        await session.commit()
+    instance_registry.put(inst.as_dict())
+    data = instance_view(instance_registry.get(inst.id))
+    live_hub.touch("instances")
+    return JSONResponse({"success": True, "message": "实例创建成功", "instance": data})
+
+@add_route("/api/instances/{instance_id}/{action}", methods=["POST"], dependencies=AUTH)
+async def control_instance(instance_id: int, action: Literal["start", "stop", "restart"], auth: AuthUser = Depends(current_user)):
+    inst = owned_instance(instance_id, auth)
+    if inst is None:
+        return JSONResponse({"success": False, "message": "实例不存在"}, status_code=404)
+    if is_host_instance(inst):
+        return JSONResponse({"success": False, "message": "当前进程所在的实例不能在面板中启停"}, status_code=400)
+    path = instance_config_path(inst)
+    if action != "stop" and not path.is_file():
+        return JSONResponse({"success": False, "message": "实例配置文件不存在"}, status_code=404)
+    if action == "start":
+        await supervisor.start(inst.id, path)
+    elif action == "stop":
+        await supervisor.stop(inst.id)
+    else:
+        await supervisor.restart(inst.id, path)
+    return JSONResponse({"success": True, "instance": instance_view(inst)})
+
+@add_route("/api/instances/{instance_id}", methods=["DELETE"], dependencies=AUTH)
+async def delete_instance(instance_id: int, auth: AuthUser = Depends(current_user)):
+    """停止并删除实例，配置文件一并删除"""
+    inst = owned_instance(instance_id, auth)
+    if inst is None:
+        return JSONResponse({"success": False, "message": "实例不存在"}, status_code=404)
+    if is_host_instance(inst):
+        return JSONResponse({"success": False, "message": "当前进程所在的实例不能删除"}, status_code=400)
+    await supervisor.remove(inst.id)
+    path = instance_config_path(inst)
+    async with get_session() as session:
+        await session.execute(delete(Instance).where(Instance.id == instance_id))
+        await session.commit()
+    instance_registry.remove(instance_id)
+    path.unlink(missing_ok=True)
+    live_hub.touch("instances")
+    return JSONResponse({"success": True, "message": "实例已删除"})
+
+@add_route("/api/instances/{instance_id}/config", methods=["GET"], dependencies=AUTH)
+async def get_instance_config(instance_id: int, auth: AuthUser = Depends(current_user)):
+    inst = owned_instance(instance_id, auth)
+    if inst is None:
+        return JSONResponse({"success": False, "message": "实例不存在"}, status_code=404)
+    path = Path(CONFIG_FILE) if is_host_instance(inst) else instance_config_path(inst)
+    return JSONResponse(await config_store.load(path) or {})
+
+@add_route("/api/instances/{instance_id}/config", methods=["PUT"], dependencies=AUTH)
+async def update_instance_config(instance_id: int, request: Request, auth: AuthUser = Depends(current_user)):
+    """保存实例配置；实例正在运行时自动重启使其生效"""
+    config = await request.json()
+    if not isinstance(config, dict):
+        return JSONResponse({"success": False, "message": "配置必须是对象"}, status_code=400)
+    inst = owned_instance(instance_id, auth)
+    if inst is None:
+        return JSONResponse({"success": False, "message": "实例不存在"}, status_code=404)
+    if is_host_instance(inst):
+        return JSONResponse({"success": False, "message": "当前进程的配置请通过 /api/config 修改"}, status_code=400)
+    path = instance_config_path(inst)
+    await config_store.save(path, config)
+    instance_registry.update(instance_id, network_fields(config))
+    live_hub.touch("instances")
+    proc = supervisor.get(instance_id)
+    restarted = bool(proc and proc.alive)
+    if restarted:
+        await supervisor.restart(instance_id, path)
+    return JSONResponse({"success": True, "restarted": restarted})
+
+# ---------- 实例批量导入 / 导出 ----------
+async def upsert_instances(configs: dict[str, dict], auth: AuthUser, overwrite: bool = False) -> list[dict]:
+    """批量新建 / 更新实例：新实例在一个事务里用一条 INSERT 写入，已有实例的网络字段交给 instance_registry 合并落库；
+    任一配置文件写入失败时新建整体回滚、更新不生效。返回逐项结果"""
+    results = {name: {"name": name, "success": False} for name in configs}
+    valid: dict[str, tuple[dict, dict]] = {}
+    for name, config in configs.items():
+        if not INSTANCE_NAME.match(name):
+            results[name]["message"] = "实例名只能包含字母、数字、下划线、点和横线"
+            continue
+        if not isinstance(config, dict):
+            results[name]["message"] = "配置必须是对象"
+            continue
+        try:
+            valid[name] = (config, network_fields(config))
+        except (TypeError, ValueError, AttributeError) as e:
+            results[name]["message"] = f"网络配置无效: {e}"
+
+    updated: list[tuple[int, Path]] = []
+    existing = instance_registry.by_filename(f"{name}.yml" for name in valid)
+    async with get_session() as session:
+        now = datetime.now().isoformat()
+        inserts: list[dict] = []
+        updates: list[dict] = []
+        for name, (config, fields) in valid.items():
+            filename = f"{name}.yml"
+            inst = existing.get(filename)
+            if inst is not None and (inst.user_id != auth.id or is_host_instance(inst)):
+                results[name]["message"] = "同名实例不可覆盖"
+            elif inst is not None and not overwrite:
+                results[name]["message"] = "同名实例已存在"
+            elif inst is None and not overwrite and Path(UPLOAD_DIR, filename).exists():
+                results[name]["message"] = "同名配置文件已存在"
+            elif inst is None:
+                inserts.append({
+                    "user_id": auth.id, "name": name, "created_at": now, "filename": filename, "state": STOPPED, **fields,
+                })
+            else:
+                updates.append({"id": inst.id, **fields})
+                updated.append((inst.id, instance_config_path(inst)))
+                results[name].update(success=True, id=inst.id, action="updated")
+
+        created: list[Instance] = []
+        if inserts:
+            created = list(await session.scalars(insert(Instance).returning(Instance), inserts))
+            for inst in created:
+                results[inst.name].update(success=True, id=inst.id, action="created")
+        written = [name for name in valid if results[name]["success"]]
+        try:
+            await asyncio.gather(*(config_store.save(Path(UPLOAD_DIR, f"{name}.yml"), valid[name][0]) for name in written))
+        except OSError as e:
+            await session.rollback()
+            for name in written:
+                results[name] = {"name": name, "success": False, "message": f"文件保存失败: {e}"}
+            return list(results.values())
+        await session.commit()
+    for inst in created:
+        instance_registry.put(inst.as_dict())
+    for values in updates:
+        instance_registry.update(values.pop("id"), values)
+    live_hub.touch("instances")
+
+    # 正在运行的实例重启后才会使用新配置
+    for instance_id, path in updated:
+        proc = supervisor.get(instance_id)
+        if proc and proc.alive:
+            await supervisor.restart(instance_id, path)
+    return list(results.values())
+
+@add_route("/api/instances/batch", methods=["POST"], dependencies=AUTH)
+async def batch_instances(request: Request, auth: AuthUser = Depends(current_user)):
+    """批量新建 / 更新实例：{"instances": [{"name": ..., "config": {...}}], "overwrite": false}"""
+    body = await request.json()
+    items = body.get("instances") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return JSONResponse({"success": False, "message": "instances 必须是对象数组"}, status_code=400)
+    configs = {str(item.get("name") or ""): item.get("config") or {} for item in items}
+    if len(configs) != len(items):
+        return JSONResponse({"success": False, "message": "实例名重复"}, status_code=400)
+    results = await upsert_instances(configs, auth, bool(body.get("overwrite")))
+    return JSONResponse({"success": all(r["success"] for r in results), "results": results})
+
+@add_route("/api/instances/import", methods=["POST"], dependencies=AUTH)
+async def import_instances(request: Request, overwrite: bool = False, auth: AuthUser = Depends(current_user)):
+    """导入实例配置归档：请求体为 zip，其中每个 `<实例名>.yml` 对应一个实例"""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > conf.instance_import_max_bytes:
+        return JSONResponse({"success": False, "message": "归档过大"}, status_code=413)
+    data = await request.body()
+    if len(data) > conf.instance_import_max_bytes:
+        return JSONResponse({"success": False, "message": "归档过大"}, status_code=413)
+    try:
+        configs = await asyncio.to_thread(
+            unpack_configs, data, conf.instance_import_max_files, conf.instance_import_max_bytes
+        )
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    if not configs:
+        return JSONResponse({"success": False, "message": "归档中没有 .yml 配置文件"}, status_code=400)
+    results = await upsert_instances(configs, auth, overwrite)
+    return JSONResponse({"success": all(r["success"] for r in results), "results": results})
+
+@add_route("/api/instances/export", methods=["GET"], dependencies=AUTH)
+async def export_instances(ids: str = "", auth: AuthUser = Depends(current_user)):
+    """导出实例配置为 zip；`?ids=1,2` 只导出指定实例，默认导出全部"""
+    try:
+        selected = {int(i) for i in ids.split(",") if i.strip()}
+    except ValueError:
+        return JSONResponse({"success": False, "message": "ids 格式错误"}, status_code=400)
+    rows = [inst for inst in instance_registry.owned_by(auth.id) if not selected or inst.id in selected]
+    sources = {
+        inst.filename: Path(CONFIG_FILE) if is_host_instance(inst) else instance_config_path(inst)
+        for inst in rows
     }
 
-    market_plugins_list = []
-    for plugin in MARKET_PLUGINS:
-        installed = False
-        if plugin in installed_plugins or f"entari_plugin_{plugin}" in installed_plugins:
-            installed = True
-
-        market_plugins_list.append({
-            "name": plugin,
-            "fullName": plugin,
-            "desc": plugin,
-            "author": "unknown",
-            "stars": 0,
-            "updated": "",
-            "tags": [],
-            "installed": installed
-        })
-    return JSONResponse(market_plugins_list)
+    def build() -> bytes:
+        files = {name: path.read_bytes() for name, path in sources.items() if path.is_file()}
+        return pack_configs(files)
 
-@add_route("/api/plugins/toggle", methods=["POST"])
+    archive = await asyncio.to_thread(build)
+    return Response(
+        archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="instances.zip"'},
+    )
+
+@add_route("/api/instances/{instance_id}/logs", methods=["GET"], dependencies=AUTH)
+async def instance_logs(instance_id: int, lines: int = 200, format: str = "text", auth: AuthUser = Depends(current_user)):
+    inst = owned_instance(instance_id, auth)
+    if inst is None:
+        return JSONResponse({"success": False, "message": "实例不存在"}, status_code=404)
+    proc = supervisor.get(instance_id)
+    return JSONResponse({"lines": proc.logs.tail(lines, format == "html") if proc else []})
+
+@add_websocket_route("/ws/instances/{instance_id}/log")
+async def websocket_instance_log(websocket: WebSocket, instance_id: int):
+    """推送子进程实例的输出：先回放最近的输出，之后实时推送；`?format=html` 推送渲染好的 HTML。
+    需要 `?token=` 鉴权，且只能查看自己的实例"""
+    await websocket.accept()
+    auth = await websocket_user(websocket)
+    if auth is None:
+        return
+    if owned_instance(instance_id, auth) is None:
+        await websocket.close(code=4404, reason="实例不存在")
+        return
+    html = websocket.query_params.get("format") == "html"
+    proc = supervisor.get(instance_id)
+    if proc is None:
+        await websocket.send_text("实例尚未启动过")
+        await websocket.close()
+        return
+    sub = proc.logs.subscribe(conf.log_replay_lines)
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        while True:
+            getter = asyncio.create_task(sub.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.create_task(websocket.receive())
+                continue
+            entries = getter.result()
+            if entries is None:
+                break
+            await websocket.send_text(proc.logs.join(entries, html))
+    except (asyncio.CancelledError, ConnectionResetError, WebSocketDisconnect):
+        pass
+    finally:
+        proc.logs.unsubscribe(sub)
+        receiver.cancel()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+# ---------- 插件 ----------
+# 随插件发布的默认目录，market_catalog 可再指定一个
+BUILTIN_CATALOG = Path(__file__).with_name("market_catalog.json")
+webui_metrics.histogram("inventory_refresh", "发行包清单刷新耗时")
+distribution_inventory = DistributionInventory(
+    conf.market_cache_ttl, on_refresh=lambda cost: webui_metrics.observe("inventory_refresh", cost)
+)
+market_index = MarketIndex(Path(conf.market_index_file))
+
+def market_catalogs() -> list[Path]:
+    return [BUILTIN_CATALOG, Path(conf.market_catalog)] if conf.market_catalog else [BUILTIN_CATALOG]
+
+async def refresh_market():
+    """增量刷新市场索引：只导入修改过的目录文件，只读取新增或升级的已安装包，有变化时写盘"""
+    async with market_index.lock:
+        if not market_index.loaded:
+            await asyncio.to_thread(market_index.load)
+        for path in market_catalogs():
+            mtime = market_index.catalog_stale(path)
+            if mtime is None:
+                continue
+            try:
+                entries = await asyncio.to_thread(read_catalog, path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取插件目录 {path} 失败: {e}")
+                continue
+            market_index.merge_catalog(entries, path, mtime)
+        installed = await distribution_inventory.get()
+        if installed is not market_index.synced:
+            names = market_index.installed_stale(installed)
+            metas = await asyncio.to_thread(lambda: {name: read_distribution(name) for name in names})
+            market_index.apply_installed(installed, metas)
+        if market_index.dirty:
+            await asyncio.to_thread(market_index.save, market_index.dump())
+        market_index.prepare()
+
+plugin_list_cache = PluginListCache()
+
+def serialize_plugin(p):
+    """单个插件的序列化结果，由 plugin_list_cache 记忆"""
+    m = p.metadata
+    key = p.id
+    enabled = p.is_available
+
+    cfg = getattr(p, 'config', None)
+    if cfg and hasattr(cfg, 'dict'):
+        cfg = cfg.dict()
+    elif cfg and hasattr(cfg, 'copy'):
+        cfg = dict(cfg)
+    else:
+        cfg = {}
+
+    return {
+        "name": getattr(m, 'name', None) or key,
+        "id": key,
+        "title": getattr(m, 'name', None) or key,
+        "desc": getattr(m, 'description', None) or "暂无描述",
+        "version": getattr(m, 'version', None) or "0.0.0",
+        "author": (
+            "; ".join(
+                i if isinstance(i, str) else i.get("name", "unknown")
+                for i in (getattr(m, 'author', None) or [])
+            )
+        ) or "unknown",
+        "status": enabled,
+        "builtin": True,
+        "urls": getattr(m, 'urls', None) or {},
+        "configurable": m and getattr(m, 'config', None) is not None,
+        "config": cfg,
+    }
+
+@add_route("/api/plugins", methods=["GET"], dependencies=AUTH)
+async def list_plugins(request: Request, fields: str = ""):
+    """插件列表；`?fields=id,status` 只返回指定字段，未变化时按 If-None-Match 返回 304"""
+    plugins = get_plugins()
+    selected = [f for f in fields.split(",") if f] or None
+    etag = plugin_list_cache.etag(plugins, selected)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    items = [plugin_list_cache.get(p, serialize_plugin) for p in plugins]
+    if selected:
+        items = [{k: item[k] for k in selected if k in item} for item in items]
+    return JSONResponse(items, headers=headers)
+
+@add_route("/api/market/plugins", methods=["GET"], dependencies=AUTH)
+async def market_plugins(q: str = "", tag: str = ""):
+    """插件市场的全部条目（可按 q / tag 过滤），来自本地索引；已安装状态来自缓存的包元数据清单，不调用 pip"""
+    refreshes = distribution_inventory.refresh_count
+    await refresh_market()
+    _, entries = market_index.search(q, 1, len(market_index.entries) or 1, tag or None)
+    headers = {}
+    if distribution_inventory.refresh_count != refreshes:
+        headers["Server-Timing"] = f"inventory;dur={distribution_inventory.last_refresh_seconds * 1000:.1f}"
+    return JSONResponse([entry.item() for entry in entries], headers=headers)
+
+@add_route("/api/plugins/search", methods=["GET"], dependencies=AUTH)
+async def search_plugins(q: str = "", page: int = 1, size: int = 20, tag: str = "", installed: Optional[bool] = None):
+    """在市场索引中按名称、标签、作者与简介搜索，支持前缀与拼写相近的匹配，结果分页"""
+    page = max(page, 1)
+    size = min(max(size, 1), conf.market_search_limit)
+    await refresh_market()
+    started = time.perf_counter()
+    total, entries = market_index.search(q, page, size, tag or None, installed)
+    cost = time.perf_counter() - started
+    return JSONResponse(
+        {"total": total, "page": page, "size": size, "items": [entry.item() for entry in entries]},
+        headers={"Server-Timing": f"search;dur={cost * 1000:.2f}"},
+    )
+
+@add_route("/api/market/catalog", methods=["POST"], dependencies=AUTH)
+async def import_market_catalog(request: Request):
+    """导入插件目录（格式同 market_catalog.json），与已有条目合并后写盘"""
+    try:
+        entries = parse_catalog(await request.json())
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    async with market_index.lock:
+        if not market_index.loaded:
+            await asyncio.to_thread(market_index.load)
+        changed = market_index.merge_catalog(entries)
+    await refresh_market()
+    return JSONResponse({"success": True, "message": f"已导入 {len(entries)} 个插件", "changed": changed})
+
+@add_route("/api/plugins/toggle", methods=["POST"], dependencies=AUTH)
 async def toggle_plugin(request: Request):
     body = await request.json()
     id = body["id"]
@@ -430,64 +1234,117 @@ async def toggle_plugin(request: Request):
         plugin.enable()
     else:
         plugin.disable()
+    refresh_plugin_stats()
     return JSONResponse({"success": True})
 
 # ---------- 异步安装/卸载 ----------
-async def pip_install(task: InstallTask):
-    task.status = "running"
-    cmd = [sys.executable, "-m", "pip", "install", "-U", task.plugin_id]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.DEVNULL,
-        stderr=asyncio.subprocess.DEVNULL
-    )
-    await proc.wait()
-    if proc.returncode == 0:
-        task.status = "success"
-        task.percent = 100
+async def save_pip_task(task: InstallTask):
+    async with get_session() as session:
+        await session.merge(PluginTask(**task.as_dict()))
+        await session.commit()
+
+async def delete_pip_tasks(task_ids: list[str]):
+    async with get_session() as session:
+        await session.execute(delete(PluginTask).where(PluginTask.task_id.in_(task_ids)))
+        await session.commit()
+
+async def finish_pip_task(task: InstallTask):
+    distribution_inventory.invalidate()
+    if task.action == "install" and task.status == "success":
         plg = find_plugin(task.plugin_id)
         if plg:
-            await plg.enable()
-    else:
-        task.status = "failed"
-        task.percent = 0
-
-async def pip_uninstall_task(task: UninstallTask):
-    task.status = "running"
-    cmd = [sys.executable, "-m", "pip", "uninstall", "-y", task.plugin_id]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.DEVNULL,
-        stderr=asyncio.subprocess.DEVNULL
-    )
-    await proc.wait()
-    if proc.returncode == 0:
-        task.status = "success"
-        task.percent = 100
-    else:
-        task.status = "failed"
-        task.percent = 0
+            plg.enable()
+            refresh_plugin_stats()
+
+pip_scheduler = PipScheduler(
+    task_map,
+    conf.pip_concurrency,
+    conf.pip_task_ttl,
+    persist=save_pip_task,
+    on_finish=finish_pip_task,
+    on_evict=delete_pip_tasks,
+    on_change=lambda: live_hub.touch("tasks"),
+)
+plugin.collect_disposes(pip_scheduler.shutdown)
 
-@add_route("/api/plugins/install", methods=["POST"])
+async def restore_pip_tasks():
+    """加载持久化的任务；上次退出时未完成的任务重新排队（pip 安装 / 卸载可重复执行）"""
+    async with get_session() as session:
+        rows = (await session.scalars(select(PluginTask))).all()
+    for row in rows:
+        task = InstallTask(
+            task_id=row.task_id, plugin_id=row.plugin_id, action=row.action, status=row.status,
+            percent=row.percent, log=row.log or "", created_at=row.created_at, finished_at=row.finished_at,
+        )
+        task_map[task.task_id] = task
+        if not task.finished:
+            task.status = "pending"
+            task.log += "--- WebUI 重启，任务重新排队 ---\n"
+            pip_scheduler.schedule(task)
+    pip_scheduler.evict()
+
+@add_route("/api/plugins/install", methods=["POST"], dependencies=AUTH)
 async def plugin_install(request: Request):
     body = await request.json()
-    plugin_id = body["name"]
-    task_id = str(uuid.uuid4())
-    task = InstallTask(task_id=task_id, plugin_id=plugin_id)
-    task_map[task_id] = task
-    asyncio.create_task(pip_install(task))
-    return JSONResponse({"success": True, "task_id": task_id})
-
-@add_route("/api/plugins/uninstall", methods=["POST"])
+    task = pip_scheduler.submit("install", body["name"])
+    return JSONResponse({"success": True, "task_id": task.task_id})
+
+@add_route("/api/plugins/uninstall", methods=["POST"], dependencies=AUTH)
 async def plugin_uninstall(request: Request):
     body = await request.json()
-    plugin_id = body["name"]
-    task_id = str(uuid.uuid4())
-    task = UninstallTask(task_id=task_id, plugin_id=plugin_id)
-    asyncio.create_task(pip_uninstall_task(task))
-    return JSONResponse({"success": True, "task_id": task_id})
+    task = pip_scheduler.submit("uninstall", body["name"])
+    return JSONResponse({"success": True, "task_id": task.task_id})
+
+@add_route("/api/plugins/tasks", methods=["GET"], dependencies=AUTH)
+async def list_pip_tasks():
+    pip_scheduler.evict()
+    return JSONResponse([
+        {k: v for k, v in task.as_dict().items() if k != "log"}
+        for task in sorted(task_map.values(), key=lambda t: t.created_at, reverse=True)
+    ])
+
+@add_route("/api/plugins/tasks/{task_id}", methods=["GET"], dependencies=AUTH)
+async def get_pip_task(task_id: str):
+    task = task_map.get(task_id)
+    if task is None:
+        return JSONResponse({"success": False, "message": "任务不存在"}, status_code=404)
+    return JSONResponse(task.as_dict())
+
+@add_route("/api/plugins/tasks/{task_id}/cancel", methods=["POST"], dependencies=AUTH)
+async def cancel_pip_task(task_id: str):
+    if not await pip_scheduler.cancel(task_id):
+        return JSONResponse({"success": False, "message": "任务不存在或已结束"})
+    return JSONResponse({"success": True})
+
+@add_websocket_route("/ws/tasks/{task_id}")
+async def websocket_task(websocket: WebSocket, task_id: str):
+    """推送单个 pip 任务的进度与输出，任务结束后关闭连接；需要 `?token=` 鉴权"""
+    await websocket.accept()
+    if await websocket_user(websocket) is None:
+        return
+    task = task_map.get(task_id)
+    if task is None:
+        await websocket.send_json({"task_id": task_id, "status": "missing"})
+        await websocket.close()
+        return
+    queue = pip_scheduler.subscribe(task_id)
+    try:
+        await websocket.send_json(task.as_dict())
+        while not task.finished:
+            event = await queue.get()
+            await websocket.send_json(event)
+            if event["status"] in ("success", "failed", "cancelled"):
+                break
+    except (asyncio.CancelledError, ConnectionResetError, WebSocketDisconnect):
+        pass
+    finally:
+        pip_scheduler.unsubscribe(task_id, queue)
+        try:
+            await websocket.close()
+        except:
+            pass
 
-@add_route("/api/plugins/save", methods=["POST"])
+@add_route("/api/plugins/save", methods=["POST"], dependencies=AUTH)
 async def plugin_save(request: Request):
     body = await request.json()
     plugin_id = body.get("id")
@@ -495,117 +1352,785 @@ async def plugin_save(request: Request):
     plg = find_plugin(plugin_id)
     if plg is None:
         return JSONResponse({"success": False, "message": "插件未找到"}, status_code=404)
-    plg.config.update(plugin_config)
-
-    return JSONResponse({"success": True})
+    if not isinstance(plugin_config, dict):
+        return JSONResponse({"success": False, "message": "config 必须是对象"}, status_code=400)
+    name = config_key(plg)
+    try:
+        report = await reload_main_config(lambda doc: with_plugin_configs(doc, {name: plugin_config}))
+    except ConfigValidationError as e:
+        return JSONResponse({"success": False, "message": str(e), "errors": e.errors}, status_code=400)
+    return JSONResponse({"success": True, **report})
+
+@add_route("/api/plugins/batch", methods=["POST"], dependencies=AUTH)
+async def plugin_batch(request: Request):
+    """批量启用 / 停用插件并保存配置：{"items": [{"id": ..., "enable": true, "config": {...}}]}，
+    enable 与 config 均可省略；逐项返回结果，单项失败不影响其它项"""
+    body = await request.json()
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return JSONResponse({"success": False, "message": "items 必须是对象数组"}, status_code=400)
+    results = []
+    # 配置修改合并成一次主配置重载，只重载配置有变化的插件
+    configs: dict[str, dict] = {}
+    pending: dict[str, dict] = {}
+    for item in items:
+        plugin_id = item.get("id")
+        result = {"id": plugin_id, "success": False}
+        results.append(result)
+        plg = find_plugin(plugin_id) if plugin_id else None
+        if plg is None:
+            result["message"] = "插件未找到"
+            continue
+        plugin_config = item.get("config")
+        if plugin_config is not None and not isinstance(plugin_config, dict):
+            result["message"] = "config 必须是对象"
+            continue
+        try:
+            if item.get("enable") is True:
+                plg.enable()
+            elif item.get("enable") is False:
+                plg.disable()
+        except Exception as e:
+            result["message"] = str(e)
+        else:
+            result["success"] = True
+            if plugin_config:
+                name = config_key(plg)
+                configs[name] = {**configs.get(name, {}), **plugin_config}
+                pending[name] = result
+        plugin_list_cache.bump(plg.id)
+    if configs:
+        try:
+            report = await reload_main_config(lambda doc: with_plugin_configs(doc, configs))
+        except ConfigValidationError as e:
+            for name, result in pending.items():
+                result["success"] = False
+                own = [f"{key}: {error}" for key, error in e.errors.items() if key.split(".")[1:2] == [name]]
+                result["message"] = "; ".join(own) or str(e)
+        else:
+            applied = {entry["name"]: entry for entry in report["plugins"]}
+            for name, result in pending.items():
+                if name in applied:
+                    result["apply"] = applied[name]
+                    if applied[name]["status"] == "failed":
+                        result["success"] = False
+                        result["message"] = applied[name]["message"]
+    refresh_plugin_stats()
+    return JSONResponse({"success": all(r["success"] for r in results), "results": results})
 
 # ---------- 实时日志 WebSocket ----------
-fake_io = StringIO()
-logger.add(
-    fake_io,
-    level=0,
-    diagnose=True,
-    backtrace=True,
+log_buffer = LogBuffer(conf.log_buffer_lines, conf.log_buffer_bytes, conf.log_client_queue, conf.log_slow_client)
+log_capture = LogCapture(
+    log_buffer,
+    level=conf.log_sink_level,
+    diagnose=conf.log_sink_diagnose,
+    always=conf.log_capture_idle,
     colorize=True,
     filter=entari_log.default_filter,
     format=entari_log._custom_format,
 )
-conv = Ansi2HTMLConverter(inline=True, scheme="xterm")
+log_capture.start()
+plugin.collect_disposes(log_capture.detach)
 
 @add_websocket_route("/ws/log")
 async def websocket_log(websocket: WebSocket):
-    """实时推送日志到前端"""
+    """实时推送日志到前端：先回放最近的日志，之后有新日志立即推送；`?format=html` 推送服务端渲染好的 HTML。
+    需要 `?token=` 鉴权"""
     await websocket.accept()
+    if await websocket_user(websocket) is None:
+        return
+    html = websocket.query_params.get("format") == "html"
+    sub = log_buffer.subscribe(conf.log_replay_lines)
+    # 监听客户端断开，避免在没有新日志时订阅者一直挂着
+    receiver = asyncio.create_task(websocket.receive())
 
     try:
-        # 读取日志内容并发送
-        last_position = 0
         while True:
-            await asyncio.sleep(1)
-            fake_io.seek(last_position)
-            new_content = fake_io.read()
-            if new_content:
-                html = conv.convert(new_content, full=False)
-                await websocket.send_text(new_content)
-                last_position = fake_io.tell()
+            getter = asyncio.create_task(sub.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                message = receiver.result()
+                if message["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.create_task(websocket.receive())
+                continue
+            lines = getter.result()
+            if lines is None:
+                await websocket.send_text("日志推送积压过多，连接已断开")
+                break
+            await websocket.send_text(log_buffer.join(lines, html))
 
     except (asyncio.CancelledError, ConnectionResetError):
         pass  # 正常取消或连接重置
-    except FileNotFoundError:
-        await websocket.send_text("日志文件不存在，等待生成...")
     except WebSocketDisconnect:
         pass  # 客户端断开
     except Exception as e:
-        print(f"WebSocket错误: {str(e)}")
+        logger.opt(exception=e).warning("日志推送出错")
         await websocket.send_text(f"服务端错误: {str(e)}")
     finally:
+        log_buffer.unsubscribe(sub)
+        receiver.cancel()
         try:
             await websocket.close()
-        except:
+        except Exception:
             pass
 
-# ---------- 首页统计 ----------
-@add_route("/api/init_data", methods=["GET"])
-async def init_data():
-    week = await get_week_message_sum()
-    today = await get_today_message()
+@add_websocket_route("/ws/log/stream")
+async def websocket_log_stream(websocket: WebSocket):
+    """结构化日志推送：过滤条件可放在查询参数中，或随时发送
+    {"type": "filter", "level": "INFO", "source": ["satori"], "regex": "...", "html": false, "replay": 200}，
+    服务端只推送匹配的记录 {"type": "records", "items": [{time, level, source, plugin, message, html?}]}；需要 `?token=` 鉴权"""
+    await websocket.accept()
+    if await websocket_user(websocket) is None:
+        return
+    try:
+        log_filter = LogFilter.from_dict(dict(websocket.query_params), LEVELS)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close()
+        return
+    html = websocket.query_params.get("html") in ("1", "true")
+    sub = log_buffer.subscribe(conf.log_replay_lines, log_filter)
+    receiver = asyncio.create_task(websocket.receive())
 
+    try:
+        while True:
+            getter = asyncio.create_task(sub.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                message = receiver.result()
+                if message["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.create_task(websocket.receive())
+                try:
+                    data = json.loads(message.get("text") or "{}")
+                    if data.get("type") != "filter":
+                        raise ValueError(f"未知消息类型: {data.get('type')}")
+                    log_filter = LogFilter.from_dict(data, LEVELS)
+                    replay = min(int(data.get("replay", 0)), conf.log_replay_lines)
+                except (ValueError, TypeError) as e:
+                    await websocket.send_json({"type": "error", "message": str(e)})
+                    continue
+                html = bool(data.get("html", html))
+                log_buffer.refilter(sub, log_filter, replay)
+                await websocket.send_json({"type": "filter", "success": True})
+                continue
+            entries = getter.result()
+            if entries is None:
+                await websocket.send_json({"type": "error", "message": "日志推送积压过多，连接已断开"})
+                break
+            if html:
+                log_buffer.render_pending()
+            await websocket.send_json({
+                "type": "records",
+                "items": [entry.as_dict(html) for entry in entries],
+                "dropped": sub.dropped,
+            })
+
+    except (asyncio.CancelledError, ConnectionResetError, WebSocketDisconnect):
+        pass
+    except Exception as e:
+        logger.opt(exception=e).warning("结构化日志推送出错")
+    finally:
+        log_buffer.unsubscribe(sub)
+        receiver.cancel()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+# ---------- 历史日志检索 ----------
+log_store = LogStore(Path(conf.log_dir))
+
+@add_route("/api/logs/files", methods=["GET"], dependencies=AUTH)
+async def log_files():
+    """列出当前日志与轮转归档，附带记录数和时间范围（首次访问时建立索引）"""
+    def describe():
+        log_store.prune()
+        return log_store.describe()
+    return JSONResponse(await asyncio.to_thread(describe))
+
+@add_route("/api/logs/search", methods=["GET"], dependencies=AUTH)
+async def log_search(request: Request):
+    """检索历史日志，从新到旧分页：q 子串、level 最低级别、name 模块前缀、from / to 时间范围、cursor 翻页游标"""
+    params = request.query_params
+    try:
+        start = parse_time(params["from"]) if params.get("from") else None
+        end = parse_time(params["to"]) if params.get("to") else None
+        limit = min(max(int(params.get("limit", 100)), 1), conf.log_search_limit)
+        cursor = params.get("cursor") or None
+        if cursor and not cursor.rpartition(":")[2].isdigit():
+            raise ValueError("非法游标")
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    level = params.get("level", "").upper()
+    if level and level not in LEVELS:
+        return JSONResponse({"success": False, "message": f"未知日志级别: {level}"}, status_code=400)
+
+    records, next_cursor = await asyncio.to_thread(
+        log_store.search,
+        q=params.get("q", ""),
+        level=LEVELS.get(level, 0),
+        name=params.get("name", ""),
+        start=start,
+        end=end,
+        limit=limit,
+        cursor=cursor,
+    )
+    return JSONResponse({"items": [r.as_dict() for r in records], "cursor": next_cursor})
+
+# ---------- 首页统计 ----------
+@add_route("/api/init_data", methods=["GET"], dependencies=AUTH)
+async def init_data(request: Request):
+    """直接返回内存快照；数据未变化时按 If-None-Match 返回 304"""
+    today = datetime.utcnow().date()
+    runtime_min = int((datetime.utcnow() - START_TIME).total_seconds() // 60)
+    etag = dashboard_stats.etag(today, runtime_min)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(dashboard_stats.snapshot(today, runtime_min), headers=headers)
+
+@add_route("/api/stats/range", methods=["GET"], dependencies=AUTH)
+async def stats_range(request: Request):
+    """按时间范围查询消息量序列：from / to 为时间戳或 ISO 时间，step 如 5m、1h、1d，group_by 为 platform 或 instance"""
+    params = request.query_params
+    try:
+        end = parse_time(params["to"]) if "to" in params else int(time.time())
+        start = parse_time(params["from"]) if "from" in params else end - DAY
+        step = parse_step(params["step"]) if "step" in params else auto_step(start, end)
+    except (ValueError, KeyError) as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    group_by = params.get("group_by", "platform")
+    if group_by not in ("platform", "instance"):
+        return JSONResponse({"success": False, "message": "group_by 只能是 platform 或 instance"}, status_code=400)
+    start = start // step * step
+    end = -(-end // step) * step
+    if end <= start or (end - start) // step > conf.stats_max_points:
+        return JSONResponse({"success": False, "message": "时间范围或步长不合法"}, status_code=400)
+
+    group_col = MessageRollup.platform if group_by == "platform" else MessageRollup.instance_id
+    # 各粒度的行覆盖互不重叠的时段，直接按步长对齐后求和；比步长更粗的行落在其所属步长桶的起点
+    bucket_col = (MessageRollup.bucket - MessageRollup.bucket % step).label("t")
     async with get_session() as session:
-        total_msg = await session.execute(select(func.sum(MessageStat.count)))
-        message_count = total_msg.scalar() or 0
+        rows = (await session.execute(
+            select(bucket_col, group_col, func.sum(MessageRollup.count))
+            .where(MessageRollup.bucket >= start, MessageRollup.bucket < end)
+            .group_by(bucket_col, group_col)
+        )).all()
+    # 尚未落库的增量在内存中合并，保证最新一分钟也能查到
+    for (platform, instance_id, key), count in message_counter.pending_items():
+        bucket = key_epoch(key)
+        if start <= bucket < end:
+            rows.append((bucket - bucket % step, platform if group_by == "platform" else instance_id, count))
+    return JSONResponse(build_series(rows, start, end, step))
 
-    plugins = get_plugins()
-    enabled_cnt = sum(1 for p in plugins if p.is_available)
+@plugin.listen(SendResponse)
+async def count_sent(event: SendResponse):   # 参数名 = 事件类型名（小写）
+    """只在内存中计数，由 message_counter 后台批量落库"""
+    started = time.perf_counter()
+    platform = event.account.platform or 'unknown'
+    now = datetime.utcnow()
+    message_counter.incr(platform, 0, minute_key(now))
+    dashboard_stats.incr(now.date().isoformat())
+    live_hub.touch("stats")
+    webui_metrics.observe("count_sent", time.perf_counter() - started)
+
+# ---------- 实时数据通道 ----------
+def live_stats() -> dict:
+    today = datetime.utcnow().date()
     runtime_min = int((datetime.utcnow() - START_TIME).total_seconds() // 60)
+    return dashboard_stats.snapshot(today, runtime_min)
+
+def live_plugins() -> dict:
+    return {p.id: plugin_list_cache.get(p, serialize_plugin) for p in get_plugins()}
+
+def live_tasks() -> dict:
+    return {
+        task_id: {k: v for k, v in task.as_dict().items() if k != "log"}
+        for task_id, task in task_map.items()
+    }
+
+def live_instances(user_id: str):
+    """按用户派生的实例主题；资源占用变化太频繁，不放进实时状态，仍由 /api/instances 轮询"""
+    def source() -> dict:
+        return {
+            str(inst.id): {k: v for k, v in instance_view(inst).items() if k != "stats"}
+            for inst in instance_registry.owned_by(int(user_id))
+        }
+    return source
+
+live_hub.register("stats", live_stats)
+live_hub.register("plugins", live_plugins)
+live_hub.register("tasks", live_tasks)
+live_hub.register_family("instances", live_instances)
+
+@add_websocket_route("/ws/live")
+async def websocket_live(websocket: WebSocket):
+    """面板全部实时数据共用的连接
+
+    - 连接参数：`?token=` 鉴权，`?format=json|msgpack` 帧编码，`?topics=stats,plugins` 初始订阅
+    - 客户端消息：`{"op": "sub", "topics": {"stats": 12, "tasks": null}, "epoch": "...", "logs": {过滤条件, "html": false}}`、
+      `{"op": "unsub", "topics": ["tasks"]}`；topics 中的值为上次收到的序号，epoch 与服务端一致时从该序号续传
+    - 服务端帧：`{"t": 主题, "s": 序号, "snap": {...}}` 快照，`{"t": 主题, "s": 序号, "set": {...}, "del": [...]}` 增量，
+      日志为 `{"t": "logs", "s": 最后一条的序号, "d": 文本}`
+    """
+    await websocket.accept()
+    params = websocket.query_params
+    fmt = params.get("format", "json")
+    if fmt not in FORMATS:
+        fmt = "json"
+
+    async def send(data):
+        payload = data.encode(fmt) if isinstance(data, Frame) else live_encode(data, fmt)
+        if isinstance(payload, bytes):
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
 
+    try:
+        auth = await user_for_token(params.get("token") or request_token(websocket))
+    except AuthError as e:
+        await send({"t": "error", "message": e.message})
+        await websocket.close(code=4401)
+        return
+
+    sub = LiveSubscriber()
+    logs = None
+    log_html = False
+    log_getter: Optional[asyncio.Task] = None
+
+    def find_topic(name: str):
+        return live_hub.topic(name, str(auth.id) if name in live_hub.families else None)
+
+    def unsubscribe_logs():
+        nonlocal logs, log_getter
+        if log_getter is not None:
+            log_getter.cancel()
+            log_getter = None
+        if logs is not None:
+            log_buffer.unsubscribe(logs)
+            logs = None
+
+    async def subscribe(topics: dict, epoch: Optional[str], log_options: dict):
+        nonlocal logs, log_html, log_getter
+        for name, since in topics.items():
+            since = since if isinstance(since, int) and not isinstance(since, bool) else None
+            if name == "logs":
+                log_filter = LogFilter.from_dict(log_options, LEVELS)
+                unsubscribe_logs()
+                log_html = bool(log_options.get("html"))
+                after = since if since is not None and epoch == live_hub.epoch else None
+                logs = log_buffer.subscribe(conf.log_replay_lines, log_filter, after)
+                log_getter = asyncio.create_task(logs.get())
+                continue
+            topic = find_topic(name)
+            if topic is None:
+                await send({"t": "error", "message": f"未知主题: {name}"})
+                continue
+            for frame in await live_hub.subscribe(sub, topic, since, epoch):
+                await send(frame)
+
+    async def handle(data: dict):
+        if not isinstance(data, dict):
+            raise ValueError("消息必须是对象")
+        op = data.get("op")
+        if op == "sub":
+            topics = data.get("topics") or {}
+            if isinstance(topics, list):
+                topics = dict.fromkeys(topics)
+            log_options = data.get("logs") or {}
+            if not isinstance(topics, dict) or not isinstance(log_options, dict):
+                raise ValueError("topics 必须是对象或数组，logs 必须是对象")
+            await subscribe(topics, data.get("epoch"), log_options)
+        elif op == "unsub":
+            for name in data.get("topics") or []:
+                if name == "logs":
+                    unsubscribe_logs()
+                elif topic := find_topic(name):
+                    live_hub.unsubscribe(sub, topic)
+        else:
+            raise ValueError(f"未知操作: {op}")
+
+    receiver = asyncio.create_task(websocket.receive())
+    getter = asyncio.create_task(sub.get())
+    try:
+        await send({"t": "hello", "epoch": live_hub.epoch, "format": fmt, "topics": [*live_hub.names, "logs"]})
+        initial = [name for name in params.get("topics", "").split(",") if name]
+        if initial:
+            await subscribe(dict.fromkeys(initial), None, {})
+        while True:
+            waiting = {receiver, getter} | ({log_getter} if log_getter is not None else set())
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                message = receiver.result()
+                if message["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.create_task(websocket.receive())
+                try:
+                    await handle(live_decode(message.get("text") or message.get("bytes") or "{}"))
+                except (ValueError, TypeError) as e:
+                    await send({"t": "error", "message": str(e)})
+            if getter in done:
+                frames, resync = getter.result()
+                getter = asyncio.create_task(sub.get())
+                # 积压被丢弃的主题直接发当前快照，快照已包含其后的增量
+                for topic in resync:
+                    await send(topic.snapshot())
+                skipped = {topic.family for topic in resync}
+                for frame in frames:
+                    if frame.data["t"] not in skipped:
+                        await send(frame)
+            if log_getter is not None and log_getter in done:
+                entries = log_getter.result()
+                if entries is None:
+                    # 日志积压过多：跳过缺口，从最新位置继续推送
+                    log_filter = logs.filter
+                    unsubscribe_logs()
+                    await send({"t": "logs", "s": log_buffer.seq, "gap": True})
+                    logs = log_buffer.subscribe(0, log_filter)
+                elif entries:
+                    await send({"t": "logs", "s": entries[-1].seq, "d": log_buffer.join(entries, log_html)})
+                log_getter = asyncio.create_task(logs.get())
+
+    except (asyncio.CancelledError, ConnectionResetError, WebSocketDisconnect):
+        pass
+    except Exception as e:
+        logger.opt(exception=e).warning("实时数据推送出错")
+    finally:
+        live_hub.unsubscribe(sub)
+        unsubscribe_logs()
+        receiver.cancel()
+        getter.cancel()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+# ---------- 运行指标接口 ----------
+def metrics_gauges() -> dict[str, float]:
+    return {
+        "event_loop_lag_last_seconds": loop_monitor.last,
+        "event_loop_lag_max_seconds": loop_monitor.max,
+        "asyncio_tasks": len(asyncio.all_tasks()),
+        "message_counter_pending": message_counter.pending(),
+        "instance_registry_dirty": instance_registry.pending(),
+        "log_subscribers": len(log_buffer.subscribers),
+        "live_subscribers": live_hub.subscriber_count,
+        "log_sink_attached": int(log_capture.attached),
+        "token_cache_hits": token_cache.hits,
+        "token_cache_misses": token_cache.misses,
+        "plugin_cache_hits": plugin_list_cache.hits,
+        "plugin_cache_misses": plugin_list_cache.misses,
+        "inventory_refreshes": distribution_inventory.refresh_count,
+        "pip_tasks_running": sum(1 for task in task_map.values() if not task.finished),
+        "sampler_overhead_ratio": resource_sampler.overhead,
+    }
+
+@add_route("/api/metrics", methods=["GET"], dependencies=[] if conf.metrics_public else AUTH)
+async def metrics():
+    """Prometheus 文本格式的运行指标"""
+    return Response(webui_metrics.render(gauges=metrics_gauges()), media_type="text/plain; version=0.0.4")
+
+@add_route("/api/system/stats", methods=["GET"], dependencies=AUTH)
+async def system_stats(since: int = 0):
+    """进程资源样本；传入 since 时只返回序号更大的样本"""
     return JSONResponse({
-        "today_messages": today,
-        "weekMessages": week,
-        "message_count": message_count,
-        "plugin_enabled": enabled_cnt,
-        "plugin_total": len(plugins),
-        "runtime": runtime_min
+        "interval": resource_sampler.interval,
+        "overhead": resource_sampler.overhead,
+        "samples": resource_sampler.since(since),
     })
 
-@plugin.listen(SendResponse)
-@inject(SqlalchemyService)
-async def count_sent(event: SendResponse):   # 参数名 = 事件类型名（小写）
-    platform = event.account.platform or 'unknown'
-    today = datetime.utcnow().date().isoformat()
+@add_websocket_route("/ws/system/stats")
+async def websocket_system_stats(websocket: WebSocket):
+    """先发送历史样本快照，之后每产生一个样本推送一次；需要 `?token=` 鉴权"""
+    await websocket.accept()
+    if await websocket_user(websocket) is None:
+        return
+    since = websocket.query_params.get("since", "0")
+    since = int(since) if since.isdigit() else 0
+    queue = resource_sampler.subscribe()
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        await websocket.send_json({"type": "snapshot", "interval": resource_sampler.interval, "samples": resource_sampler.since(since)})
+        while True:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.create_task(websocket.receive())
+                continue
+            await websocket.send_json({"type": "sample", **getter.result()})
+    except (asyncio.CancelledError, ConnectionResetError, WebSocketDisconnect):
+        pass
+    finally:
+        resource_sampler.unsubscribe(queue)
+        receiver.cancel()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
+@add_route("/api/metrics/summary", methods=["GET"], dependencies=AUTH)
+async def metrics_summary():
+    """面板用的指标摘要：各路由的次数 / 分位延迟 / 流量 / 错误率，以及各计时器"""
+    return JSONResponse({**webui_metrics.snapshot(), "gauges": metrics_gauges()})
+
+@add_route("/api/debug/queries", methods=["GET"], dependencies=AUTH)
+async def debug_queries(reset: bool = False):
+    """各命名查询的次数 / 分位耗时（按累计耗时排序）、连接池状态与 SQLite pragma 的实际取值"""
     async with get_session() as session:
-        row = await session.execute(
-            select(MessageStat).where(
-                MessageStat.platform == platform,
-                MessageStat.date == today
-            )
+        pragmas = await sqlite_pragmas.current(session)
+    data = {
+        "queries": query_stats.snapshot(),
+        "pool": {key or "default": pool_status(engine) for key, engine in db_service.engines.items()},
+        "pragmas": pragmas,
+        "session": {
+            "acquire": webui_metrics.histogram("db_session_acquire").summary(),
+            "hold": webui_metrics.histogram("db_session").summary(),
+        },
+    }
+    if reset:
+        query_stats.reset()
+    return JSONResponse(data)
+
+profiler = SamplingProfiler()
+
+def plugin_modules() -> dict[str, str]:
+    """{模块名: 插件 id}；包内子模块注册成的子插件不单独列出，按模块名前缀归属到所在的插件"""
+    modules = {plg.module.__name__: plg.id for plg in get_plugins()}
+    return {
+        name: plugin_id
+        for name, plugin_id in modules.items()
+        if not any(name.startswith(f"{parent}.") for parent in modules)
+    }
+
+def profile_response(report: dict, format: str) -> Response:
+    if format == "collapsed":
+        return Response(
+            report["collapsed"],
+            media_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="profile.folded"'},
+        )
+    return JSONResponse(report)
+
+@add_route("/api/debug/profile", methods=["POST"], dependencies=AUTH)
+async def debug_profile(
+    duration: float = 10, interval: float = 0.005, threshold: float = 0.05, idle: bool = False, format: str = "json"
+):
+    """在 duration 秒内按 interval 采样事件循环线程的调用栈，并记录耗时超过 threshold 秒的回调，结束后返回：
+    `format=collapsed` 为折叠栈文件（flamegraph.pl / speedscope 可直接打开），否则为按插件汇总的 JSON；
+    `idle=true` 时折叠栈中保留事件循环空闲等待的样本"""
+    if not 0 < duration <= conf.profile_max_seconds:
+        return JSONResponse(
+            {"success": False, "message": f"duration 须在 0 到 {conf.profile_max_seconds} 秒之间"}, status_code=400
         )
-        row = row.scalar_one_or_none()
-        if row:
-            row.count += 1
+    if interval < 0.001 or threshold <= 0:
+        return JSONResponse({"success": False, "message": "interval 不能小于 0.001，threshold 必须为正数"}, status_code=400)
+    try:
+        report = await profiler.run(duration, interval, threshold, plugin_modules(), idle)
+    except RuntimeError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=409)
+    return profile_response(report, format)
+
+@add_route("/api/debug/profile", methods=["GET"], dependencies=AUTH)
+async def last_profile(format: str = "json"):
+    """最近一次采样的结果"""
+    if profiler.last is None:
+        return JSONResponse({"success": False, "message": "尚未采样"}, status_code=404)
+    return profile_response(profiler.last, format)
+
+# ---------- 主配置热重载 ----------
+config_reloader = ConfigReloader()
+webui_metrics.histogram("config_apply", "单个插件配置生效耗时")
+
+def config_key(plg) -> str:
+    """插件在主配置 plugins 段中的名称（加载时记录在 $path 中）"""
+    return plg.config.get("$path", plg.id)
+
+def with_plugin_configs(doc: dict, configs: dict[str, dict]) -> dict:
+    """返回修改了若干插件段的主配置副本，新值与原有配置逐键合并"""
+    doc = copy.deepcopy(doc)
+    plugins = config_root(doc).setdefault("plugins", {})
+    for name, config in configs.items():
+        key = plugin_section_key(doc, name) or name
+        plugins[key] = {**(plugins.get(key) or {}), **config}
+    return doc
+
+def config_watched() -> bool:
+    """auto_reload 开启 watch_config 时 entari 按路径监视主配置文件；
+    以 rename 替换文件后监视会失效（此后外部修改不再触发重载），此时主配置只能原地写入"""
+    plg = find_plugin("arclet.entari.builtins.auto_reload")
+    return bool(plg is not None and plg.config.get("watch_config"))
+
+def basic_config(doc: dict) -> dict:
+    return asdict(config_model_validate(BasicConfig, config_root(doc).get("basic") or {}))
+
+def validate_config(doc) -> None:
+    """写入前校验：basic 段按 BasicConfig，已加载的插件按各自声明的配置模型"""
+    if not isinstance(doc, dict):
+        raise ConfigValidationError({"": "配置必须是对象"})
+    errors: dict[str, str] = {}
+    root = config_root(doc)
+    if not isinstance(root.get("basic") or {}, dict):
+        errors["basic"] = "basic 必须是对象"
+    else:
+        errors.update({f"basic.{key}": error for key, error in check_fields(BasicConfig, root.get("basic") or {}).items()})
+        if not errors:
+            try:
+                basic_config(doc)
+            except Exception as e:
+                errors["basic"] = str(e) or type(e).__name__
+    section = root.get("plugins") or {}
+    if not isinstance(section, dict):
+        errors["plugins"] = "plugins 必须是对象"
+        section = {}
+    for key, value in section.items():
+        if key.startswith("$"):
+            continue
+        if value is not None and not isinstance(value, dict):
+            errors[f"plugins.{key}"] = "插件配置必须是对象"
+            continue
+        plg = find_plugin(key.lstrip("~?").replace("::", "arclet.entari.builtins."))
+        model = plg.metadata.config if plg is not None and plg.metadata else None
+        if model is None:
+            continue
+        field_errors = check_fields(model, value or {})
+        if field_errors:
+            errors.update({f"plugins.{key}.{name}": error for name, error in field_errors.items()})
+            continue
+        try:
+            config_model_validate(model, value or {})
+        except Exception as e:
+            errors[f"plugins.{key}"] = str(e) or type(e).__name__
+    if errors:
+        raise ConfigValidationError(errors)
+
+async def apply_plugin_change(change: PluginChange) -> dict:
+    """让一个插件的配置变化生效：插件自己处理 ConfigReload 时不重载，否则卸载后按新配置加载"""
+    entry = {**change.as_dict(), "status": "applied", "message": ""}
+    pid = change.name.replace("::", "arclet.entari.builtins.")
+    started = time.perf_counter()
+    try:
+        plg = find_plugin(pid)
+        action = "load" if change.action != "unload" and plg is None else change.action
+        if action == "unload":
+            if plg is None:
+                entry.update(status="skipped", message="插件未加载")
+            elif plg.is_static:
+                entry.update(status="skipped", message="静态插件，重启后生效")
+            else:
+                unload_plugin(pid)
+                entry["status"] = "unloaded"
+        elif action == "load":
+            loaded = load_plugin(change.name, dict(change.new))
+            if loaded is None:
+                entry.update(status="failed", message="插件加载失败")
+            else:
+                if change.new.get("$disable"):
+                    loaded.disable()
+                entry["status"] = "loaded"
         else:
-            session.add(MessageStat(
-                platform=platform,
-                instance_id=0,
-                date=today,
-                count=1
-            ))
-        await session.commit()
+            if action == "reconfigure":
+                res = await es.post(ConfigReload("plugin", change.name, change.new, change.old))
+                if res and res.value:
+                    # 插件自行应用了新配置，同步它持有的配置字典
+                    path = plg.config.get("$path")
+                    plg.config.clear()
+                    plg.config.update(change.new)
+                    if path is not None:
+                        plg.config["$path"] = path
+                    entry["status"] = "handled"
+                elif plg.id == __name__:
+                    entry.update(status="skipped", message="WebUI 自身的配置重启后生效")
+                elif plg.is_static:
+                    entry.update(status="skipped", message="静态插件，重启后生效")
+                else:
+                    unload_plugin(pid)
+                    plg = load_plugin(change.name, dict(change.new))
+                    if plg is None:
+                        entry.update(status="failed", message="插件重新加载失败")
+                    else:
+                        entry["status"] = "reloaded"
+            if plg is not None and change.enable is not None and entry["status"] != "failed":
+                plg.enable() if change.enable else plg.disable()
+                if action == "toggle":
+                    entry["status"] = "enabled" if change.enable else "disabled"
+    except Exception as e:
+        logger.exception(f"应用插件 {change.name} 的配置失败")
+        entry.update(status="failed", message=str(e) or type(e).__name__)
+    elapsed = time.perf_counter() - started
+    webui_metrics.observe("config_apply", elapsed)
+    entry["ms"] = round(elapsed * 1000, 3)
+    logger.info(f"插件 {change.name} 配置变更: {change.action} -> {entry['status']}（{entry['ms']:.1f} ms）")
+    return entry
+
+async def reload_main_config(build, dry_run: bool = False) -> dict:
+    """build(当前主配置) -> 新主配置；校验通过后写入文件，按与上次应用配置的差异逐个插件生效。
+    basic 段的变化按键发布 ConfigReload，由 entari 核心处理（日志级别、网络连接等）"""
+    async with config_reloader.lock:
+        current = await config_store.load(CONFIG_FILE) or {}
+        if config_reloader.applied is None:
+            config_reloader.remember(current)
+        doc = build(current)
+        validate_config(doc)
+        old_basic, new_basic = basic_config(config_reloader.applied), basic_config(doc)
+        basic_keys = diff_basic(old_basic, new_basic)
+        changes = config_reloader.plan(doc)
+        if dry_run:
+            return {"dry_run": True, "basic": basic_keys, "plugins": [change.as_dict() for change in changes]}
+        started = time.perf_counter()
+        await config_store.save(CONFIG_FILE, doc, in_place=config_watched())
+        # 同步 entari 内存中的配置；其文件监视稍后读到的是同一份内容，不会重复应用
+        EntariConfig.instance.save_flag = False
+        try:
+            EntariConfig.instance.reload()
+        except Exception as e:
+            logger.warning(f"同步内存中的主配置失败: {e!r}")
+        basic = []
+        for key in basic_keys:
+            key_started = time.perf_counter()
+            await es.publish(ConfigReload("basic", key, new_basic.get(key), old_basic.get(key)))
+            basic.append({"key": key, "ms": round((time.perf_counter() - key_started) * 1000, 3)})
+        plugins = [await apply_plugin_change(change) for change in changes]
+        # 各插件处理完后才更新基准；未能生效的插件保留旧配置段，下次重载时重新计入差异
+        config_reloader.remember(doc, [entry["name"] for entry in plugins if entry["status"] == "failed"])
+        if changes:
+            plugin_list_cache.bump()
+            refresh_plugin_stats()
+    return {"basic": basic, "plugins": plugins, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
 
 # ---------- 主配置读写 ----------
-@add_route("/api/config", methods=["GET"])
+@add_route("/api/config", methods=["GET"], dependencies=AUTH)
 async def get_config():
-    filepath = Path(CONFIG_FILE)
-    if not filepath.exists():
-        return JSONResponse({})
-    with open(filepath, encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-    # print(data)
-    return JSONResponse(data)
+    data = await config_store.load(CONFIG_FILE)
+    return JSONResponse(data or {})
 
-@add_route("/api/config", methods=["POST"])
-async def save_config(request: Request):
+@add_route("/api/config", methods=["POST"], dependencies=AUTH)
+async def save_config(request: Request, dry_run: bool = False):
+    """保存主配置并热重载变化的部分；dry_run 时只校验并返回变更计划"""
     body = await request.json()
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        yaml.dump(body, f, allow_unicode=True, sort_keys=False)
-    return JSONResponse({"success": True})
\ No newline at end of file
+    try:
+        report = await reload_main_config(lambda _: body, dry_run)
+    except ConfigValidationError as e:
+        return JSONResponse({"success": False, "message": str(e), "errors": e.errors}, status_code=400)
+    return JSONResponse({"success": True, **report})
+
+@add_route("/api/config", methods=["PATCH"], dependencies=AUTH)
+async def patch_config(request: Request, dry_run: bool = False):
+    """按 JSON Patch（add / remove / replace / test）局部修改主配置，随后与整体保存一样热重载"""
+    body = await request.json()
+    ops = body.get("ops") if isinstance(body, dict) else body
+    if not isinstance(ops, list):
+        return JSONResponse({"success": False, "message": "请求体应为 JSON Patch 操作列表"}, status_code=400)
+    try:
+        report = await reload_main_config(lambda doc: apply_patch(doc, ops), dry_run)
+    except PatchError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    except ConfigValidationError as e:
+        return JSONResponse({"success": False, "message": str(e), "errors": e.errors}, status_code=400)
+    return JSONResponse({"success": True, **report})
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+ANSI 转 HTML：日志写入缓冲时逐条渲染一次，SGR 状态（颜色、粗体等）在记录之间延续，
+基础 8 色输出为前端主题中的 CSS 变量，256 色与真彩色输出为十六进制颜色
+"""
+
+import re
+from html import escape
+from typing import Optional
+
+SGR = re.compile(r"\x1b\[([0-9;]*)m")
+# 光标移动、清屏等其它控制序列对日志没有意义，直接丢弃
+OTHER_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-ln-z]|\x1b\][^\x07]*\x07")
+
+NAMES = ("black", "red", "green", "yellow", "blue", "magenta", "cyan", "white")
+BASIC = tuple(f"var(--log-ansi-{name})" for name in NAMES)
+# 高亮色主题里未定义时退回常见终端配色
+BRIGHT = tuple(
+    f"var(--log-ansi-bright-{name}, {default})"
+    for name, default in zip(NAMES, ("#555", "#f55", "#5f5", "#ff5", "#55f", "#f5f", "#5ff", "#fff"))
+)
+CUBE = (0, 95, 135, 175, 215, 255)
+
+
+def color_256(n: int) -> str:
+    if n < 16:
+        return BASIC[n] if n < 8 else BRIGHT[n - 8]
+    if n < 232:
+        n -= 16
+        return "#{:02x}{:02x}{:02x}".format(CUBE[n // 36], CUBE[n // 6 % 6], CUBE[n % 6])
+    gray = 8 + (n - 232) * 10
+    return f"#{gray:02x}{gray:02x}{gray:02x}"
+
+
+class AnsiRenderer:
+    """有状态的渲染器：一条记录里未复位的样式会带到下一条记录"""
+
+    def __init__(self):
+        self._spans: dict[tuple, str] = {}
+        self.reset()
+
+    def reset(self):
+        self.fg: Optional[str] = None
+        self.bg: Optional[str] = None
+        self.bold = self.dim = self.italic = self.underline = self.strike = self.inverse = False
+        self._open = ""
+        self._dirty = False
+
+    def _apply(self, params: str):
+        codes = [int(c) if c else 0 for c in params.split(";")] if params else [0]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                self.reset()
+            elif code == 1:
+                self.bold = True
+            elif code == 2:
+                self.dim = True
+            elif code == 3:
+                self.italic = True
+            elif code == 4:
+                self.underline = True
+            elif code == 7:
+                self.inverse = True
+            elif code == 9:
+                self.strike = True
+            elif code == 22:
+                self.bold = self.dim = False
+            elif code == 23:
+                self.italic = False
+            elif code == 24:
+                self.underline = False
+            elif code == 27:
+                self.inverse = False
+            elif code == 29:
+                self.strike = False
+            elif 30 <= code <= 37:
+                self.fg = BASIC[code - 30]
+            elif 90 <= code <= 97:
+                self.fg = BRIGHT[code - 90]
+            elif 40 <= code <= 47:
+                self.bg = BASIC[code - 40]
+            elif 100 <= code <= 107:
+                self.bg = BRIGHT[code - 100]
+            elif code == 39:
+                self.fg = None
+            elif code == 49:
+                self.bg = None
+            elif code in (38, 48):
+                color = None
+                if i + 2 < len(codes) and codes[i + 1] == 5:
+                    color = color_256(codes[i + 2] & 0xFF)
+                    i += 2
+                elif i + 4 < len(codes) and codes[i + 1] == 2:
+                    r, g, b = (c & 0xFF for c in codes[i + 2:i + 5])
+                    color = f"#{r:02x}{g:02x}{b:02x}"
+                    i += 4
+                if code == 38:
+                    self.fg = color
+                else:
+                    self.bg = color
+            i += 1
+        self._dirty = True
+
+    def _span(self) -> str:
+        key = (self.fg, self.bg, self.bold, self.dim, self.italic, self.underline, self.strike, self.inverse)
+        span = self._spans.get(key)
+        if span is None:
+            if len(self._spans) > 1024:
+                self._spans.clear()
+            span = self._spans[key] = self._build_span()
+        return span
+
+    def _build_span(self) -> str:
+        fg, bg = self.fg, self.bg
+        if self.inverse:
+            fg, bg = bg or "var(--log-bg)", fg or "var(--log-line-text)"
+        styles = []
+        if fg:
+            styles.append(f"color:{fg}")
+        if bg:
+            styles.append(f"background-color:{bg}")
+        if self.bold:
+            styles.append("font-weight:bold")
+        if self.dim:
+            styles.append("opacity:.7")
+        if self.italic:
+            styles.append("font-style:italic")
+        decorations = " ".join(d for d, on in (("underline", self.underline), ("line-through", self.strike)) if on)
+        if decorations:
+            styles.append(f"text-decoration:{decorations}")
+        return f'<span style="{";".join(styles)}">' if styles else ""
+
+    def _emit(self, text: str, out: list[str]):
+        if not text:
+            return
+        if self._dirty:
+            self._open = self._span()
+            self._dirty = False
+        text = escape(text, quote=False)
+        if not self._open:
+            out.append(text)
+            return
+        # 每行单独闭合，前端按行切分时不会截断标签
+        lines = text.split("\n")
+        for n, line in enumerate(lines):
+            if n:
+                out.append("\n")
+            if line:
+                out.append(f"{self._open}{line}</span>")
+
+    def render(self, text: str) -> str:
+        if "\x1b" not in text:
+            out: list[str] = []
+            self._emit(text, out)
+            return "".join(out)
+        text = OTHER_ESCAPE.sub("", text)
+        out = []
+        pos = 0
+        for match in SGR.finditer(text):
+            self._emit(text[pos:match.start()], out)
+            self._apply(match.group(1))
+            pos = match.end()
+        self._emit(text[pos:], out)
+        return "".join(out)
+
+
+def ansi_to_html(text: str) -> str:
+    """无状态转换，用于没有经过缓冲的文本"""
+    return AnsiRenderer().render(text)
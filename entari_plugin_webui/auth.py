@@ -0,0 +1,59 @@
+"""
+Token 鉴权缓存：把 token -> 用户 的查询结果缓存在内存中，带 TTL 与 LRU 淘汰
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+class AuthError(Exception):
+    """鉴权失败，由全局异常处理器转换为 `{"success": False, "message": ...}`"""
+
+    def __init__(self, message: str, status_code: int = 401):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """缓存中的用户快照，不持有 ORM 对象，避免跨会话访问"""
+    id: int
+    name: str
+    email: str
+
+
+class TokenCache:
+    def __init__(self, ttl: float = 300, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[float, AuthUser]] = OrderedDict()
+
+    def get(self, token: str) -> Optional[AuthUser]:
+        item = self._data.get(token)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[token]
+            self.misses += 1
+            return None
+        self._data.move_to_end(token)
+        self.hits += 1
+        return item[1]
+
+    def put(self, token: str, user: AuthUser):
+        self._data[token] = (time.monotonic() + self.ttl, user)
+        self._data.move_to_end(token)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, token: str):
+        self._data.pop(token, None)
+
+    def invalidate_user(self, user_id: int):
+        """清除某个用户的全部 token，用于登录、改密等场景"""
+        for token in [k for k, (_, u) in self._data.items() if u.id == user_id]:
+            del self._data[token]
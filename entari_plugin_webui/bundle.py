@@ -0,0 +1,66 @@
+"""
+实例配置归档：多个 `<实例名>.yml` 打包为一个 zip，用于批量导出 / 导入；
+解包时校验文件名、条目数量与解压后大小，配置内容必须是 YAML 映射
+"""
+
+import io
+import zipfile
+import zlib
+from pathlib import PurePosixPath
+
+import yaml
+
+from .configstore import SafeLoader
+
+SUFFIXES = (".yml", ".yaml")
+
+
+def pack_configs(files: dict[str, bytes]) -> bytes:
+    """{文件名: 原始内容} -> zip；直接打包原文件，保留注释与格式"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in sorted(files.items()):
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def unpack_configs(data: bytes, max_files: int = 256, max_bytes: int = 16 * 1024 * 1024) -> dict[str, dict]:
+    """zip -> {实例名: 配置}；忽略目录与非 YAML 文件，子目录中的文件按文件名导入"""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise ValueError("不是有效的 zip 文件") from None
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and PurePosixPath(info.filename).suffix.lower() in SUFFIXES
+            and not PurePosixPath(info.filename).name.startswith(".")
+        ]
+        if len(members) > max_files:
+            raise ValueError(f"归档中的配置文件超过 {max_files} 个")
+        # file_size 来自归档目录，读取时再按实际解压字节数校验一次
+        if sum(info.file_size for info in members) > max_bytes:
+            raise ValueError("归档解压后过大")
+        configs: dict[str, dict] = {}
+        remaining = max_bytes
+        for info in members:
+            name = PurePosixPath(info.filename).stem
+            if name in configs:
+                raise ValueError(f"归档中有重名的实例: {name}")
+            try:
+                with archive.open(info) as f:
+                    content = f.read(remaining + 1)
+            except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError) as e:
+                # 头部记录的大小与实际内容不符（CRC 校验失败）、数据损坏或不支持的压缩方式
+                raise ValueError(f"{info.filename} 无法解压: {e}") from None
+            remaining -= len(content)
+            if remaining < 0:
+                raise ValueError("归档解压后过大")
+            try:
+                config = yaml.load(content.decode("utf-8"), Loader=SafeLoader) or {}
+            except (UnicodeDecodeError, yaml.YAMLError) as e:
+                raise ValueError(f"{info.filename} 不是有效的 YAML: {e}") from None
+            if not isinstance(config, dict):
+                raise ValueError(f"{info.filename} 的顶层必须是映射")
+            configs[name] = config
+    return configs
@@ -0,0 +1,194 @@
+"""
+YAML 配置读写：按 mtime/size 缓存解析结果，文件 IO 放到线程池，
+写入走 临时文件 + fsync + rename，并按文件加异步锁；apply_patch 提供 JSON Patch 局部修改
+"""
+
+import asyncio
+import copy
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Union
+
+import yaml
+
+# 优先使用 libyaml 的 C 实现
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+PathLike = Union[str, Path]
+
+
+class PatchError(ValueError):
+    """JSON Patch 操作无法应用"""
+
+
+def _parse_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"非法路径: {pointer}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in pointer[1:].split("/")]
+
+
+def _walk(doc: Any, parts: list[str]) -> Any:
+    for part in parts:
+        if isinstance(doc, list):
+            try:
+                doc = doc[int(part)]
+            except (ValueError, IndexError):
+                raise PatchError(f"路径不存在: {part}") from None
+        elif isinstance(doc, dict):
+            if part not in doc:
+                raise PatchError(f"路径不存在: {part}")
+            doc = doc[part]
+        else:
+            raise PatchError(f"路径不存在: {part}")
+    return doc
+
+
+def apply_patch(doc: Any, ops: list[dict]) -> Any:
+    """应用 RFC 6902 的 add / remove / replace / test 操作，返回修改后的副本"""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        kind = op.get("op")
+        parts = _parse_pointer(op.get("path", ""))
+        if kind == "test":
+            if _walk(doc, parts) != op.get("value"):
+                raise PatchError(f"test 失败: {op.get('path')}")
+            continue
+        if not parts:
+            if kind in ("add", "replace"):
+                doc = copy.deepcopy(op.get("value"))
+                continue
+            raise PatchError("不能删除根节点")
+        parent = _walk(doc, parts[:-1])
+        key = parts[-1]
+        if isinstance(parent, list):
+            index = len(parent) if key == "-" else _list_index(parent, key, kind == "add")
+            if kind == "add":
+                parent.insert(index, op.get("value"))
+            elif kind == "replace":
+                parent[index] = op.get("value")
+            elif kind == "remove":
+                del parent[index]
+            else:
+                raise PatchError(f"不支持的操作: {kind}")
+        elif isinstance(parent, dict):
+            if kind in ("remove", "replace") and key not in parent:
+                raise PatchError(f"路径不存在: {op.get('path')}")
+            if kind in ("add", "replace"):
+                parent[key] = op.get("value")
+            elif kind == "remove":
+                del parent[key]
+            else:
+                raise PatchError(f"不支持的操作: {kind}")
+        else:
+            raise PatchError(f"路径不存在: {op.get('path')}")
+    return doc
+
+
+def _list_index(parent: list, key: str, allow_end: bool) -> int:
+    try:
+        index = int(key)
+    except ValueError:
+        raise PatchError(f"非法下标: {key}") from None
+    if index < 0 or index > len(parent) or (index == len(parent) and not allow_end):
+        raise PatchError(f"下标越界: {key}")
+    return index
+
+
+def _atomic_write(path: Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            os.chmod(tmp, path.stat().st_mode & 0o7777)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _write_in_place(path: Path, text: str):
+    """覆盖写入原文件（保留 inode）：按单个文件监视的 watcher 在文件被 rename 替换后会失效，
+    这种文件只能原地写，代价是写入过程中崩溃可能留下不完整的内容"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _stat_key(path: Path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_yaml(path: Path):
+    key = _stat_key(path)
+    if key is None:
+        return None, None
+    with path.open(encoding="utf-8") as f:
+        data = yaml.load(f, Loader=SafeLoader) or {}
+    return key, data
+
+
+def dump_yaml(data: Any) -> str:
+    return yaml.dump(data, Dumper=SafeDumper, allow_unicode=True, sort_keys=False)
+
+
+class ConfigStore:
+    def __init__(self):
+        self._cache: dict[Path, tuple[tuple[int, int], Any]] = {}
+        self._locks: dict[Path, asyncio.Lock] = {}
+
+    def lock(self, path: PathLike) -> asyncio.Lock:
+        path = Path(path).resolve()
+        if path not in self._locks:
+            self._locks[path] = asyncio.Lock()
+        return self._locks[path]
+
+    async def load(self, path: PathLike) -> Any:
+        """读取并缓存 YAML；文件不存在时返回 None。返回值为共享缓存，调用方不得修改"""
+        path = Path(path).resolve()
+        key = await asyncio.to_thread(_stat_key, path)
+        if key is None:
+            self._cache.pop(path, None)
+            return None
+        cached = self._cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        key, data = await asyncio.to_thread(_read_yaml, path)
+        if key is not None:
+            self._cache[path] = (key, data)
+        return data
+
+    async def save(self, path: PathLike, data: Any, in_place: bool = False):
+        """写入 YAML；in_place 时原地覆盖而不是 rename，见 `_write_in_place`"""
+        async with self.lock(path):
+            await self._save(Path(path).resolve(), data, in_place)
+
+    async def _save(self, path: Path, data: Any, in_place: bool = False):
+        text = dump_yaml(data)
+        await asyncio.to_thread(_write_in_place if in_place else _atomic_write, path, text)
+        key = await asyncio.to_thread(_stat_key, path)
+        if key is not None:
+            self._cache[path] = (key, copy.deepcopy(data))
+
+    async def write_text(self, path: PathLike, text: str):
+        """原子写入任意文本文件"""
+        path = Path(path).resolve()
+        async with self.lock(path):
+            await asyncio.to_thread(_atomic_write, path, text)
+            self._cache.pop(path, None)
@@ -0,0 +1,52 @@
+"""
+消息计数缓冲：发送事件只在内存中自增，由后台任务定期把聚合后的增量批量落库
+"""
+
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+
+from .writebehind import WriteBehind
+
+# (platform, instance_id, bucket)，bucket 为 `YYYY-MM-DDTHH:MM` 分钟桶，前 10 位即日期
+CounterKey = tuple[str, int, str]
+FlushFunc = Callable[[dict[CounterKey, int]], Awaitable[None]]
+
+
+class MessageCounter(WriteBehind):
+    """进程内消息计数器
+
+    热路径只调用 `incr`；`start` 后由后台任务每隔 `interval` 秒，
+    或缓冲键数量达到 `max_keys` 时，把增量交给 `flush_func` 一次性写入。
+    """
+
+    label = "消息计数"
+
+    def __init__(self, flush_func: FlushFunc, interval: float = 5.0, max_keys: int = 1024):
+        super().__init__(interval)
+        self.flush_func = flush_func
+        self.max_keys = max_keys
+        self._buffer: Counter[CounterKey] = Counter()
+
+    def incr(self, platform: str, instance_id: int, bucket: str, n: int = 1):
+        """计数 +n，不做任何 IO"""
+        self._buffer[(platform, instance_id, bucket)] += n
+        if len(self._buffer) >= self.max_keys:
+            self._wake()
+
+    def pending(self, prefix: Optional[str] = None) -> int:
+        """尚未落库的增量，可按桶前缀（如日期 `YYYY-MM-DD`）过滤"""
+        return sum(v for k, v in self._buffer.items() if prefix is None or k[2].startswith(prefix))
+
+    def pending_items(self) -> list[tuple[CounterKey, int]]:
+        """尚未落库的增量明细，供查询时与已落库的行合并"""
+        return list(self._buffer.items())
+
+    def _take(self) -> Counter[CounterKey]:
+        batch, self._buffer = self._buffer, Counter()
+        return batch
+
+    async def _write(self, batch: Counter[CounterKey]):
+        await self.flush_func(dict(batch))
+
+    def _restore(self, batch: Counter[CounterKey]):
+        self._buffer.update(batch)
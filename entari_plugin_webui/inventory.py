@@ -0,0 +1,74 @@
+"""
+已安装发行包清单：在线程中读取包元数据并缓存，替代同步调用 `pip list`
+"""
+
+import asyncio
+import importlib
+import re
+import time
+from importlib import metadata
+from typing import Callable, Optional
+
+
+def normalize_name(name: str) -> str:
+    """PEP 503 规范化包名：entari_plugin_Foo -> entari-plugin-foo"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def scan_distributions() -> dict[str, str]:
+    """读取当前环境中所有发行包的 {规范化名称: 版本}"""
+    importlib.invalidate_caches()
+    result = {}
+    for dist in metadata.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            result[normalize_name(name)] = dist.version
+    return result
+
+
+class DistributionInventory:
+    """带 TTL 的发行包清单缓存，ttl 为 0 时只在 `invalidate` 后刷新；每次刷新的耗时（秒）交给 `on_refresh`"""
+
+    def __init__(self, ttl: float = 0, on_refresh: Optional[Callable[[float], None]] = None):
+        self.ttl = ttl
+        self.on_refresh = on_refresh
+        self.refresh_count = 0
+        self.last_refresh_seconds = 0.0
+        self.refreshed_at = 0.0
+        self._data: Optional[dict[str, str]] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._generation = 0
+        self._refreshing_generation = 0
+
+    @property
+    def stale(self) -> bool:
+        if self._data is None:
+            return True
+        return bool(self.ttl) and time.monotonic() - self.refreshed_at > self.ttl
+
+    def invalidate(self):
+        self._data = None
+        self._generation += 1
+
+    async def get(self) -> dict[str, str]:
+        """返回缓存的清单；过期时在线程池中刷新，并发请求共享同一次刷新"""
+        if not self.stale:
+            return self._data  # type: ignore
+        if self._refreshing is None or self._refreshing.done() or self._refreshing_generation != self._generation:
+            self._refreshing_generation = self._generation
+            self._refreshing = asyncio.create_task(self._refresh(self._generation))
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self, generation: int) -> dict[str, str]:
+        start = time.perf_counter()
+        data = await asyncio.to_thread(scan_distributions)
+        cost = time.perf_counter() - start
+        self.refresh_count += 1
+        self.last_refresh_seconds = cost
+        if self.on_refresh is not None:
+            self.on_refresh(cost)
+        self.refreshed_at = time.monotonic()
+        # 刷新期间发生了 invalidate（如安装刚完成），结果已过时，不写入缓存
+        if generation == self._generation:
+            self._data = data
+        return data
@@ -0,0 +1,259 @@
+"""
+面板实时数据的多路复用：一个 WebSocket 连接按主题订阅首页统计、插件、实例、pip 任务等状态。
+每个主题的状态是 {键: 值}，数据源变化时只需 `touch`，同一时间窗内的变化合并后计算一次增量（set / del），
+带主题内递增的序号广播给全部订阅者；断线重连时客户端带上最后的序号即可从最近的增量续传，
+序号过旧或进程已重启时重新下发快照。帧编码为紧凑 JSON，安装了 msgpack 时可选 MessagePack
+"""
+
+import asyncio
+import inspect
+import json
+import secrets
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, Union
+
+from loguru import logger
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，缺失时只提供 JSON
+    msgpack = None
+
+FORMATS = ("json", "msgpack") if msgpack is not None else ("json",)
+
+Source = Callable[[], Union[dict, Awaitable[dict]]]
+_MISSING = object()
+
+
+def encode(data: Any, fmt: str = "json") -> Union[str, bytes]:
+    if fmt == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def decode(message: Union[str, bytes]) -> Any:
+    if isinstance(message, bytes):
+        if msgpack is None:
+            raise ValueError("服务端未安装 msgpack")
+        return msgpack.unpackb(message, raw=False)
+    return json.loads(message)
+
+
+def diff_state(old: dict, new: dict) -> tuple[dict, list]:
+    changed = {key: value for key, value in new.items() if old.get(key, _MISSING) != value}
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+class Frame:
+    """一帧数据；广播给多个订阅者时每种格式只编码一次"""
+
+    __slots__ = ("data", "_encoded")
+
+    def __init__(self, data: dict):
+        self.data = data
+        self._encoded: dict[str, Union[str, bytes]] = {}
+
+    def encode(self, fmt: str) -> Union[str, bytes]:
+        encoded = self._encoded.get(fmt)
+        if encoded is None:
+            encoded = self._encoded[fmt] = encode(self.data, fmt)
+        return encoded
+
+
+class Topic:
+    def __init__(self, name: str, source: Source, family: str, history: int):
+        self.name = name
+        self.family = family
+        self.source = source
+        self.seq = 0
+        self.state: dict = {}
+        self.dirty = True
+        self.history: deque[Frame] = deque(maxlen=history)
+        self.subscribers: set["LiveSubscriber"] = set()
+        self._lock: Optional[asyncio.Lock] = None
+        self._snapshot: Optional[Frame] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        # 固定主题在导入时注册，锁留到事件循环中首次刷新时再创建（Python 3.9 的锁会绑定创建时的事件循环）
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def snapshot(self) -> Frame:
+        if self._snapshot is None or self._snapshot.data["s"] != self.seq:
+            self._snapshot = Frame({"t": self.family, "s": self.seq, "snap": self.state})
+        return self._snapshot
+
+    def since(self, seq: int) -> Optional[list[Frame]]:
+        """seq 之后的全部增量；历史不够时返回 None"""
+        if seq == self.seq:
+            return []
+        if seq > self.seq or not self.history or self.history[0].data["s"] > seq + 1:
+            return None
+        return [frame for frame in self.history if frame.data["s"] > seq]
+
+
+class LiveSubscriber:
+    """单个连接的待发送队列；积压超过 `maxsize` 时丢弃积压，改为给涉及的主题重发快照"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.topics: set[Topic] = set()
+        self.pending: deque[Frame] = deque()
+        self.resync: set[Topic] = set()
+        self._ready = asyncio.Event()
+
+    def push(self, frame: Frame):
+        if len(self.pending) >= self.maxsize:
+            self.pending.clear()
+            self.resync |= self.topics
+        else:
+            self.pending.append(frame)
+        self._ready.set()
+
+    async def get(self) -> tuple[list[Frame], set[Topic]]:
+        await self._ready.wait()
+        self._ready.clear()
+        frames, resync = list(self.pending), self.resync
+        self.pending.clear()
+        self.resync = set()
+        return frames, resync
+
+
+class LiveHub:
+    """主题注册表
+
+    - `register(name, source)` 注册固定主题；`register_family(name, factory)` 注册按参数（如用户 id）
+      派生的主题，订阅时才创建，帧中的主题名仍为 name
+    - 数据源变化时调用 `touch(name)`，只做标记，`interval` 秒后统一刷新有订阅者的脏主题；
+      没有订阅者的主题保持为脏，下次有人订阅时再计算，增量相对上次的状态，序号保持连续
+    """
+
+    def __init__(self, interval: float = 0.5, history: int = 64):
+        self.interval = interval
+        self.history = history
+        self.topics: dict[str, Topic] = {}
+        self.families: dict[str, Callable[[str], Source]] = {}
+        # 区分不同进程，避免重启后用旧序号续传
+        self.epoch = secrets.token_hex(4)
+        self.flushes = 0
+        self._fixed: set[str] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    @property
+    def names(self) -> list[str]:
+        return sorted(self._fixed | set(self.families))
+
+    def register(self, name: str, source: Source):
+        self.topics[name] = Topic(name, source, name, self.history)
+        self._fixed.add(name)
+
+    def register_family(self, name: str, factory: Callable[[str], Source]):
+        self.families[name] = factory
+
+    def topic(self, name: str, key: Optional[str] = None) -> Optional[Topic]:
+        if name in self.families:
+            full = f"{name}:{key}"
+            if full not in self.topics:
+                self.topics[full] = Topic(full, self.families[name](key), name, self.history)
+            return self.topics[full]
+        return self.topics.get(name)
+
+    def touch(self, name: str):
+        """标记主题有变化；热路径上调用，已是脏的主题直接返回"""
+        topic = self.topics.get(name)
+        if topic is not None:
+            if topic.dirty:
+                return
+            topic.dirty = True
+            if topic.subscribers:
+                self._schedule()
+            return
+        if name in self.families:
+            prefix = f"{name}:"
+            for full, topic in self.topics.items():
+                if full.startswith(prefix) and not topic.dirty:
+                    topic.dirty = True
+                    if topic.subscribers:
+                        self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._start_flush)
+
+    def _start_flush(self):
+        self._timer = None
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.create_task(self.flush())
+        else:
+            # 上一次刷新还没结束，结束后再来一轮
+            self._flushing.add_done_callback(lambda _: self._schedule())
+
+    async def flush(self):
+        self.flushes += 1
+        for topic in list(self.topics.values()):
+            if topic.dirty and topic.subscribers:
+                try:
+                    await self.refresh(topic)
+                except Exception as e:
+                    logger.opt(exception=e).warning(f"刷新实时主题 {topic.name} 失败")
+
+    async def refresh(self, topic: Topic):
+        """重新读取数据源，有变化时生成增量帧并广播"""
+        async with topic.lock:
+            if not topic.dirty:
+                return
+            topic.dirty = False
+            try:
+                state = topic.source()
+                if inspect.isawaitable(state):
+                    state = await state
+            except Exception:
+                topic.dirty = True
+                raise
+            changed, removed = diff_state(topic.state, state)
+            if not changed and not removed:
+                return
+            topic.seq += 1
+            topic.state = state
+            data: dict[str, Any] = {"t": topic.family, "s": topic.seq}
+            if changed:
+                data["set"] = changed
+            if removed:
+                data["del"] = removed
+            frame = Frame(data)
+            topic.history.append(frame)
+            for sub in list(topic.subscribers):
+                sub.push(frame)
+
+    async def subscribe(self, sub: LiveSubscriber, topic: Topic, since: Optional[int] = None, epoch: Optional[str] = None) -> list[Frame]:
+        """加入订阅并返回需要先发送的帧：能续传时为 since 之后的增量，否则为当前快照"""
+        if topic.dirty:
+            await self.refresh(topic)
+        topic.subscribers.add(sub)
+        sub.topics.add(topic)
+        if since is not None and epoch == self.epoch:
+            frames = topic.since(since)
+            if frames is not None:
+                return frames
+        return [topic.snapshot()]
+
+    def unsubscribe(self, sub: LiveSubscriber, topic: Optional[Topic] = None):
+        for item in [topic] if topic is not None else list(sub.topics):
+            item.subscribers.discard(sub)
+            sub.topics.discard(item)
+            sub.resync.discard(item)
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flushing is not None:
+            self._flushing.cancel()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len({sub for topic in self.topics.values() for sub in topic.subscribers})
@@ -0,0 +1,378 @@
+"""
+日志环形缓冲：loguru sink 只写入有界队列，再推送给每个 WebSocket 订阅者；
+每条记录同时保留格式化文本与 loguru record 中的结构化字段，订阅者可按级别 / 来源 / 正则过滤。
+sink 由 LogCapture 按需挂载，没有订阅者时日志调用不为 WebUI 付出任何格式化开销；
+HTML 在首次有人需要时按写入顺序渲染一次（ANSI 状态跨记录延续），所有订阅者共用同一份结果
+"""
+
+import asyncio
+import re
+import threading
+import traceback
+from collections import deque
+from typing import Any, Callable, Literal, Optional
+
+from loguru import logger
+
+from .ansi import AnsiRenderer, ansi_to_html
+
+# 客户端提交的正则长度上限，避免过于复杂的表达式拖慢日志写入
+MAX_PATTERN = 256
+
+
+class LogEntry:
+    """一条日志：`text` 为 sink 收到的格式化文本，其余字段取自 loguru 的 record"""
+
+    __slots__ = ("text", "time", "level", "no", "name", "plugin", "message", "exception", "html", "seq")
+
+    def __init__(
+        self,
+        text: str,
+        time: float = 0.0,
+        level: str = "",
+        no: int = 0,
+        name: str = "",
+        plugin: Optional[str] = None,
+        message: str = "",
+        exception: Optional[str] = None,
+    ):
+        self.text = text
+        self.time = time
+        self.level = level
+        self.no = no
+        self.name = name
+        self.plugin = plugin
+        self.message = message
+        self.exception = exception
+        self.html: Optional[str] = None
+        # 写入缓冲时分配的递增序号，断线重连时据此续传
+        self.seq = 0
+
+    @classmethod
+    def from_message(cls, message: Any) -> "LogEntry":
+        text = str(message)
+        record = getattr(message, "record", None)
+        if record is None:
+            return cls(text, message=text)
+        exception = None
+        if record["exception"] is not None:
+            exception = "".join(traceback.format_exception(*record["exception"]))
+        return cls(
+            text,
+            record["time"].timestamp(),
+            record["level"].name,
+            record["level"].no,
+            record["name"] or "",
+            record["extra"].get("entari_plugin_name"),
+            record["message"],
+            exception or None,
+        )
+
+    def as_dict(self, html: bool = False) -> dict:
+        data = {
+            "time": self.time,
+            "level": self.level,
+            "source": self.name,
+            "plugin": self.plugin,
+            "message": self.message,
+        }
+        if self.exception:
+            data["exception"] = self.exception
+        if html:
+            data["html"] = self.html if self.html is not None else ansi_to_html(self.text)
+        return data
+
+
+class LogFilter:
+    """订阅过滤条件：最低级别、来源模块或插件（前缀匹配）、消息正则"""
+
+    def __init__(self, level: int = 0, sources: tuple[str, ...] = (), pattern: Optional[re.Pattern] = None):
+        self.level = level
+        self.sources = sources
+        self.pattern = pattern
+
+    @classmethod
+    def from_dict(cls, data: dict, levels: dict[str, int]) -> "LogFilter":
+        """由客户端发送的 JSON 构造；非法条件抛出 ValueError"""
+        level = data.get("level") or 0
+        if isinstance(level, str):
+            if level.upper() not in levels:
+                raise ValueError(f"未知日志级别: {level}")
+            level = levels[level.upper()]
+        sources = data.get("source") or ()
+        if isinstance(sources, str):
+            sources = (sources,)
+        pattern = data.get("regex") or None
+        if pattern is not None:
+            if len(pattern) > MAX_PATTERN:
+                raise ValueError("正则过长")
+            try:
+                pattern = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"非法正则: {e}") from None
+        return cls(int(level), tuple(str(s) for s in sources), pattern)
+
+    def match(self, entry: LogEntry) -> bool:
+        if entry.no < self.level:
+            return False
+        if self.sources and not any(
+            entry.name == s or entry.name.startswith(s + ".") or entry.plugin == s for s in self.sources
+        ):
+            return False
+        if self.pattern is not None and not self.pattern.search(entry.message):
+            return False
+        return True
+
+
+class LogSubscriber:
+    """单个客户端的待发送队列
+
+    队列满时按 `policy` 处理：`drop` 丢弃最旧记录，`disconnect` 标记为落后并断开。
+    设置了 `filter` 时只有匹配的记录会进入队列。
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        maxsize: int,
+        policy: Literal["drop", "disconnect"],
+        log_filter: Optional[LogFilter] = None,
+    ):
+        self.loop = loop
+        self.maxsize = maxsize
+        self.policy = policy
+        self.filter = log_filter
+        self.pending: deque[LogEntry] = deque()
+        self.dropped = 0
+        self.lagging = False
+        self._ready = asyncio.Event()
+
+    def push(self, entry: LogEntry):
+        if self.lagging:
+            return
+        if self.filter is not None and not self.filter.match(entry):
+            return
+        if len(self.pending) >= self.maxsize:
+            if self.policy == "disconnect":
+                self.lagging = True
+                self.pending.clear()
+                self._ready.set()
+                return
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(entry)
+        self._ready.set()
+
+    async def get(self) -> Optional[list[LogEntry]]:
+        """等待并取出全部待发送记录；客户端落后过多时返回 None"""
+        await self._ready.wait()
+        self._ready.clear()
+        if self.lagging:
+            return None
+        items = list(self.pending)
+        self.pending.clear()
+        return items
+
+
+class LogBuffer:
+    """有界日志缓冲，可按行数和字节数同时限制"""
+
+    def __init__(
+        self,
+        max_lines: int = 2000,
+        max_bytes: int = 0,
+        client_queue: int = 1000,
+        slow_client: Literal["drop", "disconnect"] = "drop",
+        on_active: Optional[Callable[[bool], None]] = None,
+        render_html: bool = True,
+    ):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.client_queue = client_queue
+        self.slow_client = slow_client
+        self.records: deque[LogEntry] = deque(maxlen=max_lines or None)
+        self._sizes: deque[int] = deque(maxlen=max_lines or None)
+        self.size = 0
+        self.seq = 0
+        self.subscribers: set[LogSubscriber] = set()
+        # 订阅者从无到有 / 从有到无时回调
+        self.on_active = on_active
+        self.renderer = AnsiRenderer() if render_html else None
+        # 已渲染 HTML 的最后一条记录的序号；其后仍在 records 中的记录即待渲染
+        self._rendered = 0
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+
+    def write(self, message: str):
+        """loguru sink 入口，可能在任意线程中被调用"""
+        entry = LogEntry.from_message(message)
+        nbytes = len(entry.text.encode("utf-8"))
+        with self._lock:
+            self.seq += 1
+            entry.seq = self.seq
+            if self._sizes.maxlen and len(self._sizes) == self._sizes.maxlen:
+                self.size -= self._sizes[0]
+            self.records.append(entry)
+            self._sizes.append(nbytes)
+            self.size += nbytes
+            while self.max_bytes and self.size > self.max_bytes and len(self.records) > 1:
+                self.records.popleft()
+                self.size -= self._sizes.popleft()
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            if _in_loop(sub.loop):
+                sub.push(entry)
+            elif not sub.loop.is_closed():
+                sub.loop.call_soon_threadsafe(sub.push, entry)
+
+    def render_pending(self):
+        """按写入顺序渲染缓冲中尚未渲染的记录；不在写日志的线程里做，只有需要 HTML 的读者才付出开销。
+        渲染前已被淘汰的记录直接跳过，不会因为没人读 HTML 而滞留"""
+        if self.renderer is None:
+            return
+        with self._render_lock:
+            with self._lock:
+                pending = []
+                for entry in reversed(self.records):
+                    if entry.seq <= self._rendered:
+                        break
+                    pending.append(entry)
+            for entry in reversed(pending):
+                entry.html = self.renderer.render(entry.text)
+                self._rendered = entry.seq
+
+    def join(self, entries: list[LogEntry], html: bool = False) -> str:
+        if html:
+            self.render_pending()
+        return "".join(entry_text(entry, html) for entry in entries)
+
+    def tail(self, n: int, html: bool = False) -> list[str]:
+        """最近 n 条记录的格式化文本（或渲染好的 HTML）"""
+        if n <= 0:
+            return []
+        if html:
+            self.render_pending()
+        with self._lock:
+            return [entry_text(entry, html) for entry in list(self.records)[-n:]]
+
+    def subscribe(self, replay: int = 0, log_filter: Optional[LogFilter] = None, after: Optional[int] = None) -> LogSubscriber:
+        """注册订阅者，并预先放入最近 `replay` 条（满足过滤条件的）记录；
+        给出 `after` 时改为回放序号大于它、仍在缓冲中的记录（同样受队列长度限制）"""
+        sub = LogSubscriber(asyncio.get_running_loop(), self.client_queue, self.slow_client, log_filter)
+        with self._lock:
+            history = self._history(replay, log_filter, after)
+            self.subscribers.add(sub)
+            first = len(self.subscribers) == 1
+        if first and self.on_active:
+            self.on_active(True)
+        for entry in history:
+            sub.push(entry)
+        return sub
+
+    def refilter(self, sub: LogSubscriber, log_filter: Optional[LogFilter], replay: int = 0):
+        """更换订阅者的过滤条件：丢弃积压中不再匹配的记录，并按新条件回放"""
+        with self._lock:
+            history = self._history(replay, log_filter)
+        sub.filter = log_filter
+        sub.pending.clear()
+        for entry in history:
+            sub.push(entry)
+
+    def _history(self, replay: int, log_filter: Optional[LogFilter], after: Optional[int] = None) -> list[LogEntry]:
+        if after is not None:
+            replay = self.seq - after
+        replay = min(replay, self.client_queue)
+        if replay <= 0:
+            return []
+        if log_filter is None and after is None:
+            return list(self.records)[-replay:]
+        matched = []
+        for entry in reversed(self.records):
+            if after is not None and entry.seq <= after:
+                break
+            if log_filter is None or log_filter.match(entry):
+                matched.append(entry)
+                if len(matched) >= replay:
+                    break
+        matched.reverse()
+        return matched
+
+    def unsubscribe(self, sub: LogSubscriber):
+        with self._lock:
+            if sub not in self.subscribers:
+                return
+            self.subscribers.discard(sub)
+            last = not self.subscribers
+        if last and self.on_active:
+            self.on_active(False)
+
+
+class LogCapture:
+    """把 LogBuffer 作为 loguru sink 按需挂载
+
+    默认只在有订阅者期间挂载，最后一个订阅者离开后卸载；`always` 为真时始终挂载，
+    这样打开日志页时能回放此前的日志，代价是每次日志调用都要为 WebUI 格式化一次
+    """
+
+    def __init__(self, buffer: LogBuffer, level: str = "INFO", diagnose: bool = False, always: bool = False, **options):
+        self.buffer = buffer
+        self.level = level
+        self.diagnose = diagnose
+        self.always = always
+        self.options = options
+        self.attach_count = 0
+        self._sink_id: Optional[int] = None
+        self._lock = threading.Lock()
+        buffer.on_active = self._on_active
+
+    @property
+    def attached(self) -> bool:
+        return self._sink_id is not None
+
+    def start(self):
+        if self.always:
+            self.attach()
+
+    def attach(self):
+        with self._lock:
+            if self._sink_id is not None:
+                return
+            self._sink_id = logger.add(
+                self.buffer.write,
+                level=self.level,
+                diagnose=self.diagnose,
+                backtrace=self.diagnose,
+                **self.options,
+            )
+            self.attach_count += 1
+
+    def detach(self):
+        with self._lock:
+            if self._sink_id is None:
+                return
+            sink_id, self._sink_id = self._sink_id, None
+        try:
+            logger.remove(sink_id)
+        except ValueError:
+            pass
+
+    def _on_active(self, active: bool):
+        if active:
+            self.attach()
+        elif not self.always:
+            self.detach()
+
+
+def entry_text(entry: LogEntry, html: bool = False) -> str:
+    if not html:
+        return entry.text
+    if entry.html is None:
+        entry.html = ansi_to_html(entry.text)
+    return entry.html
+
+
+def _in_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
@@ -0,0 +1,409 @@
+"""
+历史日志检索：为 logs/ 下的当前日志与轮转归档（.log / .log.zip）建立旁路索引，
+记录每条日志的偏移、长度、时间、级别与来源模块，查询时按索引过滤后再定位读取；
+压缩归档始终以流方式读取，不会整体载入内存
+"""
+
+import bisect
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+INDEX_VERSION = 2
+# 两种日志头：`YYYY-MM-DD HH:mm:ss LEVEL   | name ...` 与 entari 文件日志的 `MM-DD HH:mm:ss | LEVEL    | name | ...`，
+# 后者不带年份，按文件（归档）的修改时间补全
+RECORD_HEAD = re.compile(
+    rb"^(?:(?P<year>\d{4})-)?(?P<time>\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?: \| | )(?P<level>[A-Z]+) *\| (?P<name>\S+)"
+)
+LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+# 当前日志的索引最多每隔这么久落盘一次，归档只在建立时写一次
+ACTIVE_PERSIST_INTERVAL = 60.0
+
+
+def level_no(name: str) -> int:
+    return LEVELS.get(name.upper(), 0)
+
+
+def _parse_ts(head: "re.Match[bytes]", mtime: float) -> int:
+    if head["year"]:
+        return int(time.mktime(time.strptime(f"{head['year'].decode()}-{head['time'].decode()}", "%Y-%m-%d %H:%M:%S")))
+    year = time.localtime(mtime).tm_year
+    ts = int(time.mktime(time.strptime(f"{year}-{head['time'].decode()}", "%Y-%m-%d %H:%M:%S")))
+    # 跨年的文件中，晚于修改时间的记录属于上一年
+    if ts > mtime + 86400:
+        ts = int(time.mktime(time.strptime(f"{year - 1}-{head['time'].decode()}", "%Y-%m-%d %H:%M:%S")))
+    return ts
+
+
+@dataclass
+class FileIndex:
+    """单个日志文件的索引；数组按记录顺序存放，下标即记录编号"""
+
+    path: Path
+    source_key: tuple[int, int] = (0, 0)
+    """(inode, 已索引的文件大小)，用来判断文件是否被轮转 / 追加"""
+    indexed_to: int = 0
+    names: list[str] = field(default_factory=list)
+    offsets: array = field(default_factory=lambda: array("Q"))
+    lengths: array = field(default_factory=lambda: array("I"))
+    stamps: array = field(default_factory=lambda: array("I"))
+    levels: array = field(default_factory=lambda: array("H"))
+    name_ids: array = field(default_factory=lambda: array("H"))
+    tail: Optional[tuple[int, int, int, int, int]] = None
+    """当前日志末尾尚未结束的一条记录 (offset, length, ts, level, name_id)，不落盘"""
+    persisted_at: float = 0.0
+    dirty: bool = False
+    _name_map: dict[str, int] = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.offsets) + (1 if self.tail else 0)
+
+    def entry(self, i: int) -> tuple[int, int, int, int, int]:
+        if i == len(self.offsets):
+            assert self.tail is not None
+            return self.tail
+        return self.offsets[i], self.lengths[i], self.stamps[i], self.levels[i], self.name_ids[i]
+
+    def name_id(self, name: str) -> int:
+        if len(self._name_map) != len(self.names):
+            self._name_map = {n: i for i, n in enumerate(self.names)}
+        if name not in self._name_map:
+            self._name_map[name] = len(self.names)
+            self.names.append(name)
+        return self._name_map[name]
+
+    def append(self, entry: tuple[int, int, int, int, int]):
+        offset, length, ts, level, name_id = entry
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.stamps.append(ts)
+        self.levels.append(level)
+        self.name_ids.append(name_id)
+        self.dirty = True
+
+    def time_range(self) -> tuple[int, int]:
+        if not len(self):
+            return 0, 0
+        return self.entry(0)[2], self.entry(len(self) - 1)[2]
+
+    # ---------- 落盘 ----------
+    _ARRAYS = ("offsets", "lengths", "stamps", "levels", "name_ids")
+
+    def dump(self, target: Path):
+        header = {
+            "version": INDEX_VERSION,
+            "byteorder": sys.byteorder,
+            "source_key": list(self.source_key),
+            "indexed_to": self.indexed_to,
+            "names": self.names,
+            "count": len(self.offsets),
+        }
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", dir=target.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(header).encode() + b"\n")
+                for name in self._ARRAYS:
+                    getattr(self, name).tofile(f)
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        self.dirty = False
+        self.persisted_at = time.monotonic()
+
+    @classmethod
+    def load(cls, path: Path, sidecar: Path) -> Optional["FileIndex"]:
+        try:
+            with sidecar.open("rb") as f:
+                header = json.loads(f.readline())
+                if header.get("version") != INDEX_VERSION or header.get("byteorder") != sys.byteorder:
+                    return None
+                index = cls(path, tuple(header["source_key"]), header["indexed_to"], header["names"])
+                for name in cls._ARRAYS:
+                    getattr(index, name).fromfile(f, header["count"])
+        except (OSError, ValueError, EOFError, KeyError):
+            return None
+        index.persisted_at = time.monotonic()
+        return index
+
+
+@dataclass
+class LogRecord:
+    file: str
+    index: int
+    time: int
+    level: str
+    name: str
+    text: str
+
+    def as_dict(self):
+        return {
+            "file": self.file,
+            "index": self.index,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.time)),
+            "timestamp": self.time,
+            "level": self.level,
+            "name": self.name,
+            "text": self.text,
+        }
+
+
+class LogStore:
+    """logs 目录的检索入口；所有方法都是阻塞的，调用方负责放到线程池中执行"""
+
+    def __init__(self, directory: Path, index_dir: Optional[Path] = None, active: str = "latest.log"):
+        self.directory = directory
+        self.index_dir = index_dir or directory / ".index"
+        self.active = active
+        self._indexes: dict[str, FileIndex] = {}
+        self._lock = threading.Lock()
+        self._level_names = {v: k for k, v in LEVELS.items()}
+
+    # ---------- 文件 ----------
+    def files(self) -> list[Path]:
+        """当前日志在前，归档按文件名（含轮转时间）倒序"""
+        if not self.directory.is_dir():
+            return []
+        archives = [
+            p for p in self.directory.iterdir()
+            if p.is_file() and p.name != self.active and (p.name.endswith(".log") or p.name.endswith(".log.zip"))
+        ]
+        archives.sort(key=lambda p: p.name, reverse=True)
+        active = self.directory / self.active
+        return ([active] if active.is_file() else []) + archives
+
+    def _open(self, path: Path) -> IO[bytes]:
+        """归档以 ZipExtFile 流式读取；向前 seek 会边解压边丢弃，内存占用恒定"""
+        if path.suffix == ".zip":
+            archive = zipfile.ZipFile(path)
+            members = [m for m in archive.infolist() if not m.is_dir()]
+            if not members:
+                archive.close()
+                raise OSError(f"空的日志归档: {path.name}")
+            stream = archive.open(members[0])
+            # 让 stream 关闭时一并关闭 ZipFile
+            stream._webui_archive = archive  # type: ignore[attr-defined]
+            return stream
+        return path.open("rb")
+
+    @staticmethod
+    def _close(stream: IO[bytes]):
+        stream.close()
+        archive = getattr(stream, "_webui_archive", None)
+        if archive is not None:
+            archive.close()
+
+    # ---------- 索引 ----------
+    def _sidecar(self, path: Path) -> Path:
+        return self.index_dir / f"{path.name}.idx"
+
+    def index(self, path: Path) -> FileIndex:
+        with self._lock:
+            return self._index(path)
+
+    def _index(self, path: Path) -> FileIndex:
+        st = path.stat()
+        is_active = path.name == self.active
+        index = self._indexes.get(path.name)
+        if index is None:
+            index = FileIndex.load(path, self._sidecar(path))
+        if index is not None:
+            inode, size = index.source_key
+            if inode != st.st_ino or st.st_size < size or (not is_active and st.st_size != size):
+                index = None
+        if index is None:
+            index = FileIndex(path)
+        index.path = path
+
+        if index.source_key != (st.st_ino, st.st_size) or (is_active and index.tail is None and st.st_size > index.indexed_to):
+            self._scan(index, path, st, is_active)
+        self._indexes[path.name] = index
+
+        if index.dirty and (not is_active or time.monotonic() - index.persisted_at >= ACTIVE_PERSIST_INTERVAL):
+            try:
+                index.dump(self._sidecar(path))
+            except OSError:
+                pass
+        return index
+
+    def _scan(self, index: FileIndex, path: Path, st: os.stat_result, is_active: bool):
+        """从上次索引到的位置继续扫描；当前日志的最后一条记录可能还会追加异常堆栈，只作为 tail 保留"""
+        stream = self._open(path)
+        try:
+            offset = index.indexed_to
+            if offset:
+                stream.seek(offset)
+            current: Optional[list[int]] = None
+            for line in stream:
+                head = RECORD_HEAD.match(line)
+                if head:
+                    if current is not None:
+                        index.append(tuple(current))  # type: ignore[arg-type]
+                    current = [
+                        offset,
+                        0,
+                        _parse_ts(head, st.st_mtime),
+                        level_no(head["level"].decode()),
+                        index.name_id(head["name"].decode()),
+                    ]
+                elif current is None:
+                    # 文件开头不是日志头（例如被截断），单独作为一条记录
+                    current = [offset, 0, int(st.st_mtime), 0, index.name_id("")]
+                current[1] += len(line)
+                offset += len(line)
+        finally:
+            self._close(stream)
+
+        index.tail = None
+        if current is not None:
+            if is_active:
+                index.tail = tuple(current)  # type: ignore[assignment]
+                index.indexed_to = current[0]
+            else:
+                index.append(tuple(current))  # type: ignore[arg-type]
+                index.indexed_to = offset
+        else:
+            index.indexed_to = offset
+        index.source_key = (st.st_ino, st.st_size)
+        index.dirty = True
+
+    def prune(self):
+        """删除源文件已不存在的索引"""
+        if not self.index_dir.is_dir():
+            return
+        alive = {p.name for p in self.files()}
+        for sidecar in self.index_dir.glob("*.idx"):
+            if sidecar.name[:-4] not in alive:
+                sidecar.unlink(missing_ok=True)
+                self._indexes.pop(sidecar.name[:-4], None)
+
+    # ---------- 查询 ----------
+    def search(
+        self,
+        q: str = "",
+        level: int = 0,
+        name: str = "",
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> tuple[list[LogRecord], Optional[str]]:
+        """从新到旧返回最多 limit 条记录，以及继续翻页用的游标（没有更多时为 None）
+
+        游标形如 `文件名:记录编号`，表示从该文件中编号更小的记录继续
+        """
+        files = self.files()
+        skip_until, before = None, None
+        if cursor:
+            skip_until, _, raw = cursor.rpartition(":")
+            before = int(raw)
+        needle = q.lower().encode() if q else b""
+        results: list[LogRecord] = []
+
+        for path in files:
+            if skip_until is not None:
+                if path.name != skip_until:
+                    continue
+                skip_until = None
+            index = self.index(path)
+            lo, hi = 0, len(index)
+            if before is not None:
+                hi = min(hi, before)
+                before = None
+            first, last = index.time_range()
+            if (start is not None and last < start) or (end is not None and first >= end):
+                continue
+            # 同一文件内时间单调递增，按时间二分缩小范围
+            stamps = index.stamps
+            if start is not None:
+                lo = max(lo, bisect.bisect_left(stamps, start))
+            if end is not None and len(stamps):
+                hi = min(hi, bisect.bisect_left(stamps, end) + (1 if index.tail else 0))
+            allowed = None
+            if name:
+                allowed = {i for i, n in enumerate(index.names) if n == name or n.startswith(name + ".")}
+                if not allowed:
+                    continue
+
+            candidates = []
+            for i in range(hi - 1, lo - 1, -1):
+                entry = index.entry(i)
+                if entry[3] < level or (allowed is not None and entry[4] not in allowed):
+                    continue
+                if (start is not None and entry[2] < start) or (end is not None and entry[2] >= end):
+                    continue
+                candidates.append(i)
+                # 没有全文条件时索引已足以判断，凑够一页即可
+                if not needle and len(results) + len(candidates) >= limit:
+                    break
+
+            for i, text in self._read(index, path, candidates):
+                if needle and needle not in text.lower():
+                    continue
+                _, _, ts, lvl, name_id = index.entry(i)
+                results.append(LogRecord(
+                    path.name, i, ts, self._level_names.get(lvl, str(lvl)), index.names[name_id],
+                    text.decode("utf-8", "replace").rstrip("\n"),
+                ))
+                if len(results) >= limit:
+                    return results, f"{path.name}:{i}"
+        return results, None
+
+    def _read(self, index: FileIndex, path: Path, candidates: list[int]) -> Iterator[tuple[int, bytes]]:
+        """按候选记录编号（降序）读取原文；归档按偏移升序流式读取后再倒序产出，每批最多 256 条"""
+        if not candidates:
+            return
+        stream = self._open(path)
+        try:
+            if path.suffix != ".zip":
+                for i in candidates:
+                    offset, length, *_ = index.entry(i)
+                    stream.seek(offset)
+                    yield i, stream.read(length)
+                return
+            position = 0
+            for start in range(0, len(candidates), 256):
+                batch = sorted(candidates[start:start + 256], key=lambda i: index.entry(i)[0])
+                if batch and index.entry(batch[0])[0] < position:
+                    self._close(stream)
+                    stream = self._open(path)
+                    position = 0
+                texts = {}
+                for i in batch:
+                    offset, length, *_ = index.entry(i)
+                    stream.seek(offset)
+                    texts[i] = stream.read(length)
+                    position = offset + length
+                for i in sorted(texts, reverse=True):
+                    yield i, texts[i]
+        finally:
+            self._close(stream)
+
+    def describe(self) -> list[dict]:
+        """各日志文件的大小、记录数与时间范围"""
+        items = []
+        for path in self.files():
+            index = self.index(path)
+            first, last = index.time_range()
+            items.append({
+                "file": path.name,
+                "size": path.stat().st_size,
+                "compressed": path.suffix == ".zip",
+                "records": len(index),
+                "from": first,
+                "to": last,
+            })
+        return items
@@ -0,0 +1,386 @@
+"""
+插件市场元数据索引：条目来自可导入的 JSON 目录文件与已安装发行包的元数据，持久化为本地 JSON 文件；
+内存中维护倒排索引（词 -> 插件）、有序词表（前缀匹配）与三元组索引（拼写容错），搜索不调用 pip、不访问网络
+"""
+
+import asyncio
+import json
+import re
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field, fields
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Optional
+
+from .configstore import _atomic_write
+from .inventory import normalize_name
+
+INDEX_VERSION = 1
+PLUGIN_PREFIX = "entari-plugin-"
+# 英文按单词、中文按单字切分；查询用同样的规则，多个词之间为“且”
+TOKEN = re.compile(r"[0-9a-z]+|[\u4e00-\u9fff]")
+FIELD_WEIGHTS = {"name": 4.0, "tags": 2.0, "author": 1.0, "summary": 1.0}
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.4
+FUZZY_MIN_LENGTH = 3
+FUZZY_THRESHOLD = 0.4
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class MarketEntry:
+    name: str
+    """规范化后的包名，作为索引键"""
+    display: str = ""
+    summary: str = ""
+    version: str = ""
+    """目录中记录的最新版本"""
+    author: str = ""
+    tags: list[str] = field(default_factory=list)
+    homepage: str = ""
+    updated: str = ""
+    installed: Optional[str] = None
+    """已安装的版本，未安装为 None"""
+    sources: list[str] = field(default_factory=list)
+    """条目来源：catalog（目录文件 / 导入）或 installed（已安装发行包）"""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MarketEntry":
+        known = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    def item(self) -> dict:
+        """前端插件市场卡片使用的字段"""
+        return {
+            "name": self.display or self.name,
+            "fullName": self.display or self.name,
+            "desc": self.summary or "暂无描述",
+            "author": self.author or "unknown",
+            "version": self.installed or self.version,
+            "latest": self.version,
+            "stars": 0,
+            "updated": self.updated,
+            "tags": self.tags,
+            "homepage": self.homepage,
+            "installed": self.installed is not None,
+        }
+
+
+def _text_list(value: Any) -> list[str]:
+    if isinstance(value, str):
+        return [item.strip() for item in re.split(r"[,\s]+", value) if item.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return []
+
+
+def _author(value: Any) -> str:
+    if isinstance(value, dict):
+        return str(value.get("name") or "")
+    if isinstance(value, (list, tuple)):
+        return "; ".join(filter(None, (_author(item) for item in value)))
+    return str(value or "")
+
+
+def parse_catalog(data: Any) -> list[MarketEntry]:
+    """目录文件为插件数组，或 {"plugins": [...]}；每项至少包含 name，
+    其余字段 summary / desc、version、author、tags / keywords、homepage、updated 均可省略"""
+    items = data.get("plugins") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError("目录必须是插件数组或包含 plugins 数组的对象")
+    entries = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"].strip():
+            raise ValueError(f"第 {i + 1} 项缺少 name")
+        entries.append(MarketEntry(
+            name=normalize_name(item["name"].strip()),
+            display=item["name"].strip(),
+            summary=str(item.get("summary") or item.get("desc") or item.get("description") or ""),
+            version=str(item.get("version") or ""),
+            author=_author(item.get("author")),
+            tags=_text_list(item.get("tags") or item.get("keywords")),
+            homepage=str(item.get("homepage") or item.get("url") or ""),
+            updated=str(item.get("updated") or ""),
+        ))
+    return entries
+
+
+def read_catalog(path: Path) -> list[MarketEntry]:
+    return parse_catalog(json.loads(path.read_text(encoding="utf-8")))
+
+
+def read_distribution(name: str) -> Optional[MarketEntry]:
+    """读取单个已安装发行包的元数据；包已不存在时返回 None"""
+    try:
+        dist = metadata.distribution(name)
+    except metadata.PackageNotFoundError:
+        return None
+    meta = dist.metadata
+    homepage = meta.get("Home-page") or ""
+    for url in meta.get_all("Project-URL") or []:
+        label, _, link = url.partition(",")
+        if not homepage or label.strip().lower() in ("homepage", "repository", "source"):
+            homepage = link.strip()
+    author = meta.get("Author") or meta.get("Author-email") or ""
+    return MarketEntry(
+        name=normalize_name(meta["Name"] or name),
+        display=meta["Name"] or name,
+        summary=meta.get("Summary") or "",
+        version=dist.version,
+        author=re.sub(r"\s*<[^>]*>", "", author),
+        tags=_text_list(meta.get("Keywords") or ""),
+        homepage=homepage,
+        installed=dist.version,
+    )
+
+
+class MarketIndex:
+    """市场条目及其搜索索引
+
+    - 目录文件按修改时间增量导入（`catalog_stale` / `merge_catalog`）
+    - 已安装发行包按版本增量同步：只重新读取新增或版本变化的包（`installed_stale` / `apply_installed`）
+    - 修改都在事件循环中进行，读文件 / 读包元数据 / 写盘由调用方放到线程中
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, MarketEntry] = {}
+        self.catalogs: dict[str, float] = {}
+        self.dirty = False
+        self.loaded = False
+        # 上次同步时的已安装清单；清单缓存未刷新时是同一个对象，据此跳过同步
+        self.synced: Optional[dict[str, str]] = None
+        self._postings: dict[str, dict[str, float]] = {}
+        self._tokens: dict[str, set[str]] = {}
+        self._vocab: list[str] = []
+        self._grams: dict[str, set[str]] = {}
+        self._vocab_stale = True
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """串行化刷新与导入；首次使用时才创建，Python 3.9 下在导入时创建的锁会绑定到另一个事件循环"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    # ---------- 持久化 ----------
+    def load(self):
+        self.loaded = True
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            # 索引可以从目录与已安装的包重建，损坏时直接丢弃
+            return
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return
+        self.catalogs = dict(data.get("catalogs") or {})
+        for item in data.get("entries") or []:
+            self._put(MarketEntry.from_dict(item))
+        self.dirty = False
+
+    def dump(self) -> dict:
+        self.dirty = False
+        return {
+            "version": INDEX_VERSION,
+            "catalogs": dict(self.catalogs),
+            "entries": [asdict(entry) for entry in self.entries.values()],
+        }
+
+    def save(self, data: dict):
+        """原子写入（与配置文件相同的 临时文件 + fsync + rename）；data 来自 `dump`"""
+        _atomic_write(self.path, json.dumps(data, ensure_ascii=False))
+
+    # ---------- 增量更新 ----------
+    def catalog_stale(self, path: Path) -> Optional[float]:
+        """目录文件自上次导入后有修改时返回新的修改时间，否则返回 None"""
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+        return mtime if self.catalogs.get(str(path)) != mtime else None
+
+    def merge_catalog(self, entries: list[MarketEntry], path: Optional[Path] = None, mtime: Optional[float] = None) -> int:
+        """合并目录条目，已安装版本保留；返回有变化的条目数"""
+        changed = 0
+        for entry in entries:
+            old = self.entries.get(entry.name)
+            if old is not None:
+                entry.installed = old.installed
+                entry.sources = sorted(set(old.sources) | {"catalog"})
+                # 目录中没写的字段沿用已安装包的元数据
+                for key in ("summary", "version", "author", "tags", "homepage"):
+                    if not getattr(entry, key):
+                        setattr(entry, key, getattr(old, key))
+            else:
+                entry.sources = ["catalog"]
+                # 新条目可能对应已安装但之前未收录的包，下次刷新时重新比对已安装清单
+                self.synced = None
+            if old != entry:
+                self._put(entry)
+                changed += 1
+        if path is not None and mtime is not None:
+            self.catalogs[str(path)] = mtime
+            self.dirty = True
+        return changed
+
+    def installed_stale(self, installed: dict[str, str]) -> list[str]:
+        """需要重新读取元数据的已安装包：entari 插件或已在目录中，且尚未记录或版本有变化"""
+        return [
+            name for name, version in installed.items()
+            if (name.startswith(PLUGIN_PREFIX) or name in self.entries)
+            and (name not in self.entries or self.entries[name].installed != version)
+        ]
+
+    def apply_installed(self, installed: dict[str, str], metas: dict[str, Optional[MarketEntry]]) -> int:
+        """写入重新读取的元数据，并清除已卸载包的安装状态；只来自已安装包的条目在卸载后删除"""
+        self.synced = installed
+        changed = 0
+        for name, meta in metas.items():
+            if meta is None:
+                continue
+            old = self.entries.get(name)
+            if old is not None and "catalog" in old.sources:
+                entry = MarketEntry(**{**asdict(old), "installed": meta.installed})
+                for key in ("summary", "author", "tags", "homepage"):
+                    if not getattr(entry, key):
+                        setattr(entry, key, getattr(meta, key))
+            else:
+                entry = meta
+                entry.sources = ["installed"]
+            self._put(entry)
+            changed += 1
+        for name, entry in list(self.entries.items()):
+            if entry.installed is None or name in installed:
+                continue
+            if "catalog" in entry.sources:
+                self._put(MarketEntry(**{**asdict(entry), "installed": None}))
+            else:
+                self._remove(name)
+            changed += 1
+        return changed
+
+    # ---------- 索引 ----------
+    def _put(self, entry: MarketEntry):
+        self._remove(entry.name)
+        self.entries[entry.name] = entry
+        weights: dict[str, float] = {}
+
+        def add(text: str, weight: float):
+            for token in tokenize(text):
+                if weights.get(token, 0.0) < weight:
+                    weights[token] = weight
+
+        add(entry.name, FIELD_WEIGHTS["name"])
+        add(entry.display, FIELD_WEIGHTS["name"])
+        # 完整包名与去掉 entari-plugin- 前缀的短名也能整体命中
+        for whole in (entry.name, entry.name[len(PLUGIN_PREFIX):] if entry.name.startswith(PLUGIN_PREFIX) else ""):
+            if whole:
+                weights[whole] = FIELD_WEIGHTS["name"]
+        for tag in entry.tags:
+            add(tag, FIELD_WEIGHTS["tags"])
+        add(entry.author, FIELD_WEIGHTS["author"])
+        add(entry.summary, FIELD_WEIGHTS["summary"])
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[entry.name] = weight
+        self._tokens[entry.name] = set(weights)
+        self._vocab_stale = True
+        self.dirty = True
+
+    def _remove(self, name: str):
+        if self.entries.pop(name, None) is None:
+            return
+        for token in self._tokens.pop(name, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(name, None)
+                if not postings:
+                    del self._postings[token]
+        self._vocab_stale = True
+        self.dirty = True
+
+    def prepare(self):
+        """重建有序词表与三元组索引；条目变化后首次搜索时自动调用，也可在刷新后提前调用"""
+        if not self._vocab_stale:
+            return
+        self._vocab = sorted(self._postings)
+        self._grams = {}
+        for token in self._vocab:
+            if len(token) >= FUZZY_MIN_LENGTH:
+                for gram in trigrams(token):
+                    self._grams.setdefault(gram, set()).add(token)
+        self._vocab_stale = False
+
+    def _match(self, term: str) -> dict[str, float]:
+        """单个查询词的命中：完全匹配 > 前缀匹配 > 拼写相近（只在前两者都没有命中时计算）"""
+        scores: dict[str, float] = dict(self._postings.get(term, {}))
+        i = bisect_left(self._vocab, term)
+        while i < len(self._vocab) and self._vocab[i].startswith(term):
+            token = self._vocab[i]
+            i += 1
+            if token == term:
+                continue
+            for name, weight in self._postings[token].items():
+                scores[name] = max(scores.get(name, 0.0), weight * PREFIX_FACTOR)
+        if scores or len(term) < FUZZY_MIN_LENGTH:
+            return scores
+        grams = trigrams(term)
+        shared: dict[str, int] = {}
+        for gram in grams:
+            for token in self._grams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        for token, count in shared.items():
+            # 补位后词长为 n 的词有 n 个三元组
+            similarity = count / (len(grams) + len(token) - count)
+            if similarity < FUZZY_THRESHOLD:
+                continue
+            for name, weight in self._postings[token].items():
+                scores[name] = max(scores.get(name, 0.0), weight * FUZZY_FACTOR * similarity)
+        return scores
+
+    def search(
+        self,
+        q: str = "",
+        page: int = 1,
+        size: int = 20,
+        tag: Optional[str] = None,
+        installed: Optional[bool] = None,
+    ) -> tuple[int, list[MarketEntry]]:
+        """返回 (命中总数, 当前页条目)；无查询词时按名称排列全部条目"""
+        self.prepare()
+        terms = list(dict.fromkeys(tokenize(q)))
+        if terms:
+            scores: Optional[dict[str, float]] = None
+            for term in terms:
+                matched = self._match(term)
+                if scores is None:
+                    scores = matched
+                else:
+                    scores = {name: score + matched[name] for name, score in scores.items() if name in matched}
+                if not scores:
+                    break
+            needle = q.strip().lower()
+            ranked = sorted(
+                (scores or {}).items(),
+                key=lambda item: (-(item[1] + (2.0 if needle and needle in item[0] else 0.0)), item[0]),
+            )
+            names = [name for name, _ in ranked]
+        else:
+            names = sorted(self.entries)
+        candidates = [self.entries[name] for name in names]
+        if tag:
+            candidates = [entry for entry in candidates if tag in entry.tags]
+        if installed is not None:
+            candidates = [entry for entry in candidates if (entry.installed is not None) == installed]
+        start = (page - 1) * size
+        return len(candidates), candidates[start:start + size]
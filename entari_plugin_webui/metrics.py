@@ -0,0 +1,259 @@
+"""
+运行指标：按路由统计请求数 / 延迟直方图 / 出流量 / 错误数，外加事件循环延迟、
+数据库会话耗时等命名直方图，可导出为 Prometheus 文本格式或 JSON 摘要
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from loguru import logger
+
+# 秒；与 Prometheus 客户端默认桶一致
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 从 10µs 起的细粒度桶，用于监听器、取连接、轻量路由等通常远低于 5ms 的耗时
+FINE_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# 未匹配到路由的请求统一记在这里，避免任意路径撑爆标签
+UNMATCHED = "<unmatched>"
+
+
+class Histogram:
+    """累计直方图，只保存各桶计数、总和、次数与最小 / 最大值"""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "min", "max")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.min = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶线性插值估算分位数，结果限制在实际观测到的最小、最大值之间"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.buckets, self.counts):
+            if n and seen + n >= rank:
+                value = lower + (bound - lower) * (rank - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+            lower = bound
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class RouteStats:
+    __slots__ = ("latency", "bytes_out", "errors", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(FINE_BUCKETS)
+        self.bytes_out = 0
+        self.errors = 0
+        self.statuses: dict[int, int] = {}
+
+
+class Metrics:
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteStats] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.help: dict[str, str] = {}
+        self.started_at = time.time()
+
+    def route(self, method: str, path: str) -> RouteStats:
+        key = (method, path)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        return stats
+
+    def observe_request(self, method: str, path: str, status: int, seconds: float, bytes_out: int):
+        stats = self.route(method, path)
+        stats.latency.observe(seconds)
+        stats.bytes_out += bytes_out
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        if status >= 500:
+            stats.errors += 1
+
+    def histogram(self, name: str, help_text: str = "", buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """取命名直方图，首次调用时按 buckets 创建"""
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram(buckets)
+            self.help[name] = help_text
+        return hist
+
+    def observe(self, name: str, seconds: float):
+        self.histogram(name).observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        """供前端面板使用的 JSON 摘要（秒）"""
+        routes = []
+        for (method, path), stats in sorted(self.routes.items(), key=lambda item: -item[1].latency.sum):
+            count = stats.latency.count
+            routes.append({
+                "method": method,
+                "path": path,
+                **stats.latency.summary(),
+                "bytes_out": stats.bytes_out,
+                "errors": stats.errors,
+                "error_rate": stats.errors / count if count else 0.0,
+                "statuses": {str(k): v for k, v in sorted(stats.statuses.items())},
+            })
+        return {
+            "uptime": time.time() - self.started_at,
+            "routes": routes,
+            "timers": {name: hist.summary() for name, hist in self.histograms.items()},
+        }
+
+    def render(self, prefix: str = "webui", gauges: Optional[dict[str, float]] = None) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        lines: list[str] = []
+        name = f"{prefix}_http_request_duration_seconds"
+        lines += [f"# HELP {name} HTTP 请求处理耗时", f"# TYPE {name} histogram"]
+        for (method, path), stats in self.routes.items():
+            _render_histogram(lines, name, stats.latency, f'method="{method}",route="{_escape(path)}"')
+
+        for metric, help_text, attr in (
+            ("http_requests_total", "HTTP 请求数", None),
+            ("http_response_bytes_total", "HTTP 响应体字节数", "bytes_out"),
+            ("http_errors_total", "状态码 >= 500 的请求数", "errors"),
+        ):
+            name = f"{prefix}_{metric}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (method, path), stats in self.routes.items():
+                labels = f'method="{method}",route="{_escape(path)}"'
+                if attr is None:
+                    for status, n in sorted(stats.statuses.items()):
+                        lines.append(f'{name}{{{labels},status="{status}"}} {n}')
+                else:
+                    lines.append(f"{name}{{{labels}}} {getattr(stats, attr)}")
+
+        for hist_name, hist in self.histograms.items():
+            name = f"{prefix}_{hist_name}_seconds"
+            lines += [f"# HELP {name} {self.help.get(hist_name) or hist_name}", f"# TYPE {name} histogram"]
+            _render_histogram(lines, name, hist, "")
+
+        for gauge, value in (gauges or {}).items():
+            name = f"{prefix}_{gauge}"
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histogram(lines: list[str], name: str, hist: Histogram, labels: str):
+    sep = "," if labels else ""
+    cumulative = 0
+    for bound, n in zip(hist.buckets, hist.counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {hist.sum}")
+    lines.append(f"{name}_count{suffix} {hist.count}")
+
+
+class TimingMiddleware:
+    """纯 ASGI 中间件：按匹配到的路由模板记录耗时、状态码与响应体大小，不缓冲响应"""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        bytes_out = 0
+
+        async def send_wrapper(message):
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 路由匹配后 starlette 会把 route 写回同一个 scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED
+            self.metrics.observe_request(scope["method"], path, status, time.perf_counter() - started, bytes_out)
+
+
+class LoopLagMonitor:
+    """定期 sleep 并测量实际唤醒时间与预期的差值，作为事件循环阻塞程度"""
+
+    def __init__(self, metrics: Metrics, interval: float = 0.5, name: str = "event_loop_lag"):
+        self.metrics = metrics
+        self.interval = interval
+        self.name = name
+        self.last = 0.0
+        self.max = 0.0
+        self._task: Optional[asyncio.Task] = None
+        metrics.histogram(name, "事件循环调度延迟")
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.metrics.observe(self.name, lag)
+            if lag > 1:
+                logger.warning(f"事件循环阻塞 {lag:.2f}s")
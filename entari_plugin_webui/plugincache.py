@@ -0,0 +1,48 @@
+"""
+插件列表序列化缓存：按 (插件对象, 启用状态, 配置版本) 记忆每个插件的序列化结果
+"""
+
+import hashlib
+import secrets
+from typing import Any, Callable, Optional
+
+CacheKey = tuple[int, bool, int, int]
+
+
+class PluginListCache:
+    def __init__(self):
+        self.versions: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, tuple[CacheKey, dict]] = {}
+        self._generation = 0
+        # 区分不同进程，避免重启后 ETag 误命中
+        self._epoch = secrets.token_hex(4)
+
+    def key(self, p) -> CacheKey:
+        return id(p), p.is_available, self._generation, self.versions.get(p.id, 0)
+
+    def bump(self, plugin_id: Optional[str] = None):
+        """插件配置变化时调用；不指定插件时使全部缓存失效"""
+        if plugin_id is None:
+            self._generation += 1
+            self._entries.clear()
+        else:
+            self.versions[plugin_id] = self.versions.get(plugin_id, 0) + 1
+            self._entries.pop(plugin_id, None)
+
+    def get(self, p, build: Callable[[Any], dict]) -> dict:
+        """返回缓存的序列化结果；调用方不得修改返回的字典"""
+        key = self.key(p)
+        entry = self._entries.get(p.id)
+        if entry and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        data = build(p)
+        self._entries[p.id] = (key, data)
+        return data
+
+    def etag(self, plugins, fields: Optional[list[str]] = None) -> str:
+        raw = "|".join(f"{p.id}:{self.key(p)}" for p in plugins) + f"#{','.join(fields or [])}"
+        return f'W/"{self._epoch}-{hashlib.md5(raw.encode()).hexdigest()[:16]}"'
@@ -0,0 +1,251 @@
+"""
+进程内采样分析：后台线程按固定间隔抓取事件循环线程的调用栈，聚合为火焰图工具可直接读取的折叠栈
+（每行 `外层帧;...;内层帧 次数`）；采样期间临时包装事件循环回调的执行，记录耗时超过阈值的慢回调。
+样本与慢回调按模块归属到插件，不依赖外部工具
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from asyncio import events
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any, Callable, Optional
+
+IDLE_MODULES = frozenset({"selectors"})
+"""最内层帧在这些模块中表示事件循环正阻塞在 select 上等待 IO，即空闲"""
+
+
+class PluginResolver:
+    """按模块名（或源文件路径）的最长前缀找到所属插件"""
+
+    def __init__(self, modules: dict[str, str]):
+        self.modules = modules
+        self._by_module: dict[str, Optional[str]] = {}
+        self._files: Optional[list[tuple[str, str]]] = None
+
+    def by_module(self, module: str) -> Optional[str]:
+        try:
+            return self._by_module[module]
+        except KeyError:
+            pass
+        owner = None
+        name = module
+        while name:
+            owner = self.modules.get(name)
+            if owner is not None:
+                break
+            name = name.rpartition(".")[0]
+        self._by_module[module] = owner
+        return owner
+
+    def by_file(self, filename: str) -> Optional[str]:
+        """协程已结束时没有帧可取模块名，只能按源文件路径归属"""
+        if self._files is None:
+            files = []
+            for name, plugin_id in self.modules.items():
+                module = sys.modules.get(name)
+                path = getattr(module, "__file__", None)
+                if not path:
+                    continue
+                if getattr(module, "__path__", None) is not None:
+                    path = os.path.dirname(path) + os.sep
+                files.append((path, plugin_id))
+            self._files = sorted(files, key=lambda item: len(item[0]), reverse=True)
+        for prefix, plugin_id in self._files:
+            if filename.startswith(prefix):
+                return plugin_id
+        return None
+
+
+def code_label(code: CodeType, module: str) -> str:
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def describe_callback(callback: Callable, resolver: PluginResolver) -> tuple[str, Optional[str]]:
+    """事件循环回调的名称与所属插件；Task 的回调归属到它正在执行的协程"""
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        name = f"Task {getattr(coro, '__qualname__', repr(coro))}"
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            return name, resolver.by_module(frame.f_globals.get("__name__", ""))
+        code = getattr(coro, "cr_code", None) or getattr(coro, "gi_code", None)
+        return name, resolver.by_file(code.co_filename) if code is not None else None
+    func = getattr(callback, "func", callback)  # functools.partial
+    module = getattr(func, "__module__", None) or ""
+    return f"{module}:{getattr(func, '__qualname__', repr(func))}", resolver.by_module(module)
+
+
+class ProfileSession:
+    """一次采样的累计结果；`add_stack` 在采样线程中调用，`add_slow` 在事件循环线程中调用"""
+
+    def __init__(self, resolver: PluginResolver, max_depth: int = 128):
+        self.resolver = resolver
+        self.max_depth = max_depth
+        self.samples = 0
+        self.idle = 0
+        self.cost = 0.0
+        self.stacks: Counter[str] = Counter()
+        self.idle_stacks: Counter[str] = Counter()
+        self.plugin_self: Counter[str] = Counter()
+        self.plugin_total: Counter[str] = Counter()
+        self.slow: dict[tuple[str, Optional[str]], list[float]] = {}
+        self._labels: dict[CodeType, tuple[str, Optional[str]]] = {}
+
+    def _frame_info(self, frame: FrameType) -> tuple[str, Optional[str]]:
+        code = frame.f_code
+        info = self._labels.get(code)
+        if info is None:
+            module = frame.f_globals.get("__name__", "?")
+            info = self._labels[code] = (code_label(code, module), self.resolver.by_module(module))
+        return info
+
+    def add_stack(self, frame: FrameType):
+        labels: list[str] = []
+        owners: list[Optional[str]] = []
+        idle = frame.f_globals.get("__name__") in IDLE_MODULES
+        depth = 0
+        while frame is not None and depth < self.max_depth:
+            label, owner = self._frame_info(frame)
+            labels.append(label)
+            owners.append(owner)
+            frame = frame.f_back
+            depth += 1
+        stack = ";".join(reversed(labels))
+        self.samples += 1
+        if idle:
+            self.idle += 1
+            self.idle_stacks[stack] += 1
+            return
+        self.stacks[stack] += 1
+        # self 记给最内层的插件帧，total 记给栈上出现过的每个插件
+        present = [owner for owner in owners if owner is not None]
+        if present:
+            self.plugin_self[present[0]] += 1
+            for owner in set(present):
+                self.plugin_total[owner] += 1
+        else:
+            self.plugin_self["(other)"] += 1
+
+    def add_slow(self, callback: Callable, seconds: float):
+        key = describe_callback(callback, self.resolver)
+        record = self.slow.get(key)
+        if record is None:
+            self.slow[key] = [1, seconds, seconds]
+        else:
+            record[0] += 1
+            record[1] += seconds
+            record[2] = max(record[2], seconds)
+
+    def collapsed(self, idle: bool = False) -> str:
+        stacks = self.stacks + self.idle_stacks if idle else self.stacks
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def report(self, elapsed: float, interval: float, threshold: float, idle: bool = False) -> dict[str, Any]:
+        busy = self.samples - self.idle
+        plugins = sorted(set(self.plugin_self) | set(self.plugin_total))
+        return {
+            "duration": round(elapsed, 3),
+            "interval": interval,
+            "threshold": threshold,
+            "samples": self.samples,
+            "idle_samples": self.idle,
+            "busy_ratio": round(busy / self.samples, 4) if self.samples else 0.0,
+            "overhead": round(self.cost / elapsed, 5) if elapsed else 0.0,
+            "plugins": sorted(
+                (
+                    {
+                        "plugin": plugin,
+                        "self": self.plugin_self[plugin],
+                        "total": self.plugin_total[plugin],
+                        "self_ratio": round(self.plugin_self[plugin] / busy, 4) if busy else 0.0,
+                    }
+                    for plugin in plugins
+                ),
+                key=lambda item: (item["self"], item["total"]),
+                reverse=True,
+            ),
+            "slow_callbacks": sorted(
+                (
+                    {
+                        "callback": name,
+                        "plugin": plugin,
+                        "count": count,
+                        "total_ms": round(total * 1000, 3),
+                        "max_ms": round(longest * 1000, 3),
+                    }
+                    for (name, plugin), (count, total, longest) in self.slow.items()
+                ),
+                key=lambda item: item["total_ms"],
+                reverse=True,
+            ),
+            "collapsed": self.collapsed(idle),
+        }
+
+
+class SamplingProfiler:
+    """限时采样；同一时间只允许一次
+
+    慢回调通过临时替换 `asyncio.Handle._run` 计时，只对标准库事件循环有效（uvloop 等实现不经过它）；
+    采样线程只读取事件循环线程的栈，开销随 interval 变化，结果中的 overhead 为采样耗时占比
+    """
+
+    def __init__(self):
+        self.running = False
+        self.last: Optional[dict[str, Any]] = None
+
+    async def run(
+        self,
+        duration: float,
+        interval: float,
+        threshold: float,
+        modules: dict[str, str],
+        idle: bool = False,
+    ) -> dict[str, Any]:
+        if self.running:
+            raise RuntimeError("已有采样正在进行")
+        self.running = True
+        session = ProfileSession(PluginResolver(modules))
+        target = threading.get_ident()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._sample, args=(session, target, interval, stop), name="webui-profiler", daemon=True
+        )
+        original = events.Handle._run
+
+        def timed_run(handle: events.Handle):
+            callback = handle._callback
+            started = time.perf_counter()
+            try:
+                original(handle)
+            finally:
+                cost = time.perf_counter() - started
+                if cost >= threshold:
+                    session.add_slow(callback, cost)
+
+        started = time.perf_counter()
+        events.Handle._run = timed_run  # type: ignore[method-assign]
+        thread.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            events.Handle._run = original  # type: ignore[method-assign]
+            stop.set()
+            await asyncio.to_thread(thread.join)
+            self.running = False
+        self.last = session.report(time.perf_counter() - started, interval, threshold, idle)
+        return self.last
+
+    @staticmethod
+    def _sample(session: ProfileSession, target: int, interval: float, stop: threading.Event):
+        while not stop.wait(interval):
+            started = time.perf_counter()
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                session.add_stack(frame)
+            del frame
+            session.cost += time.perf_counter() - started
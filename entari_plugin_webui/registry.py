@@ -0,0 +1,108 @@
+"""
+实例登记表：启动时从数据库整体加载，之后接口直接读内存；
+状态、插件列表等字段的修改只记入脏集合，由后台任务按间隔合并成一次批量 UPDATE，退出时再落库一次
+"""
+
+import copy
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from .writebehind import WriteBehind
+
+# [{"id": 主键, 列名: 值, ...}]，每行只包含有修改的列
+FlushFunc = Callable[[list[dict[str, Any]]], Awaitable[None]]
+
+
+class InstanceRecord(SimpleNamespace):
+    """实例表一行的内存副本，属性与 ORM 模型的列同名；不持有 ORM 对象，跨会话使用也不会触发懒加载"""
+
+    def as_dict(self) -> dict[str, Any]:
+        return copy.deepcopy(vars(self))
+
+
+class InstanceRegistry(WriteBehind):
+    """以内存为准的实例表
+
+    - 新建、删除需要主键或外键约束，仍由调用方同步写库，成功后用 `put` / `remove` 同步到内存
+    - `update` 只修改内存并把列记入脏集合；`start` 后由后台任务每隔 `interval` 秒，
+      或脏行数达到 `max_dirty` 时，把各行当前的值交给 `flush_func` 一次性写入
+    - 同一行在两次落库之间的多次修改只写最后的值
+    """
+
+    label = "实例状态"
+
+    def __init__(self, flush_func: FlushFunc, interval: float = 2.0, max_dirty: int = 256):
+        super().__init__(interval)
+        self.flush_func = flush_func
+        self.max_dirty = max_dirty
+        self.records: dict[int, InstanceRecord] = {}
+        self._dirty: dict[int, set[str]] = {}
+
+    # ---------- 读 ----------
+    def get(self, instance_id: int) -> Optional[InstanceRecord]:
+        return self.records.get(instance_id)
+
+    def owned_by(self, user_id: int) -> list[InstanceRecord]:
+        return [record for record in self.records.values() if record.user_id == user_id]
+
+    def in_states(self, states: Iterable[str]) -> list[InstanceRecord]:
+        states = set(states)
+        return [record for record in self.records.values() if record.state in states]
+
+    def by_filename(self, filenames: Iterable[str]) -> dict[str, InstanceRecord]:
+        filenames = set(filenames)
+        return {record.filename: record for record in self.records.values() if record.filename in filenames}
+
+    def pending(self) -> int:
+        """尚未落库的行数"""
+        return len(self._dirty)
+
+    # ---------- 写 ----------
+    def load(self, rows: Iterable[dict[str, Any]]):
+        """用数据库中的全部行替换内存内容"""
+        self.records = {row["id"]: InstanceRecord(**row) for row in rows}
+        self._dirty.clear()
+
+    def put(self, row: dict[str, Any]):
+        """登记已经写入数据库的行"""
+        self.records[row["id"]] = InstanceRecord(**row)
+        self._dirty.pop(row["id"], None)
+
+    def remove(self, instance_id: int):
+        self.records.pop(instance_id, None)
+        self._dirty.pop(instance_id, None)
+
+    def update(self, instance_id: int, values: dict[str, Any]) -> bool:
+        """修改内存中的行，延后落库；行不存在时返回 False"""
+        record = self.records.get(instance_id)
+        if record is None:
+            return False
+        changed = {key for key, value in values.items() if getattr(record, key, None) != value}
+        if not changed:
+            return True
+        for key in changed:
+            setattr(record, key, copy.deepcopy(values[key]))
+        self._dirty.setdefault(instance_id, set()).update(changed)
+        if len(self._dirty) >= self.max_dirty:
+            self._wake()
+        return True
+
+    # ---------- 落库 ----------
+    def _take(self) -> dict[int, set[str]]:
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    async def _write(self, dirty: dict[int, set[str]]):
+        # 已从登记表移除（删除）的行不再写入
+        rows = [
+            {"id": instance_id, **{key: copy.deepcopy(getattr(record, key)) for key in sorted(keys)}}
+            for instance_id, keys in dirty.items()
+            if (record := self.records.get(instance_id)) is not None
+        ]
+        if rows:
+            await self.flush_func(rows)
+
+    def _restore(self, dirty: dict[int, set[str]]):
+        for instance_id, keys in dirty.items():
+            if instance_id in self.records:
+                self._dirty.setdefault(instance_id, set()).update(keys)
@@ -0,0 +1,214 @@
+"""
+主配置热重载的差异计算：比较上次应用的配置与新配置，只挑出发生变化的插件段，
+给出 卸载 / 重新配置 / 启停 / 加载 的执行计划；真正调用 entari 插件接口的部分在 `__init__` 中
+"""
+
+import asyncio
+import copy
+import dataclasses
+import types
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Literal, Optional, Union, get_args, get_origin, get_type_hints
+
+# entari 在加载插件时写入插件配置的键，不属于用户配置
+RUNTIME_KEYS = frozenset({"$path"})
+
+Action = Literal["unload", "reconfigure", "toggle", "load"]
+ORDER = {"unload": 0, "reconfigure": 1, "toggle": 1, "load": 2}
+
+
+def config_root(doc: Any) -> dict:
+    """配置文件可以把全部内容放在顶层的 entari 键下"""
+    if not isinstance(doc, dict):
+        return {}
+    root = doc.get("entari", doc)
+    return root if isinstance(root, dict) else {}
+
+
+def normalize_plugins(doc: Any) -> dict[str, dict]:
+    """与 EntariConfig.reload 相同的规则：跳过 $ 开头的元数据键，`~name` 表示停用，`?name` 表示可选"""
+    section = config_root(doc).get("plugins") or {}
+    plugins: dict[str, dict] = {}
+    for key, value in section.items():
+        if key.startswith("$"):
+            continue
+        value = dict(value or {})
+        if key.startswith("~"):
+            key = key[1:]
+            value["$disable"] = True
+        elif key.startswith("?"):
+            key = key[1:]
+            value["$optional"] = True
+        plugins[key] = value
+    return plugins
+
+
+def plugin_section_key(doc: Any, name: str) -> Optional[str]:
+    """插件在配置文件 plugins 段中的原始键（可能带 ~ / ? 前缀）"""
+    section = config_root(doc).get("plugins") or {}
+    for key in (name, f"~{name}", f"?{name}"):
+        if key in section:
+            return key
+    return None
+
+
+def changed_keys(old: dict, new: dict) -> list[str]:
+    keys = (set(old) | set(new)) - RUNTIME_KEYS
+    return sorted(key for key in keys if old.get(key) != new.get(key))
+
+
+@dataclass
+class PluginChange:
+    name: str
+    action: Action
+    old: dict = field(default_factory=dict)
+    new: dict = field(default_factory=dict)
+    keys: list[str] = field(default_factory=list)
+    enable: Optional[bool] = None
+    """`$disable` 发生变化时的目标状态"""
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "action": self.action, "keys": self.keys, "enable": self.enable}
+
+
+def diff_plugins(old: dict[str, dict], new: dict[str, dict]) -> list[PluginChange]:
+    """按 卸载 -> 重新配置 / 启停 -> 加载 的顺序返回变化；配置未变的插件不出现在结果中"""
+    changes = [PluginChange(name, "unload", old=conf) for name, conf in old.items() if name not in new]
+    for name, conf in new.items():
+        if name not in old:
+            if not conf.get("$optional"):
+                changes.append(PluginChange(name, "load", new=conf, enable=False if conf.get("$disable") else None))
+            continue
+        keys = changed_keys(old[name], conf)
+        if not keys:
+            continue
+        enable = None
+        if "$disable" in keys:
+            keys.remove("$disable")
+            enable = not conf.get("$disable", False)
+        if "$dry" in keys:
+            keys.remove("$dry")
+        if conf.get("$dry"):
+            keys = []
+        if keys:
+            changes.append(PluginChange(name, "reconfigure", old[name], conf, keys, enable))
+        elif enable is not None:
+            changes.append(PluginChange(name, "toggle", old[name], conf, [], enable))
+    changes.sort(key=lambda change: ORDER[change.action])
+    return changes
+
+
+def diff_basic(old: dict, new: dict) -> list[str]:
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+UNION_TYPES = (Union, getattr(types, "UnionType", Union))
+
+
+def _type_error(tp: Any, value: Any) -> Optional[str]:
+    """value 不符合注解 tp 时返回错误信息；无法判断的注解一律放行"""
+    origin = get_origin(tp)
+    if tp is Any:
+        return None
+    if origin in UNION_TYPES:
+        errors = [_type_error(arg, value) for arg in get_args(tp)]
+        return None if None in errors else errors[0]
+    if origin is Literal:
+        return None if value in get_args(tp) else f"应为 {list(get_args(tp))} 之一"
+    if tp is type(None):
+        return None if value is None else "应为空"
+    if origin in (list, tuple, set):
+        if not isinstance(value, list):
+            return "应为列表"
+        args = get_args(tp)
+        if args and origin is not tuple:
+            for i, item in enumerate(value):
+                error = _type_error(args[0], item)
+                if error:
+                    return f"[{i}] {error}"
+        return None
+    if origin is dict or tp is dict:
+        return None if isinstance(value, dict) else "应为对象"
+    if dataclasses.is_dataclass(tp):
+        if not isinstance(value, dict):
+            return "应为对象"
+        errors = check_fields(tp, value)
+        return "; ".join(f"{key}: {error}" for key, error in errors.items()) or None
+    if tp is bool:
+        return None if isinstance(value, bool) else "应为布尔值"
+    if tp is int:
+        return None if isinstance(value, int) and not isinstance(value, bool) else "应为整数"
+    if tp is float:
+        return None if isinstance(value, (int, float)) and not isinstance(value, bool) else "应为数字"
+    if tp is str:
+        return None if isinstance(value, str) else "应为字符串"
+    if tp is Path:
+        return None if isinstance(value, (str, Path)) else "应为路径字符串"
+    return None
+
+
+def check_fields(model: type, data: dict) -> dict[str, str]:
+    """按 dataclass 形式的配置模型检查字段的基本类型；entari 默认的配置模型不做类型校验（未知键直接忽略），这里补上"""
+    if not dataclasses.is_dataclass(model):
+        return {}
+    try:
+        hints = get_type_hints(model)
+    except Exception:
+        return {}
+    names = {f.name for f in dataclasses.fields(model)}
+    errors: dict[str, str] = {}
+    for key, value in data.items():
+        if key.startswith("$"):
+            continue
+        if key not in names:
+            continue
+        error = _type_error(hints.get(key, Any), value)
+        if error:
+            errors[key] = error
+    return errors
+
+
+class ConfigValidationError(ValueError):
+    """新配置未通过校验，errors 为 {位置: 错误信息}"""
+
+    def __init__(self, errors: dict[str, str]):
+        super().__init__("; ".join(f"{key}: {message}" for key, message in errors.items()))
+        self.errors = errors
+
+
+class ConfigReloader:
+    """记录最近一次应用的主配置，重载串行执行；差异以它为基准，而不是运行中被修改过的插件配置"""
+
+    def __init__(self):
+        self.applied: Optional[dict] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """首次使用时才创建：Python 3.9 下在导入时创建的锁会绑定到另一个事件循环"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def remember(self, doc: Any, failed: Iterable[str] = ()):
+        """记录已生效的配置；failed 中的插件未能生效，保留它们上次的配置段，下次重载时重新尝试"""
+        doc = copy.deepcopy(doc) if isinstance(doc, dict) else {}
+        failed = set(failed)
+        if failed:
+            old = config_root(self.applied).get("plugins") or {}
+            root = config_root(doc)
+            if not isinstance(root.get("plugins"), dict):
+                root["plugins"] = {}
+            plugins = root["plugins"]
+            for name in failed:
+                for key in (name, f"~{name}", f"?{name}"):
+                    plugins.pop(key, None)
+                key = plugin_section_key(self.applied, name)
+                if key is not None:
+                    plugins[key] = copy.deepcopy(old[key])
+        self.applied = doc
+
+    def plan(self, new_doc: dict) -> list[PluginChange]:
+        return diff_plugins(normalize_plugins(self.applied or {}), normalize_plugins(new_doc))
+
@@ -0,0 +1,131 @@
+"""
+数据访问层的通用部分：仓储基类按名称记录每条查询的耗时（子类用 lambda_stmt 构造语句，
+首次执行后复用缓存的语句结构与编译结果）；另外负责给 SQLite 连接设置 WAL / synchronous 等 pragma，
+并汇报连接池状态
+"""
+
+import re
+import time
+from typing import Any, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from .metrics import Histogram
+
+# 秒；查询多在毫秒以内，桶比请求延迟更细
+QUERY_BUCKETS = (0.0002, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+PRAGMA_VALUE = re.compile(r"^[\w-]+$")
+
+
+class QueryStats:
+    """按查询名统计次数、耗时分布与最大值"""
+
+    def __init__(self):
+        self.queries: dict[str, Histogram] = {}
+        self.max: dict[str, float] = {}
+        self.statements: dict[str, str] = {}
+
+    def observe(self, name: str, seconds: float, statement: Any = None):
+        hist = self.queries.get(name)
+        if hist is None:
+            hist = self.queries[name] = Histogram(QUERY_BUCKETS)
+            if statement is not None:
+                self.statements[name] = str(statement)
+        hist.observe(seconds)
+        if seconds > self.max.get(name, 0.0):
+            self.max[name] = seconds
+
+    def reset(self):
+        self.queries.clear()
+        self.max.clear()
+
+    def snapshot(self) -> list[dict]:
+        """按累计耗时从高到低排列，时间单位为毫秒"""
+        items = []
+        for name, hist in self.queries.items():
+            items.append({
+                "name": name,
+                "count": hist.count,
+                "total_ms": round(hist.sum * 1000, 3),
+                "avg_ms": round(hist.sum / hist.count * 1000, 3) if hist.count else 0.0,
+                "p50_ms": round(hist.quantile(0.5) * 1000, 3),
+                "p99_ms": round(hist.quantile(0.99) * 1000, 3),
+                "max_ms": round(self.max.get(name, 0.0) * 1000, 3),
+                "sql": self.statements.get(name),
+            })
+        items.sort(key=lambda item: item["total_ms"], reverse=True)
+        return items
+
+
+class Repository:
+    """仓储基类：子类通过 `execute(name, stmt)` 执行语句，耗时按 name 记入 `stats`"""
+
+    stats: Optional[QueryStats] = None
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def execute(self, name: str, stmt):
+        started = time.perf_counter()
+        try:
+            return await self.session.execute(stmt)
+        finally:
+            if self.stats is not None:
+                self.stats.observe(name, time.perf_counter() - started, stmt)
+
+
+class SqlitePragmas:
+    """给 SQLite 引擎的每个新连接执行 pragma；数据库插件重载时会整体替换引擎字典，据此判断是否需要重新安装"""
+
+    def __init__(self, pragmas: dict[str, Any]):
+        self.pragmas: dict[str, str] = {}
+        for key, value in pragmas.items():
+            if value is None or value == "":
+                continue
+            if not PRAGMA_VALUE.match(str(value)):
+                raise ValueError(f"无效的 pragma 取值: {key}={value!r}")
+            self.pragmas[key] = str(value)
+        self._engines: Optional[dict] = None
+
+    def _on_connect(self, dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for key, value in self.pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+        finally:
+            cursor.close()
+
+    async def ensure(self, engines: dict[str, AsyncEngine]):
+        if engines is self._engines:
+            return
+        self._engines = engines
+        if not self.pragmas:
+            return
+        for engine in engines.values():
+            sync_engine: Engine = engine.sync_engine
+            if sync_engine.dialect.name != "sqlite" or event.contains(sync_engine, "connect", self._on_connect):
+                continue
+            event.listen(sync_engine, "connect", self._on_connect)
+            # 池中已有的连接建立时还没有这些设置，丢弃后按需重连
+            await engine.dispose()
+
+    async def current(self, session: AsyncSession) -> dict[str, Any]:
+        """读取当前连接上的实际取值，非 SQLite 时为空"""
+        if session.get_bind().dialect.name != "sqlite":
+            return {}
+        return {key: (await session.execute(text(f"PRAGMA {key}"))).scalar() for key in self.pragmas}
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    status: dict[str, Any] = {"class": type(pool).__name__}
+    for key in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, key, None)
+        if callable(method):
+            try:
+                status[key] = method()
+            except Exception:
+                pass
+    return status
@@ -0,0 +1,76 @@
+"""
+消息计数时间序列：分钟桶的键、时间 / 步长参数解析，以及把聚合行整理成向量化序列
+"""
+
+import calendar
+import re
+from datetime import datetime
+from typing import Iterable, Union
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+_STEP_UNITS = {"s": 1, "m": MINUTE, "h": HOUR, "d": DAY}
+
+
+def minute_key(now: datetime) -> str:
+    """UTC 时间 -> 分钟桶键 `YYYY-MM-DDTHH:MM`，前 10 位即日期"""
+    return now.strftime("%Y-%m-%dT%H:%M")
+
+
+def key_epoch(key: str) -> int:
+    """分钟桶键 -> 桶起点的 UTC 秒级时间戳"""
+    return calendar.timegm(datetime.strptime(key, "%Y-%m-%dT%H:%M").timetuple())
+
+
+def parse_time(value: Union[str, int, float]) -> int:
+    """接受秒级时间戳或 ISO 8601 时间（无时区按 UTC 处理）"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = value.strip()
+    if re.fullmatch(r"-?\d+(\.\d+)?", value):
+        return int(float(value))
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        return int(dt.timestamp())
+    return calendar.timegm(dt.timetuple())
+
+
+def parse_step(value: Union[str, int]) -> int:
+    """接受秒数或 `5m` / `1h` / `1d` 形式，结果至少为 1 分钟并按分钟对齐"""
+    if isinstance(value, int):
+        seconds = value
+    else:
+        match = re.fullmatch(r"(\d+)([smhd]?)", value.strip())
+        if not match:
+            raise ValueError(f"非法步长: {value}")
+        seconds = int(match[1]) * _STEP_UNITS[match[2] or "s"]
+    if seconds < MINUTE or seconds % MINUTE:
+        raise ValueError("步长必须是 60 秒的整数倍")
+    return seconds
+
+
+def auto_step(start: int, end: int, points: int = 300) -> int:
+    """按期望点数挑选一个常用步长"""
+    span = max(end - start, MINUTE)
+    for step in (MINUTE, 5 * MINUTE, 15 * MINUTE, HOUR, 6 * HOUR, DAY, 7 * DAY):
+        if span / step <= points:
+            return step
+    return 30 * DAY
+
+
+def build_series(rows: Iterable[tuple[int, str, int]], start: int, end: int, step: int) -> dict:
+    """(桶起点, 分组名, 数量) -> {"timestamps": [...], "series": {分组: [...]}, "total": [...]}"""
+    timestamps = list(range(start, end, step))
+    index = {t: i for i, t in enumerate(timestamps)}
+    series: dict[str, list[int]] = {}
+    total = [0] * len(timestamps)
+    for bucket, group, count in rows:
+        i = index.get(bucket)
+        if i is None:
+            continue
+        values = series.setdefault(str(group), [0] * len(timestamps))
+        values[i] += count
+        total[i] += count
+    return {"from": start, "to": end, "step": step, "timestamps": timestamps, "series": series, "total": total}
@@ -0,0 +1,175 @@
+"""
+进程资源采样：定时记录 CPU%、RSS、线程数、文件描述符数、事件循环延迟与 asyncio 任务数，
+样本保存在定长环形缓冲中，可按序号增量读取或订阅推送；采样本身的耗时也会被统计
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:  # 可选依赖，缺失时在 Linux 上直接读取 /proc
+    psutil = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class ProcessProbe:
+    """读取单个进程的累计 CPU 时间、RSS、线程数与 fd 数；不可用的指标返回 None"""
+
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = pid or os.getpid()
+        self.is_self = self.pid == os.getpid()
+        self._proc = psutil.Process(self.pid) if psutil is not None else None
+        self._procfs = f"/proc/{self.pid}"
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self._proc is not None:
+            t = self._proc.cpu_times()
+            return t.user + t.system
+        if self.is_self:
+            return time.process_time()
+        try:
+            with open(f"{self._procfs}/stat", "rb") as f:
+                # comm 字段可能包含空格，从最后一个 ')' 之后开始切分
+                fields = f.read().rpartition(b")")[2].split()
+            return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def rss(self) -> Optional[int]:
+        if self._proc is not None:
+            return self._proc.memory_info().rss
+        try:
+            with open(f"{self._procfs}/statm", "rb") as f:
+                return int(f.read().split()[1]) * _PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def threads(self) -> Optional[int]:
+        if self._proc is not None:
+            return self._proc.num_threads()
+        try:
+            with open(f"{self._procfs}/status", "rb") as f:
+                for line in f:
+                    if line.startswith(b"Threads:"):
+                        return int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+        return threading.active_count() if self.is_self else None
+
+    def fds(self) -> Optional[int]:
+        if self._proc is not None and hasattr(self._proc, "num_fds"):
+            return self._proc.num_fds()
+        try:
+            return len(os.listdir(f"{self._procfs}/fd"))
+        except OSError:
+            return None
+
+
+class ResourceSampler:
+    """每 `interval` 秒采样一次，保留最近 `size` 个样本
+
+    每个样本带自增的 `seq`，客户端用 `since(seq)` 只取新增部分；
+    `overhead` 为采样耗时占墙钟时间的比例。
+    """
+
+    def __init__(
+        self,
+        interval: float = 2.0,
+        size: int = 300,
+        lag: Optional[Callable[[], float]] = None,
+        probe: Optional[ProcessProbe] = None,
+    ):
+        self.interval = interval
+        self.samples: deque[dict] = deque(maxlen=size)
+        self.lag = lag
+        self.probe = probe or ProcessProbe()
+        self.seq = 0
+        self.sample_seconds = 0.0
+        self.last_sample_seconds = 0.0
+        self.started_at = time.monotonic()
+        self._last_cpu: Optional[tuple[float, float]] = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def overhead(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.sample_seconds / elapsed if elapsed > 0 else 0.0
+
+    def sample(self) -> dict:
+        started = time.perf_counter()
+        now = time.monotonic()
+        cpu_percent = None
+        cpu = self.probe.cpu_seconds()
+        if cpu is not None:
+            if self._last_cpu is not None and now > self._last_cpu[1]:
+                cpu_percent = round((cpu - self._last_cpu[0]) / (now - self._last_cpu[1]) * 100, 1)
+            self._last_cpu = (cpu, now)
+        rss = self.probe.rss()
+        try:
+            tasks = len(asyncio.all_tasks())
+        except RuntimeError:
+            tasks = None
+        self.seq += 1
+        item = {
+            "seq": self.seq,
+            "time": time.time(),
+            "cpu": cpu_percent,
+            "rss": rss,
+            "memory": round(rss / 1024 / 1024, 1) if rss is not None else None,
+            "threads": self.probe.threads(),
+            "fds": self.probe.fds(),
+            "loop_lag": self.lag() if self.lag else None,
+            "tasks": tasks,
+        }
+        self.samples.append(item)
+        self.last_sample_seconds = time.perf_counter() - started
+        self.sample_seconds += self.last_sample_seconds
+        item["sample_cost"] = self.last_sample_seconds
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(item)
+        return item
+
+    def since(self, seq: int = 0) -> list[dict]:
+        return [item for item in self.samples if item["seq"] > seq]
+
+    def latest(self) -> Optional[dict]:
+        return self.samples[-1] if self.samples else None
+
+    def subscribe(self, maxsize: int = 64) -> asyncio.Queue:
+        """订阅新样本；客户端处理不过来时丢弃最旧的样本"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self.started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.opt(exception=e).warning("资源采样失败")
+            await asyncio.sleep(self.interval)
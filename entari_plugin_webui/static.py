@@ -0,0 +1,134 @@
+"""
+前端静态资源：按 Accept-Encoding 选择构建时生成的 .br / .gz 副本，
+带哈希的文件名长期缓存，index.html 常驻内存并带 ETag
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+# vite 产物形如 index-CiK7xBkD.js，内容变化时文件名随之变化
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# (Content-Encoding, 副本后缀)，按优先级排列
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """解析 Accept-Encoding，忽略 q=0 的项"""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(name)
+    if "*" in accepted:
+        accepted.update(name for name, _ in ENCODINGS)
+    return accepted
+
+
+def _etag(st: os.stat_result, encoding: str = "") -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+
+
+def not_modified(headers: Headers, etag: str) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags or "*" in tags
+
+
+class StaticFrontend:
+    def __init__(self, directory: Path):
+        self.directory = directory.resolve()
+
+    def resolve(self, path: str) -> Optional[Path]:
+        """把请求路径映射到目录内的文件；越界或不存在时返回 None"""
+        try:
+            file = (self.directory / path).resolve()
+            file.relative_to(self.directory)
+        except (ValueError, OSError):
+            return None
+        if file.suffix in (".gz", ".br") or not file.is_file():
+            return None
+        return file
+
+    def response(self, path: str, headers: Headers) -> Response:
+        file = self.resolve(path)
+        if file is None:
+            return Response("Not Found", status_code=404)
+        media_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = ""
+        target = file
+        for name, suffix in ENCODINGS:
+            variant = file.with_name(file.name + suffix)
+            if name in accepted and variant.is_file():
+                encoding, target = name, variant
+                break
+
+        st = target.stat()
+        etag = _etag(st, encoding)
+        response_headers = {
+            "Cache-Control": IMMUTABLE if HASHED_NAME.search(file.name) else REVALIDATE,
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+        }
+        if not_modified(headers, etag):
+            return Response(status_code=304, headers=response_headers)
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+        return FileResponse(target, headers=response_headers, media_type=media_type, stat_result=st)
+
+
+class IndexPage:
+    """index.html 常驻内存；文件被重新构建（mtime / size 变化）时自动重新加载"""
+
+    def __init__(self, file: Path):
+        self.file = file
+        self._key: Optional[tuple[int, int]] = None
+        self._body = b""
+        self._gzipped = b""
+        self._etag = ""
+
+    def _load(self):
+        st = self.file.stat()
+        key = (st.st_mtime_ns, st.st_size)
+        if key == self._key:
+            return
+        body = self.file.read_bytes()
+        self._body = body
+        self._gzipped = gzip.compress(body, mtime=0)
+        # 弱 ETag：gzip 与原文是同一内容的两种表示
+        self._etag = f'W/"{hashlib.md5(body).hexdigest()[:16]}"'
+        self._key = key
+
+    def response(self, headers: Headers) -> Response:
+        self._load()
+        response_headers = {"Cache-Control": REVALIDATE, "ETag": self._etag, "Vary": "Accept-Encoding"}
+        if not_modified(headers, self._etag):
+            return Response(status_code=304, headers=response_headers)
+        body = self._body
+        if "gzip" in accepted_encodings(headers.get("accept-encoding", "")) and len(self._gzipped) < len(body):
+            body = self._gzipped
+            response_headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type="text/html", headers=response_headers)
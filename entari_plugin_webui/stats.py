@@ -0,0 +1,54 @@
+"""
+首页统计快照：启动时从数据库加载一次，之后随消息计数和插件事件增量维护
+"""
+
+import secrets
+from datetime import date, timedelta
+
+
+class DashboardStats:
+    """`/api/init_data` 使用的内存快照"""
+
+    def __init__(self):
+        self.total = 0
+        self.days: dict[str, int] = {}
+        self.plugin_enabled = 0
+        self.plugin_total = 0
+        self.version = 0
+        # 区分不同进程，避免重启后版本号重复导致 ETag 误命中
+        self.epoch = secrets.token_hex(4)
+
+    def load(self, total: int, days: dict[str, int]):
+        """用数据库中的历史数据初始化"""
+        self.total = total
+        self.days = dict(days)
+        self.version += 1
+
+    def incr(self, day: str, n: int = 1):
+        self.total += n
+        self.days[day] = self.days.get(day, 0) + n
+        self.version += 1
+        if len(self.days) > 8:
+            oldest = (date.fromisoformat(day) - timedelta(days=7)).isoformat()
+            self.days = {k: v for k, v in self.days.items() if k >= oldest}
+
+    def set_plugins(self, enabled: int, total: int):
+        if (enabled, total) != (self.plugin_enabled, self.plugin_total):
+            self.plugin_enabled, self.plugin_total = enabled, total
+            self.version += 1
+
+    def snapshot(self, today: date, runtime: int) -> dict:
+        monday = today - timedelta(days=today.weekday())
+        week_days = [(monday + timedelta(days=i)).isoformat() for i in range(7)]
+        return {
+            "today_messages": self.days.get(today.isoformat(), 0),
+            "weekMessages": [self.days.get(d, 0) for d in week_days],
+            "message_count": self.total,
+            "plugin_enabled": self.plugin_enabled,
+            "plugin_total": self.plugin_total,
+            "runtime": runtime,
+        }
+
+    def etag(self, today: date, runtime: int) -> str:
+        """快照版本 + 日期 + 运行分钟数，任一变化都会得到新的 ETag"""
+        return f'W/"{self.epoch}-{self.version}-{today.isoformat()}-{runtime}"'
@@ -0,0 +1,275 @@
+"""
+实例进程管理：每个实例配置作为独立的 Entari 子进程运行，
+支持优雅停止 / 重启、崩溃后指数退避重启、按核心绑定 CPU，输出写入各自的日志缓冲
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+from .logbuffer import LogBuffer
+from .sampler import ProcessProbe
+
+STARTING = "启动中"
+RUNNING = "运行中"
+STOPPING = "停止中"
+STOPPED = "已停止"
+BACKOFF = "等待重启"
+CRASHED = "已崩溃"
+
+# 子进程入口：加载指定配置并运行
+ENTRY = "import sys; from arclet.entari import Entari; Entari.load(sys.argv[1]).run()"
+
+StateFunc = Callable[[int, str], Awaitable[None]]
+
+
+@dataclass
+class InstanceProcess:
+    instance_id: int
+    config: Path
+    workdir: Path
+    logs: LogBuffer
+    state: str = STOPPED
+    pid: Optional[int] = None
+    core: Optional[int] = None
+    started_at: Optional[float] = None
+    exit_code: Optional[int] = None
+    restarts: int = 0
+    failures: int = 0
+    probe: Optional[ProcessProbe] = field(default=None, repr=False)
+    _proc: Optional[asyncio.subprocess.Process] = field(default=None, repr=False)
+    _runner: Optional[asyncio.Task] = field(default=None, repr=False)
+    _stopping: bool = field(default=False, repr=False)
+    _last_cpu: Optional[tuple[float, float]] = field(default=None, repr=False)
+
+    @property
+    def alive(self) -> bool:
+        return self._runner is not None and not self._runner.done()
+
+    def stats(self) -> Optional[dict]:
+        """CPU%（距上次调用）与内存（MB），进程未运行时为 None"""
+        if self.probe is None or self.state != RUNNING:
+            return None
+        now = time.monotonic()
+        cpu = self.probe.cpu_seconds()
+        rss = self.probe.rss()
+        percent = 0.0
+        if cpu is not None and self._last_cpu is not None and now > self._last_cpu[1]:
+            percent = round((cpu - self._last_cpu[0]) / (now - self._last_cpu[1]) * 100, 1)
+        if cpu is not None:
+            self._last_cpu = (cpu, now)
+        return {"cpu": percent, "memory": round(rss / 1024 / 1024, 1) if rss is not None else 0}
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.instance_id,
+            "state": self.state,
+            "pid": self.pid,
+            "core": self.core,
+            "started_at": self.started_at,
+            "exit_code": self.exit_code,
+            "restarts": self.restarts,
+        }
+
+
+class Supervisor:
+    """实例进程池
+
+    - 子进程以 `python -c ENTRY <config>` 启动，工作目录为 `workdir/<实例 id>`，互不干扰
+    - 非主动退出视为崩溃，按 `backoff_base * 2^n`（上限 `backoff_max`）延迟后重启；
+      稳定运行超过 `stable_after` 秒后退避计数清零，连续崩溃 `max_failures` 次后放弃
+    - 停止时先发 SIGINT，`stop_timeout` 秒后 terminate，再不退出则 kill
+    - 状态变化通过 `on_state` 回调写回数据库
+    """
+
+    def __init__(
+        self,
+        workdir: Path,
+        log_lines: int = 1000,
+        stop_timeout: float = 10.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        stable_after: float = 30.0,
+        max_failures: int = 10,
+        pin_cpu: bool = True,
+        on_state: Optional[StateFunc] = None,
+    ):
+        self.workdir = workdir
+        self.log_lines = log_lines
+        self.stop_timeout = stop_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.max_failures = max_failures
+        self.pin_cpu = pin_cpu and hasattr(os, "sched_setaffinity")
+        self.on_state = on_state
+        self.processes: dict[int, InstanceProcess] = {}
+
+    def get(self, instance_id: int) -> Optional[InstanceProcess]:
+        return self.processes.get(instance_id)
+
+    def _ensure(self, instance_id: int, config: Path) -> InstanceProcess:
+        item = self.processes.get(instance_id)
+        if item is None:
+            item = self.processes[instance_id] = InstanceProcess(
+                instance_id, config, self.workdir / str(instance_id), LogBuffer(self.log_lines)
+            )
+        item.config = config
+        return item
+
+    async def _set_state(self, item: InstanceProcess, state: str, persist: bool = True):
+        item.state = state
+        item.logs.write(f"--- {state} ---\n")
+        if persist and self.on_state:
+            try:
+                await self.on_state(item.instance_id, state)
+            except Exception as e:
+                logger.opt(exception=e).warning(f"保存实例 {item.instance_id} 状态失败")
+
+    def _pick_core(self) -> Optional[int]:
+        """选择当前绑定进程最少的核心"""
+        if not self.pin_cpu:
+            return None
+        cores = sorted(os.sched_getaffinity(0))
+        if not cores:
+            return None
+        used = [p.core for p in self.processes.values() if p.alive and p.core is not None]
+        return min(cores, key=lambda c: (used.count(c), c))
+
+    async def start(self, instance_id: int, config: Path) -> InstanceProcess:
+        item = self._ensure(instance_id, config)
+        if item.alive:
+            return item
+        item._stopping = False
+        item.failures = 0
+        item.state = STARTING
+        item._runner = asyncio.create_task(self._supervise(item))
+        return item
+
+    async def stop(self, instance_id: int, persist: bool = True) -> bool:
+        item = self.processes.get(instance_id)
+        if item is None or not item.alive:
+            return False
+        item._stopping = True
+        runner = item._runner
+        proc = item._proc
+        assert runner is not None
+        if proc is not None and proc.returncode is None:
+            await self._set_state(item, STOPPING, persist)
+            await self._terminate(item, proc)
+            # 等待剩余输出读完
+            try:
+                await asyncio.wait_for(asyncio.shield(runner), self.stop_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                runner.cancel()
+        else:
+            # 处于退避等待或尚未启动完成，直接取消
+            runner.cancel()
+        try:
+            await runner
+        except asyncio.CancelledError:
+            pass
+        await self._set_state(item, STOPPED, persist)
+        return True
+
+    async def restart(self, instance_id: int, config: Path) -> InstanceProcess:
+        await self.stop(instance_id)
+        item = await self.start(instance_id, config)
+        item.restarts += 1
+        return item
+
+    async def remove(self, instance_id: int):
+        await self.stop(instance_id)
+        self.processes.pop(instance_id, None)
+
+    async def shutdown(self):
+        """停止全部子进程；不写回状态，便于下次启动时恢复"""
+        await asyncio.gather(*(self.stop(i, persist=False) for i in list(self.processes)), return_exceptions=True)
+
+    async def _terminate(self, item: InstanceProcess, proc: asyncio.subprocess.Process):
+        steps = [proc.terminate, proc.kill]
+        if sys.platform != "win32":
+            steps.insert(0, lambda: proc.send_signal(signal.SIGINT))
+        for step in steps:
+            try:
+                step()
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(proc.wait(), self.stop_timeout)
+                return
+            except asyncio.TimeoutError:
+                item.logs.write("--- 进程未在超时内退出，继续强制结束 ---\n")
+
+    async def _supervise(self, item: InstanceProcess):
+        while not item._stopping:
+            started = time.monotonic()
+            try:
+                code = await self._spawn(item)
+            except Exception as e:
+                item.logs.write(f"--- 启动失败: {e!r} ---\n")
+                code = -1
+            if item._stopping:
+                return
+            if time.monotonic() - started >= self.stable_after:
+                item.failures = 0
+            item.failures += 1
+            if self.max_failures and item.failures >= self.max_failures:
+                item.logs.write(f"--- 连续崩溃 {item.failures} 次，不再自动重启 ---\n")
+                logger.error(f"实例 {item.instance_id} 连续崩溃 {item.failures} 次，已停止自动重启")
+                await self._set_state(item, CRASHED)
+                return
+            delay = min(self.backoff_base * 2 ** (item.failures - 1), self.backoff_max)
+            item.logs.write(f"--- 进程退出（code={code}），{delay:.1f} 秒后重启 ---\n")
+            logger.warning(f"实例 {item.instance_id} 异常退出（code={code}），{delay:.1f} 秒后重启")
+            await self._set_state(item, BACKOFF)
+            await asyncio.sleep(delay)
+            item.restarts += 1
+
+    async def _spawn(self, item: InstanceProcess) -> int:
+        item.workdir.mkdir(parents=True, exist_ok=True)
+        await self._set_state(item, STARTING)
+        env = {**os.environ, "PYTHONUNBUFFERED": "1", "ENTARI_CONFIG_FILE": str(item.config)}
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", ENTRY, str(item.config),
+            cwd=item.workdir,
+            env=env,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        item._proc = proc
+        item.pid = proc.pid
+        item.exit_code = None
+        item.started_at = time.time()
+        item.probe = ProcessProbe(proc.pid)
+        item._last_cpu = None
+        item.core = self._pick_core()
+        if item.core is not None:
+            try:
+                os.sched_setaffinity(proc.pid, {item.core})
+            except OSError:
+                item.core = None
+        await self._set_state(item, RUNNING)
+        try:
+            assert proc.stdout is not None
+            async for raw in proc.stdout:
+                item.logs.write(raw.decode(errors="replace"))
+            return await proc.wait()
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        finally:
+            item.exit_code = proc.returncode
+            item._proc = None
+            item.pid = None
+            item.probe = None
@@ -0,0 +1,267 @@
+"""
+pip 安装 / 卸载任务调度：限制并发、合并重复请求、支持取消，实时解析输出得到进度
+"""
+
+import asyncio
+import re
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+FINISHED = {"success", "failed", "cancelled"}
+
+# (匹配 pip 输出的正则, 对应进度)；进度只增不减，100 只在进程成功退出时给出
+PROGRESS_STEPS = [
+    (re.compile(r"^Collecting "), 15),
+    (re.compile(r"^Found existing installation"), 30),
+    (re.compile(r"^\s*Downloading "), 40),
+    (re.compile(r"^Requirement already satisfied"), 50),
+    (re.compile(r"^\s*Uninstalling "), 60),
+    (re.compile(r"^Installing collected packages"), 75),
+    (re.compile(r"^\s*Successfully (un)?installed"), 95),
+]
+
+
+def parse_progress(line: str, current: int) -> int:
+    for pattern, percent in PROGRESS_STEPS:
+        if pattern.match(line):
+            return max(current, percent)
+    return current
+
+
+@dataclass
+class InstallTask:
+    task_id: str
+    plugin_id: str
+    action: str = "install"
+    status: str = "pending"
+    percent: int = 0
+    log: str = field(default="")
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def as_dict(self):
+        return asdict(self)
+
+
+PersistFunc = Callable[[InstallTask], Awaitable[None]]
+FinishFunc = Callable[[InstallTask], Awaitable[None]]
+
+
+class PipScheduler:
+    """pip 任务调度器
+
+    - 同时最多运行 `concurrency` 个 pip 进程，其余排队
+    - 相同 (action, plugin_id) 的未完成任务直接复用
+    - 输出逐行写入 `task.log`（保留末尾 `max_log` 个字符）并解析进度
+    - 状态变化时调用 `persist` 落库，结束后调用 `on_finish`
+    - 已结束超过 `ttl` 秒的任务会从 `tasks` 中移除
+    - 任务新增、进度或状态变化、被移除时同步调用 `on_change`
+    - `shutdown` 中断全部任务：结束 pip 进程但保留未完成状态，下次启动时可重新排队
+    """
+
+    def __init__(
+        self,
+        tasks: dict[str, InstallTask],
+        concurrency: int = 2,
+        ttl: float = 3600,
+        max_log: int = 64 * 1024,
+        persist: Optional[PersistFunc] = None,
+        on_finish: Optional[FinishFunc] = None,
+        on_evict: Optional[Callable[[list[str]], Awaitable[None]]] = None,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.tasks = tasks
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.max_log = max_log
+        self.persist = persist
+        self.on_finish = on_finish
+        self.on_evict = on_evict
+        self.on_change = on_change
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runners: dict[str, asyncio.Task] = {}
+        # on_evict / 收尾等后台协程，保留引用防止被回收
+        self._background: set[asyncio.Task] = set()
+        self._closing = False
+        self._procs: dict[str, asyncio.subprocess.Process] = {}
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._persisted_at: dict[str, float] = {}
+
+    @staticmethod
+    def command(task: InstallTask) -> list[str]:
+        if task.action == "uninstall":
+            return [sys.executable, "-m", "pip", "uninstall", "-y", task.plugin_id]
+        return [sys.executable, "-m", "pip", "install", "-U", "--progress-bar", "off", task.plugin_id]
+
+    def find_running(self, action: str, plugin_id: str) -> Optional[InstallTask]:
+        for task in self.tasks.values():
+            if task.action == action and task.plugin_id == plugin_id and not task.finished:
+                return task
+        return None
+
+    def submit(self, action: str, plugin_id: str) -> InstallTask:
+        """提交任务；已有相同的未完成任务时直接返回它"""
+        self.evict()
+        if task := self.find_running(action, plugin_id):
+            return task
+        task = InstallTask(task_id=str(uuid.uuid4()), plugin_id=plugin_id, action=action)
+        self.tasks[task.task_id] = task
+        self.schedule(task)
+        return task
+
+    def schedule(self, task: InstallTask):
+        """为已存在的任务对象启动执行协程（也用于重启后恢复中断的任务）"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        runner = asyncio.create_task(self._run(task))
+        self._runners[task.task_id] = runner
+        runner.add_done_callback(lambda _: self._runner_done(task))
+
+    def _runner_done(self, task: InstallTask):
+        self._runners.pop(task.task_id, None)
+        if task.finished or self._closing:
+            return
+        # 执行协程还没开始就被取消时不会进入 _run 的收尾，在这里补上
+        task.status = "cancelled"
+        task.finished_at = time.time()
+        self._notify(task)
+        self._spawn(self._finish(task))
+
+    def _spawn(self, coro: Awaitable[None]):
+        background = asyncio.ensure_future(coro)
+        self._background.add(background)
+        background.add_done_callback(self._background.discard)
+
+    def shutdown(self):
+        """插件卸载时调用：取消全部执行协程（其中的 pip 进程随之结束）与后台协程"""
+        self._closing = True
+        for runner in list(self._runners.values()):
+            runner.cancel()
+        for background in list(self._background):
+            background.cancel()
+
+    async def cancel(self, task_id: str) -> bool:
+        task = self.tasks.get(task_id)
+        if not task or task.finished:
+            return False
+        if proc := self._procs.get(task_id):
+            proc.terminate()
+        if runner := self._runners.get(task_id):
+            runner.cancel()
+        return True
+
+    def evict(self):
+        now = time.time()
+        expired = [
+            task_id for task_id, task in self.tasks.items()
+            if task.finished and task.finished_at and now - task.finished_at > self.ttl
+        ]
+        for task_id in expired:
+            self.tasks.pop(task_id, None)
+            self._persisted_at.pop(task_id, None)
+        if expired and self.on_evict:
+            self._spawn(self.on_evict(expired))
+        if expired and self.on_change:
+            self.on_change()
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        subs = self._subscribers.get(task_id)
+        if subs:
+            subs.discard(queue)
+            if not subs:
+                del self._subscribers[task_id]
+
+    def _notify(self, task: InstallTask, line: Optional[str] = None):
+        event = {"task_id": task.task_id, "status": task.status, "percent": task.percent}
+        if line is not None:
+            event["line"] = line
+        for queue in self._subscribers.get(task.task_id, ()):
+            queue.put_nowait(event)
+        if self.on_change:
+            self.on_change()
+
+    async def _save(self, task: InstallTask, force: bool = False):
+        """状态变化时强制落库，输出刷新最多每秒落库一次"""
+        if not self.persist:
+            return
+        now = time.monotonic()
+        if not force and now - self._persisted_at.get(task.task_id, 0) < 1:
+            return
+        self._persisted_at[task.task_id] = now
+        try:
+            await self.persist(task)
+        except Exception as e:
+            logger.opt(exception=e).warning(f"保存 pip 任务 {task.task_id} 失败")
+
+    def _append_log(self, task: InstallTask, line: str):
+        task.log += line + "\n"
+        if len(task.log) > self.max_log:
+            task.log = task.log[-self.max_log:]
+
+    async def _run(self, task: InstallTask):
+        assert self._semaphore is not None
+        try:
+            await self._save(task, force=True)
+            async with self._semaphore:
+                task.status = "running"
+                self._notify(task)
+                await self._save(task, force=True)
+                proc = await asyncio.create_subprocess_exec(
+                    *self.command(task),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                )
+                self._procs[task.task_id] = proc
+                assert proc.stdout is not None
+                async for raw in proc.stdout:
+                    line = raw.decode(errors="replace").rstrip()
+                    if not line:
+                        continue
+                    self._append_log(task, line)
+                    task.percent = min(parse_progress(line, task.percent), 99)
+                    self._notify(task, line)
+                    await self._save(task)
+                await proc.wait()
+                if proc.returncode == 0:
+                    task.status = "success"
+                    task.percent = 100
+                else:
+                    task.status = "failed"
+        except asyncio.CancelledError:
+            if (proc := self._procs.get(task.task_id)) and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            if self._closing:
+                # 插件卸载：不记为取消，数据库中仍是未完成状态，下次启动重新排队
+                raise
+            task.status = "cancelled"
+        except Exception as e:
+            task.status = "failed"
+            self._append_log(task, f"任务执行出错: {e!r}")
+        finally:
+            self._procs.pop(task.task_id, None)
+        task.finished_at = time.time()
+        self._notify(task)
+        await self._finish(task)
+
+    async def _finish(self, task: InstallTask):
+        await self._save(task, force=True)
+        if self.on_finish:
+            try:
+                await self.on_finish(task)
+            except Exception as e:
+                logger.opt(exception=e).warning(f"pip 任务 {task.task_id} 收尾失败")
@@ -0,0 +1,101 @@
+"""
+延迟落库的公共部分：修改只记在内存里，由后台任务每隔一段时间或积压达到上限时合并成一次批量写入，
+写入失败时把这一批并回内存等待重试，退出时再尽力落库一次
+"""
+
+import asyncio
+from typing import Any, Optional
+
+from loguru import logger
+
+
+class WriteBehind:
+    """子类实现 `_take` / `_write` / `_restore`，热路径上积压过多时调用 `_wake` 提前落库
+
+    - `_take()` 取走当前积压（取走后内存中视为已清空），没有积压时返回空值
+    - `_write(batch)` 把取走的积压写入数据库
+    - `_restore(batch)` 写入失败时把积压并回，下次重试
+    """
+
+    label = "数据"
+    """日志中使用的名称"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.flushes = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _take(self) -> Any:
+        raise NotImplementedError
+
+    async def _write(self, batch: Any):
+        raise NotImplementedError
+
+    def _restore(self, batch: Any):
+        raise NotImplementedError
+
+    def _wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def flush(self):
+        """立即写入当前积压；失败时积压并回，等待下次重试"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                await self._write(batch)
+            except BaseException:
+                self._restore(batch)
+                raise
+            self.flushes += 1
+
+    def start(self):
+        """启动后台落库任务"""
+        if self._task and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        """取消后台任务（任务退出前会尽力落库一次）"""
+        if self._task:
+            self._task.cancel()
+
+    async def stop(self):
+        """停止后台任务并等待最后一次落库完成"""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        # 任务在第一次运行前就被取消时不会执行退出前的落库，这里补一次
+        await self.flush()
+
+    async def _run(self):
+        assert self._wakeup is not None
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.opt(exception=e).warning(f"{self.label}落库失败，将在下次重试")
+        except asyncio.CancelledError:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.opt(exception=e).error(f"关闭时{self.label}落库失败")
+            raise
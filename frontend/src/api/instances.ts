@@ -45,4 +45,43 @@ export const deleteInstance = (id: number) =>
 
 /** 更新实例配置 */
 export const updateInstanceConfig = (id: number, config: Record<string, unknown>) =>
-  request.put(`/api/instances/${id}/config`, config)
\ No newline at end of file
+  request.put(`/api/instances/${id}/config`, config)
+
+/** 重启实例 */
+export const restartInstance = (id: number) =>
+  request.post(`/instances/${id}/restart`)
+
+/** 获取实例最近的输出 */
+export const getInstanceLogs = (id: number, lines = 200) =>
+  request.get<{ lines: string[] }, { lines: string[] }>(`/instances/${id}/logs`, { params: { lines } })
+
+export interface InstanceBatchResult {
+  name: string
+  success: boolean
+  id?: number
+  action?: 'created' | 'updated'
+  message?: string
+}
+
+export interface InstanceBatchResponse {
+  success: boolean
+  results: InstanceBatchResult[]
+}
+
+/** 批量新建 / 更新实例 */
+export const batchInstances = (instances: CreateInstanceDto[], overwrite = false) =>
+  request.post<InstanceBatchResponse, InstanceBatchResponse>('/instances/batch', { instances, overwrite })
+
+/** 导入实例配置归档（zip，每个 <实例名>.yml 对应一个实例） */
+export const importInstances = (archive: Blob, overwrite = false) =>
+  request.post<InstanceBatchResponse, InstanceBatchResponse>('/instances/import', archive, {
+    params: { overwrite },
+    headers: { 'Content-Type': 'application/zip' },
+  })
+
+/** 导出实例配置归档；不传 ids 时导出全部 */
+export const exportInstances = (ids?: number[]) =>
+  request.get<Blob, Blob>('/instances/export', {
+    params: ids?.length ? { ids: ids.join(',') } : {},
+    responseType: 'blob',
+  })
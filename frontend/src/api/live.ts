@@ -0,0 +1,161 @@
+import { useAuthStore } from '@/stores/auth'
+
+export type LiveTopic = 'stats' | 'plugins' | 'instances' | 'tasks' | 'logs'
+
+/** 服务端帧：snap 为完整快照，set / del 为相对上一序号的增量；日志帧的 d 为新增文本 */
+export interface LiveFrame {
+  t: LiveTopic | 'hello' | 'error'
+  s?: number
+  snap?: Record<string, any>
+  set?: Record<string, any>
+  del?: string[]
+  d?: string
+  gap?: boolean
+  epoch?: string
+  message?: string
+}
+
+export interface LogOptions {
+  level?: string
+  source?: string[]
+  regex?: string
+  html?: boolean
+}
+
+type Listener = (state: Record<string, any>, frame: LiveFrame) => void
+type LogListener = (text: string, frame: LiveFrame) => void
+
+/**
+ * /ws/live 的客户端：一个连接订阅多个主题，在本地按序号合并快照与增量；
+ * 断线后按退避重连，并带上各主题最后的序号续传
+ */
+export class LiveChannel {
+  private socket: WebSocket | null = null
+  private epoch: string | null = null
+  private seqs: Partial<Record<LiveTopic, number | null>> = {}
+  private listeners: Partial<Record<LiveTopic, Set<Listener>>> = {}
+  private logListeners = new Set<LogListener>()
+  private logOptions: LogOptions = {}
+  private retry = 0
+  private timer: ReturnType<typeof setTimeout> | null = null
+  private closed = false
+
+  readonly state: Partial<Record<LiveTopic, Record<string, any>>> = {}
+
+  private url() {
+    const base = window.RUNTIME_CONFIG?.baseURL.replace('/api', '/ws/live')
+    return `${base}?token=${encodeURIComponent(useAuthStore().token)}`
+  }
+
+  connect() {
+    this.closed = false
+    const socket = new WebSocket(this.url())
+    this.socket = socket
+    socket.onmessage = (event) => this.handle(JSON.parse(event.data) as LiveFrame)
+    socket.onclose = (event) => {
+      if (this.socket !== socket) return
+      this.socket = null
+      // 4401 为鉴权失败，不再重连
+      if (!this.closed && event.code !== 4401) this.reconnect()
+    }
+  }
+
+  close() {
+    this.closed = true
+    if (this.timer) clearTimeout(this.timer)
+    this.socket?.close()
+    this.socket = null
+  }
+
+  /** 订阅主题；已连接时立即发送，否则在连接建立后随续传一起发送 */
+  subscribe(topic: Exclude<LiveTopic, 'logs'>, listener: Listener) {
+    ;(this.listeners[topic] ??= new Set()).add(listener)
+    if (!(topic in this.seqs)) {
+      this.seqs[topic] = null
+      this.send({ op: 'sub', topics: { [topic]: null } })
+    } else if (this.state[topic]) {
+      listener(this.state[topic]!, { t: topic, s: this.seqs[topic] ?? 0 })
+    }
+    return () => this.unsubscribe(topic, listener)
+  }
+
+  subscribeLogs(listener: LogListener, options: LogOptions = {}) {
+    this.logListeners.add(listener)
+    this.logOptions = options
+    this.seqs.logs = null
+    this.send({ op: 'sub', topics: { logs: null }, logs: options })
+    return () => {
+      this.logListeners.delete(listener)
+      if (!this.logListeners.size) {
+        delete this.seqs.logs
+        this.send({ op: 'unsub', topics: ['logs'] })
+      }
+    }
+  }
+
+  private unsubscribe(topic: Exclude<LiveTopic, 'logs'>, listener: Listener) {
+    const listeners = this.listeners[topic]
+    listeners?.delete(listener)
+    if (listeners && !listeners.size) {
+      delete this.seqs[topic]
+      delete this.state[topic]
+      this.send({ op: 'unsub', topics: [topic] })
+    }
+  }
+
+  private send(data: unknown) {
+    if (this.socket?.readyState === WebSocket.OPEN) this.socket.send(JSON.stringify(data))
+  }
+
+  private reconnect() {
+    const delay = Math.min(1000 * 2 ** this.retry, 30000)
+    this.retry += 1
+    this.timer = setTimeout(() => this.connect(), delay)
+  }
+
+  private handle(frame: LiveFrame) {
+    if (frame.t === 'hello') {
+      this.retry = 0
+      const topics = Object.keys(this.seqs)
+      if (topics.length) {
+        this.send({ op: 'sub', topics: this.seqs, epoch: this.epoch, logs: this.logOptions })
+      }
+      this.epoch = frame.epoch ?? null
+      return
+    }
+    if (frame.t === 'error') {
+      console.warn('实时通道错误:', frame.message)
+      return
+    }
+    if (frame.t === 'logs') {
+      this.seqs.logs = frame.s ?? null
+      if (frame.d) this.logListeners.forEach((listener) => listener(frame.d!, frame))
+      return
+    }
+    const topic = frame.t
+    if (!(topic in this.seqs)) return
+    const last = this.seqs[topic]
+    if (frame.snap) {
+      this.state[topic] = { ...frame.snap }
+    } else {
+      // 早于或等于本地序号的增量已包含在快照中
+      if (last != null && frame.s! <= last) return
+      const state = (this.state[topic] ??= {})
+      Object.assign(state, frame.set ?? {})
+      for (const key of frame.del ?? []) delete state[key]
+    }
+    this.seqs[topic] = frame.s ?? null
+    this.listeners[topic]?.forEach((listener) => listener(this.state[topic]!, frame))
+  }
+}
+
+let channel: LiveChannel | null = null
+
+/** 全局共享的实时通道，首次调用时建立连接 */
+export const useLiveChannel = () => {
+  if (!channel) {
+    channel = new LiveChannel()
+    channel.connect()
+  }
+  return channel
+}
@@ -0,0 +1,43 @@
+import request from '@/utils/request'
+
+export interface LogFile {
+  file: string
+  size: number
+  compressed: boolean
+  records: number
+  from: number
+  to: number
+}
+
+export interface LogRecord {
+  file: string
+  index: number
+  time: string
+  timestamp: number
+  level: string
+  name: string
+  text: string
+}
+
+export interface LogSearchParams {
+  q?: string
+  level?: string
+  name?: string
+  from?: string | number
+  to?: string | number
+  limit?: number
+  cursor?: string | null
+}
+
+export interface LogSearchResult {
+  items: LogRecord[]
+  cursor: string | null
+}
+
+/** 列出当前日志与轮转归档 */
+export const listLogFiles = () =>
+  request.get<LogFile[], LogFile[]>('/logs/files')
+
+/** 检索历史日志（从新到旧），返回的 cursor 用于加载下一页 */
+export const searchLogs = (params: LogSearchParams) =>
+  request.get<LogSearchResult, LogSearchResult>('/logs/search', { params })
@@ -0,0 +1,29 @@
+import request from '@/utils/request'
+
+export interface TimerSummary {
+  count: number
+  avg: number
+  p50: number
+  p95: number
+  p99: number
+}
+
+export interface RouteMetrics extends TimerSummary {
+  method: string
+  path: string
+  bytes_out: number
+  errors: number
+  error_rate: number
+  statuses: Record<string, number>
+}
+
+export interface MetricsSummary {
+  uptime: number
+  routes: RouteMetrics[]
+  timers: Record<string, TimerSummary>
+  gauges: Record<string, number>
+}
+
+/** 获取运行指标摘要（耗时单位：秒） */
+export const getMetricsSummary = () =>
+  request.get<MetricsSummary, MetricsSummary>('/metrics/summary')
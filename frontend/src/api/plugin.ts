@@ -26,6 +26,16 @@ export interface MarketItem {
   updated: string
   tags: string[]
   installed: boolean
+  version?: string
+  latest?: string
+  homepage?: string
+}
+
+export interface MarketSearchResult {
+  total: number
+  page: number
+  size: number
+  items: MarketItem[]
 }
 
 interface CreatePluginParams {
@@ -47,11 +57,36 @@ export const installPlugin = (name: string) =>
 export const uninstallPlugin = (name: string) =>
   axios.post('/plugins/uninstall', { name });
 
+export interface PluginTask {
+  task_id: string
+  plugin_id: string
+  action: 'install' | 'uninstall'
+  status: 'pending' | 'running' | 'success' | 'failed' | 'cancelled'
+  percent: number
+  log?: string
+  created_at: number
+  finished_at?: number | null
+}
+
+export const listPluginTasks = (): Promise<PluginTask[]> =>
+  axios.get('/plugins/tasks')
+
+export const getPluginTask = (taskId: string): Promise<PluginTask> =>
+  axios.get(`/plugins/tasks/${taskId}`)
+
+export const cancelPluginTask = (taskId: string) =>
+  axios.post(`/plugins/tasks/${taskId}/cancel`)
+
 export const listMarketPlugins = (): Promise<MarketItem[]> =>
   axios.get('/market/plugins');
 
-export const searchPlugins = (keyword: string): Promise<PluginItem[]> =>
-  axios.get(`/plugins/search?q=${keyword}`)
+/** 在本地市场索引中搜索（前缀与拼写相近的匹配），结果分页 */
+export const searchPlugins = (keyword: string, page = 1, size = 20): Promise<MarketSearchResult> =>
+  axios.get('/plugins/search', { params: { q: keyword, page, size } })
+
+/** 导入插件目录：插件数组或 {plugins: [...]}，每项至少包含 name */
+export const importMarketCatalog = (catalog: unknown): Promise<{ success: boolean; message: string; changed: number }> =>
+  axios.post('/market/catalog', catalog)
 export const loadPlugin = (name: string) =>
   axios.post(`/plugins/load`, { name })
 export const unloadPlugin = (name: string) =>
@@ -61,3 +96,17 @@ export const reloadPlugin = (name: string) =>
 export const savePlugin = (data: Partial<PluginItem>) =>
   axios.post('/plugins/save', data)
 
+
+export interface PluginBatchItem {
+  id: string
+  enable?: boolean
+  config?: PluginConfig
+}
+export interface PluginBatchResult {
+  id: string
+  success: boolean
+  message?: string
+}
+/** 批量启停插件 / 保存配置，逐项返回结果 */
+export const batchPlugins = (items: PluginBatchItem[]): Promise<{ success: boolean; results: PluginBatchResult[] }> =>
+  axios.post('/plugins/batch', { items })
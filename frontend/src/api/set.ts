@@ -81,5 +81,36 @@ export interface Config {
 export const getConfig = (): Promise<Config> =>
   axios.get('/config').then(res => res.data)
 
-export const saveConfig = (cfg: Config): Promise<{ success: true }> =>
-  axios.post('/config', cfg).then(res => res.data)
+/** 单个插件的配置变更结果，status: loaded / unloaded / reloaded / handled / enabled / disabled / skipped / failed */
+export interface PluginApplyResult {
+  name: string
+  action: 'load' | 'unload' | 'reconfigure' | 'toggle'
+  keys: string[]
+  enable: boolean | null
+  status: string
+  message: string
+  ms: number
+}
+
+export interface ConfigApplyReport {
+  success: boolean
+  message?: string
+  /** 校验失败时的 {位置: 错误} */
+  errors?: Record<string, string>
+  basic: { key: string; ms: number }[]
+  plugins: PluginApplyResult[]
+  elapsed_ms: number
+}
+
+/** 保存主配置并只重载有变化的插件；dryRun 时只校验并返回变更计划 */
+export const saveConfig = (cfg: Config, dryRun = false): Promise<ConfigApplyReport> =>
+  axios.post('/config', cfg, { params: dryRun ? { dry_run: true } : undefined }).then(res => res.data)
+
+export interface ConfigPatchOp {
+  op: 'add' | 'remove' | 'replace' | 'test'
+  path: string
+  value?: unknown
+}
+
+export const patchConfig = (ops: ConfigPatchOp[]): Promise<ConfigApplyReport> =>
+  axios.patch('/config', ops).then(res => res.data)
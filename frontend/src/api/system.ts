@@ -0,0 +1,29 @@
+import request from '@/utils/request'
+import { useAuthStore } from '@/stores/auth'
+
+export interface SystemSample {
+  seq: number
+  time: number
+  cpu: number | null
+  rss: number | null
+  memory: number | null
+  threads: number | null
+  fds: number | null
+  loop_lag: number | null
+  tasks: number | null
+  sample_cost: number
+}
+
+export interface SystemStats {
+  interval: number
+  overhead: number
+  samples: SystemSample[]
+}
+
+/** 获取进程资源样本；传入 since 只取更新的样本 */
+export const getSystemStats = (since = 0) =>
+  request.get<SystemStats, SystemStats>('/system/stats', { params: { since } })
+
+/** 资源样本推送地址：先收到 {type: 'snapshot'}，之后每个样本一条 {type: 'sample'} */
+export const systemStatsSocketUrl = (since = 0) =>
+  `${window.RUNTIME_CONFIG?.baseURL.replace('/api', '/ws/system/stats')}?since=${since}&token=${encodeURIComponent(useAuthStore().token)}`
@@ -1,5 +1,6 @@
 import { defineStore } from 'pinia'
-import axios from 'axios'
+import request from '@/utils/request'
+import { useLiveChannel } from '@/api/live'
 
 export const useInitData = defineStore('webInitData', {
   state: () => ({
@@ -15,8 +16,13 @@ export const useInitData = defineStore('webInitData', {
 
   actions: {
     async fetchInitData() {
-      const { data } = await axios.get('/init_data')
+      const data = await request.get('/init_data')
       Object.assign(this, data)
+    },
+
+    /** 订阅 /ws/live 的 stats 主题，之后只在数据变化时更新；返回取消订阅的函数 */
+    watchInitData() {
+      return useLiveChannel().subscribe('stats', (state) => Object.assign(this, state))
     }
   }
 })
\ No newline at end of file
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import shutil, subprocess, sys
+import gzip, shutil, subprocess, sys
 from pathlib import Path
 
 # 所有路径都用相对当前文件所在目录解析
@@ -7,6 +7,10 @@ BASE_DIR        = Path(__file__).parent
 FRONTEND_DIST   = BASE_DIR / "frontend" / "dist"
 FRONTEND_PKG    = BASE_DIR / "entari_plugin_webui" / "frontend"
 
+# 只压缩文本类资源；太小的文件压缩后收益不大
+COMPRESS_SUFFIXES = {".js", ".css", ".html", ".svg", ".json", ".map", ".txt", ".ico"}
+COMPRESS_MIN_SIZE = 1024
+
 def copy_frontend():
     if not FRONTEND_DIST.exists():
         print(f"[ERROR] {FRONTEND_DIST} 不存在，请先在前端目录执行 npm run build")
@@ -17,9 +21,36 @@ def copy_frontend():
     shutil.copytree(FRONTEND_DIST, FRONTEND_PKG)
     print(f"[INFO] 前端产物已复制到 {FRONTEND_PKG}")
 
+def precompress():
+    """为静态资源生成 .gz / .br 副本，运行时按 Accept-Encoding 直接返回，不再现场压缩"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("[WARN] 未安装 brotli，只生成 gzip 副本（pip install brotli）")
+
+    count = 0
+    for file in FRONTEND_PKG.rglob("*"):
+        if not file.is_file() or file.suffix not in COMPRESS_SUFFIXES or file.name == "runtime.json":
+            continue
+        data = file.read_bytes()
+        if len(data) < COMPRESS_MIN_SIZE:
+            continue
+        # mtime=0 保证同样的输入得到同样的产物
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(gz) < len(data):
+            file.with_name(file.name + ".gz").write_bytes(gz)
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            if len(br) < len(data):
+                file.with_name(file.name + ".br").write_bytes(br)
+        count += 1
+    print(f"[INFO] 已预压缩 {count} 个静态文件")
+
 def build():
     copy_frontend()
+    precompress()
     subprocess.run(["pdm", "build"], check=True)
 
 if __name__ == "__main__":
-    build()
\ No newline at end of file
+    build()
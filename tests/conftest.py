@@ -0,0 +1,12 @@
+import sys
+import types
+from pathlib import Path
+
+PACKAGE = Path(__file__).resolve().parent.parent / "entari_plugin_webui"
+
+# 包的 __init__ 会注册 entari 插件并连接数据库；测试只覆盖各个自包含的子模块，
+# 这里登记一个只有 __path__ 的空包，使 `entari_plugin_webui.xxx` 与模块内的相对导入照常工作
+if "entari_plugin_webui" not in sys.modules:
+    package = types.ModuleType("entari_plugin_webui")
+    package.__path__ = [str(PACKAGE)]
+    sys.modules["entari_plugin_webui"] = package
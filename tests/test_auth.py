@@ -0,0 +1,59 @@
+from entari_plugin_webui import auth
+from entari_plugin_webui.auth import AuthUser, TokenCache
+
+ALICE = AuthUser(1, "alice", "alice@example.com")
+BOB = AuthUser(2, "bob", "bob@example.com")
+
+
+def test_hit_and_miss_counters():
+    cache = TokenCache()
+    assert cache.get("t1") is None
+    cache.put("t1", ALICE)
+    assert cache.get("t1") is ALICE
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(auth.time, "monotonic", lambda: now[0])
+    cache = TokenCache(ttl=10)
+    cache.put("t1", ALICE)
+    now[0] += 9.9
+    assert cache.get("t1") is ALICE
+    now[0] += 0.2
+    assert cache.get("t1") is None
+    # 过期的条目在读取时移除
+    assert "t1" not in cache._data
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TokenCache(maxsize=2)
+    cache.put("t1", ALICE)
+    cache.put("t2", BOB)
+    assert cache.get("t1") is ALICE  # t1 变为最近使用
+    cache.put("t3", BOB)
+    assert cache.get("t2") is None
+    assert cache.get("t1") is ALICE
+    assert cache.get("t3") is BOB
+
+
+def test_put_refreshes_existing_token():
+    cache = TokenCache(maxsize=2)
+    cache.put("t1", ALICE)
+    cache.put("t2", BOB)
+    cache.put("t1", ALICE)
+    cache.put("t3", BOB)
+    assert cache.get("t1") is ALICE
+    assert cache.get("t2") is None
+
+
+def test_invalidate_user_drops_all_their_tokens():
+    cache = TokenCache()
+    cache.put("a1", ALICE)
+    cache.put("a2", ALICE)
+    cache.put("b1", BOB)
+    cache.invalidate_user(ALICE.id)
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1") is BOB
+    cache.invalidate("b1")
+    assert cache.get("b1") is None
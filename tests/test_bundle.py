@@ -0,0 +1,77 @@
+import io
+import struct
+import zipfile
+
+import pytest
+
+from entari_plugin_webui.bundle import pack_configs, unpack_configs
+
+
+def make_zip(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def understate_sizes(data: bytes, size: int) -> bytes:
+    """把归档目录与本地文件头中记录的解压大小改小，模拟伪造的归档"""
+    data = bytearray(data)
+    for signature, offset in ((b"PK\x01\x02", 24), (b"PK\x03\x04", 22)):
+        start = data.find(signature)
+        while start != -1:
+            struct.pack_into("<I", data, start + offset, size)
+            start = data.find(signature, start + 4)
+    return bytes(data)
+
+
+def test_round_trip():
+    files = {"a.yml": b"# comment\nplugins:\n  echo: {}\n", "b.yaml": b"basic: {}\n"}
+    assert unpack_configs(pack_configs(files)) == {"a": {"plugins": {"echo": {}}}, "b": {"basic": {}}}
+
+
+def test_skips_directories_hidden_and_other_files():
+    data = make_zip({"dir/": b"", "dir/a.yml": b"x: 1\n", ".hidden.yml": b"x: 2\n", "readme.txt": b"hi", "empty.yml": b""})
+    assert unpack_configs(data) == {"a": {"x": 1}, "empty": {}}
+
+
+def test_file_count_limit():
+    files = {f"{i}.yml": b"x: 1\n" for i in range(4)}
+    assert len(unpack_configs(make_zip(files), max_files=4)) == 4
+    with pytest.raises(ValueError, match="超过 3 个"):
+        unpack_configs(make_zip(files), max_files=3)
+
+
+def test_declared_size_limit():
+    files = {"a.yml": b"x: " + b"1" * 100 + b"\n"}
+    with pytest.raises(ValueError, match="过大"):
+        unpack_configs(make_zip(files), max_bytes=50)
+
+
+def test_actual_size_is_checked_when_header_lies():
+    # 压缩率很高的内容，归档目录中声称只有 10 字节
+    data = understate_sizes(make_zip({"a.yml": b"x: " + b"1" * 10000 + b"\n"}), 10)
+    assert zipfile.ZipFile(io.BytesIO(data)).infolist()[0].file_size == 10
+    with pytest.raises(ValueError, match="无法解压"):
+        unpack_configs(data, max_bytes=1000)
+
+
+def test_invalid_archives_and_contents():
+    with pytest.raises(ValueError, match="zip"):
+        unpack_configs(b"not a zip")
+    with pytest.raises(ValueError, match="重名"):
+        unpack_configs(make_zip({"a.yml": b"x: 1\n", "dir/a.yaml": b"x: 2\n"}))
+    with pytest.raises(ValueError, match="YAML"):
+        unpack_configs(make_zip({"a.yml": b"x: [1\n"}))
+    with pytest.raises(ValueError, match="映射"):
+        unpack_configs(make_zip({"a.yml": b"- 1\n"}))
+
+
+def test_corrupted_member_is_rejected():
+    data = bytearray(make_zip({"a.yml": b"x: " + b"1" * 1000 + b"\n"}))
+    # 破坏压缩数据
+    start = data.find(b"PK\x03\x04") + 30 + len("a.yml")
+    data[start:start + 8] = b"\xff" * 8
+    with pytest.raises(ValueError, match="无法解压"):
+        unpack_configs(bytes(data))
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from entari_plugin_webui.configstore import ConfigStore, PatchError, apply_patch
+
+DOC = {
+    "basic": {"network": [{"type": "ws", "port": 5140}]},
+    "plugins": {"a/b": {"x": 1}, "~c": {}},
+}
+
+
+def test_add_replace_remove_on_objects():
+    ops = [
+        {"op": "add", "path": "/basic/log_level", "value": "debug"},
+        {"op": "replace", "path": "/basic/network/0/port", "value": 8080},
+        {"op": "remove", "path": "/plugins/~0c"},
+    ]
+    result = apply_patch(DOC, ops)
+    assert result["basic"]["log_level"] == "debug"
+    assert result["basic"]["network"][0]["port"] == 8080
+    assert "~c" not in result["plugins"]
+
+
+def test_returns_copy_and_leaves_input_untouched():
+    result = apply_patch(DOC, [{"op": "replace", "path": "/basic/network/0/port", "value": 1}])
+    assert result is not DOC
+    assert DOC["basic"]["network"][0]["port"] == 5140
+
+
+def test_escaped_pointer_segments():
+    result = apply_patch(DOC, [{"op": "replace", "path": "/plugins/a~1b/x", "value": 2}])
+    assert result["plugins"]["a/b"] == {"x": 2}
+
+
+def test_list_operations():
+    doc = {"items": [1, 2, 3]}
+    assert apply_patch(doc, [{"op": "add", "path": "/items/-", "value": 4}])["items"] == [1, 2, 3, 4]
+    assert apply_patch(doc, [{"op": "add", "path": "/items/0", "value": 0}])["items"] == [0, 1, 2, 3]
+    # add 允许下标等于长度，即追加到末尾
+    assert apply_patch(doc, [{"op": "add", "path": "/items/3", "value": 4}])["items"] == [1, 2, 3, 4]
+    assert apply_patch(doc, [{"op": "replace", "path": "/items/1", "value": 9}])["items"] == [1, 9, 3]
+    assert apply_patch(doc, [{"op": "remove", "path": "/items/0"}])["items"] == [2, 3]
+
+
+def test_replace_root():
+    assert apply_patch(DOC, [{"op": "replace", "path": "", "value": {"a": 1}}]) == {"a": 1}
+
+
+def test_test_op_guards_following_ops():
+    ops = [
+        {"op": "test", "path": "/basic/network/0/type", "value": "ws"},
+        {"op": "replace", "path": "/basic/network/0/type", "value": "http"},
+    ]
+    assert apply_patch(DOC, ops)["basic"]["network"][0]["type"] == "http"
+    ops[0]["value"] = "http"
+    with pytest.raises(PatchError, match="test"):
+        apply_patch(DOC, ops)
+
+
+@pytest.mark.parametrize(
+    "op",
+    [
+        {"op": "replace", "path": "/basic/missing", "value": 1},
+        {"op": "remove", "path": "/plugins/missing"},
+        {"op": "add", "path": "/missing/child", "value": 1},
+        {"op": "replace", "path": "/basic/network/1", "value": {}},
+        {"op": "add", "path": "/basic/network/5", "value": {}},
+        {"op": "remove", "path": "/basic/network/x"},
+        {"op": "add", "path": "/basic/network/0/port/x", "value": 1},
+        {"op": "remove", "path": ""},
+        {"op": "move", "path": "/basic/network", "from": "/plugins"},
+        {"op": "add", "path": "basic", "value": 1},
+    ],
+)
+def test_invalid_operations_raise(op):
+    with pytest.raises(PatchError):
+        apply_patch(DOC, [op])
+
+
+def test_failed_patch_does_not_apply_earlier_ops():
+    doc = {"a": 1}
+    with pytest.raises(PatchError):
+        apply_patch(doc, [{"op": "replace", "path": "/a", "value": 2}, {"op": "remove", "path": "/b"}])
+    assert doc == {"a": 1}
+
+
+def test_save_in_place_keeps_file(tmp_path):
+    path = tmp_path / "entari.yml"
+    path.write_text("a: 1\n")
+    inode = path.stat().st_ino
+    store = ConfigStore()
+    asyncio.run(store.save(path, {"a": 2}, in_place=True))
+    assert path.stat().st_ino == inode
+    asyncio.run(store.save(path, {"a": 3}))
+    assert path.stat().st_ino != inode
+    assert asyncio.run(store.load(path)) == {"a": 3}
+    assert [p.name for p in tmp_path.iterdir()] == ["entari.yml"]
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from entari_plugin_webui.counter import MessageCounter
+
+
+def test_flush_writes_aggregated_batch():
+    batches = []
+
+    async def flush(batch):
+        batches.append(batch)
+
+    async def main():
+        counter = MessageCounter(flush)
+        counter.incr("qq", 0, "2025-09-10T00:00")
+        counter.incr("qq", 0, "2025-09-10T00:00", 2)
+        counter.incr("kook", 1, "2025-09-10T00:01")
+        assert counter.pending() == 4
+        assert counter.pending("2025-09-10") == 4
+        await counter.flush()
+        assert counter.pending() == 0
+        # 没有积压时不调用 flush_func
+        await counter.flush()
+
+    asyncio.run(main())
+    assert batches == [{("qq", 0, "2025-09-10T00:00"): 3, ("kook", 1, "2025-09-10T00:01"): 1}]
+
+
+def test_failed_flush_merges_back():
+    calls = []
+
+    async def flush(batch):
+        calls.append(dict(batch))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+
+    async def main():
+        counter = MessageCounter(flush)
+        counter.incr("qq", 0, "2025-09-10T00:00", 3)
+        with pytest.raises(RuntimeError):
+            await counter.flush()
+        # 失败的批次并回缓冲，期间新增的计数叠加在上面
+        assert counter.pending_items() == [(("qq", 0, "2025-09-10T00:00"), 3)]
+        counter.incr("qq", 0, "2025-09-10T00:00", 2)
+        await counter.flush()
+        assert counter.pending() == 0
+
+    asyncio.run(main())
+    assert calls[1] == {("qq", 0, "2025-09-10T00:00"): 5}
+
+
+def test_stop_flushes_remaining():
+    batches = []
+
+    async def flush(batch):
+        batches.append(batch)
+
+    async def main():
+        counter = MessageCounter(flush, interval=60)
+        counter.start()
+        counter.incr("qq", 0, "2025-09-10T00:00")
+        await counter.stop()
+
+    asyncio.run(main())
+    assert batches == [{("qq", 0, "2025-09-10T00:00"): 1}]
+
+
+def test_max_keys_wakes_background_flush():
+    batches = []
+
+    async def flush(batch):
+        batches.append(batch)
+
+    async def main():
+        counter = MessageCounter(flush, interval=60, max_keys=2)
+        counter.start()
+        counter.incr("qq", 0, "2025-09-10T00:00")
+        counter.incr("qq", 0, "2025-09-10T00:01")
+        for _ in range(50):
+            if batches:
+                break
+            await asyncio.sleep(0.01)
+        assert len(batches) == 1
+        await counter.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+import asyncio
+
+from entari_plugin_webui import inventory
+from entari_plugin_webui.inventory import DistributionInventory, normalize_name
+
+
+def test_normalize_name():
+    assert normalize_name("Entari_Plugin.Foo") == "entari-plugin-foo"
+
+
+def test_concurrent_gets_share_one_refresh(monkeypatch):
+    scans = []
+    monkeypatch.setattr(inventory, "scan_distributions", lambda: scans.append(1) or {"six": "1.0"})
+    costs = []
+
+    async def main():
+        inv = DistributionInventory(on_refresh=costs.append)
+        results = await asyncio.gather(inv.get(), inv.get(), inv.get())
+        assert all(result == {"six": "1.0"} for result in results)
+        assert await inv.get() is results[0]
+        inv.invalidate()
+        await inv.get()
+        return inv
+
+    inv = asyncio.run(main())
+    assert len(scans) == inv.refresh_count == len(costs) == 2
+    assert inv.last_refresh_seconds == costs[-1] >= 0
+
+
+def test_invalidate_during_refresh_discards_result(monkeypatch):
+    versions = iter(["1.0", "2.0"])
+    monkeypatch.setattr(inventory, "scan_distributions", lambda: {"six": next(versions)})
+
+    async def main():
+        inv = DistributionInventory()
+        pending = asyncio.ensure_future(inv.get())
+        await asyncio.sleep(0)
+        inv.invalidate()
+        assert (await pending)["six"] == "1.0"
+        assert (await inv.get())["six"] == "2.0"
+
+    asyncio.run(main())
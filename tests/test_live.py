@@ -0,0 +1,146 @@
+import asyncio
+
+from entari_plugin_webui.live import LiveHub, LiveSubscriber, decode, diff_state
+
+
+def make_hub(history: int = 64):
+    state = {"a": 1}
+    hub = LiveHub(interval=0, history=history)
+    hub.register("stats", lambda: dict(state))
+    return hub, state
+
+
+def payloads(frames) -> list[dict]:
+    return [decode(frame.encode("json")) for frame in frames]
+
+
+async def change(hub: LiveHub, state: dict, **values):
+    state.update(values)
+    hub.touch("stats")
+    await hub.refresh(hub.topics["stats"])
+
+
+def test_diff_state():
+    assert diff_state({"a": 1, "b": 2}, {"a": 1, "b": 3, "c": None}) == ({"b": 3, "c": None}, [])
+    assert diff_state({"a": 1, "b": 2}, {"a": 1}) == ({}, ["b"])
+
+
+def test_first_subscribe_gets_snapshot():
+    async def main():
+        hub, _ = make_hub()
+        frames = await hub.subscribe(LiveSubscriber(), hub.topics["stats"])
+        assert payloads(frames) == [{"t": "stats", "s": 1, "snap": {"a": 1}}]
+
+    asyncio.run(main())
+
+
+def test_resume_from_seq_returns_only_missed_deltas():
+    async def main():
+        hub, state = make_hub()
+        topic = hub.topics["stats"]
+        first = LiveSubscriber()
+        await hub.subscribe(first, topic)
+        await change(hub, state, a=2)
+        await change(hub, state, b=1)
+        del state["a"]
+        hub.touch("stats")
+        await hub.refresh(topic)
+        assert len(first.pending) == 3
+
+        # 断线前收到序号 2，重连后只补发 3、4
+        frames = await hub.subscribe(LiveSubscriber(), topic, since=2, epoch=hub.epoch)
+        assert payloads(frames) == [
+            {"t": "stats", "s": 3, "set": {"b": 1}},
+            {"t": "stats", "s": 4, "del": ["a"]},
+        ]
+        # 已是最新时无需补发
+        assert await hub.subscribe(LiveSubscriber(), topic, since=4, epoch=hub.epoch) == []
+
+    asyncio.run(main())
+
+
+def test_epoch_mismatch_or_future_seq_falls_back_to_snapshot():
+    async def main():
+        hub, state = make_hub()
+        topic = hub.topics["stats"]
+        await hub.subscribe(LiveSubscriber(), topic)
+        await change(hub, state, a=2)
+        for since, epoch in ((1, "other"), (1, None), (99, hub.epoch)):
+            frames = await hub.subscribe(LiveSubscriber(), topic, since=since, epoch=epoch)
+            assert payloads(frames) == [{"t": "stats", "s": 2, "snap": {"a": 2}}]
+
+    asyncio.run(main())
+
+
+def test_seq_older_than_history_falls_back_to_snapshot():
+    async def main():
+        hub, state = make_hub(history=2)
+        topic = hub.topics["stats"]
+        await hub.subscribe(LiveSubscriber(), topic)
+        for value in range(2, 6):
+            await change(hub, state, a=value)
+        assert topic.seq == 5
+        assert [f.data["s"] for f in topic.since(3)] == [4, 5]
+        assert topic.since(2) is None
+        frames = await hub.subscribe(LiveSubscriber(), topic, since=2, epoch=hub.epoch)
+        assert payloads(frames) == [{"t": "stats", "s": 5, "snap": {"a": 5}}]
+
+    asyncio.run(main())
+
+
+def test_unchanged_refresh_does_not_bump_seq():
+    async def main():
+        hub, state = make_hub()
+        topic = hub.topics["stats"]
+        await hub.subscribe(LiveSubscriber(), topic)
+        await change(hub, state)
+        assert topic.seq == 1
+        assert len(topic.history) == 1
+
+    asyncio.run(main())
+
+
+def test_unsubscribed_topic_keeps_seq_continuous():
+    async def main():
+        hub, state = make_hub()
+        topic = hub.topics["stats"]
+        sub = LiveSubscriber()
+        await hub.subscribe(sub, topic)
+        hub.unsubscribe(sub)
+        state["a"] = 2
+        hub.touch("stats")
+        # 没有订阅者时只标记为脏，下次订阅再计算增量
+        await hub.flush()
+        assert topic.dirty and topic.seq == 1
+        frames = await hub.subscribe(LiveSubscriber(), topic, since=1, epoch=hub.epoch)
+        assert payloads(frames) == [{"t": "stats", "s": 2, "set": {"a": 2}}]
+
+    asyncio.run(main())
+
+
+def test_slow_subscriber_is_resynced():
+    async def main():
+        hub, state = make_hub()
+        topic = hub.topics["stats"]
+        sub = LiveSubscriber(maxsize=2)
+        await hub.subscribe(sub, topic)
+        for value in range(2, 5):
+            await change(hub, state, a=value)
+        frames, resync = await sub.get()
+        assert frames == [] and resync == {topic}
+
+    asyncio.run(main())
+
+
+def test_family_topics_are_per_key():
+    async def main():
+        hub = LiveHub(interval=0)
+        hub.register_family("instances", lambda key: lambda: {"owner": key})
+        alice, bob = hub.topic("instances", "1"), hub.topic("instances", "2")
+        assert alice is hub.topic("instances", "1") and alice is not bob
+        frames = await hub.subscribe(LiveSubscriber(), alice)
+        assert payloads(frames) == [{"t": "instances", "s": 1, "snap": {"owner": "1"}}]
+        hub.touch("instances")
+        assert alice.dirty and bob.dirty
+
+    asyncio.run(main())
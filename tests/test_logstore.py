@@ -0,0 +1,61 @@
+import importlib.util
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+LOGS = ROOT / "logs"
+
+# 包的 __init__ 会注册 entari 插件，这里直接按文件加载自包含的 logstore 模块
+_spec = importlib.util.spec_from_file_location("webui_logstore", ROOT / "entari_plugin_webui" / "logstore.py")
+logstore = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(logstore)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return logstore.LogStore(LOGS, tmp_path / "index")
+
+
+def test_describe_indexes_every_record(store):
+    files = {item["file"]: item for item in store.describe()}
+    assert set(files) == {p.name for p in LOGS.iterdir() if p.name.endswith((".log", ".log.zip"))}
+    for item in files.values():
+        assert item["records"] > 100
+        assert item["from"] <= item["to"]
+        assert time.localtime(item["from"]).tm_year == 2025
+    # 归档名中的轮转时间即第一条记录的时间
+    archive = files["latest.2025-09-09_18-31-08_569824.log.zip"]
+    assert time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(archive["from"])) == "2025-09-09 18:31:08"
+
+
+def test_search_by_level(store):
+    records, cursor = store.search(level=logstore.level_no("ERROR"), limit=20)
+    assert len(records) == 20 and cursor
+    assert all(record.level == "ERROR" for record in records)
+    assert all(record.text.split(" | ")[1].strip() == "ERROR" for record in records)
+    # 从新到旧
+    assert [r.time for r in records] == sorted((r.time for r in records), reverse=True)
+
+
+def test_search_by_name(store):
+    records, _ = store.search(name="lagrange", limit=50)
+    assert records
+    assert all(r.name == "lagrange" or r.name.startswith("lagrange.") for r in records)
+    assert not store.search(name="lagrange.net", limit=5)[0]
+
+
+def test_search_by_time_spans_archives(store):
+    start = int(time.mktime(time.strptime("2025-09-09 18:31:08", "%Y-%m-%d %H:%M:%S")))
+    records, _ = store.search(start=start, end=start + 1, limit=100)
+    assert records
+    assert {r.file for r in records} == {"latest.2025-09-09_18-31-08_569824.log.zip"}
+    assert all(r.time == start for r in records)
+
+
+def test_sidecar_index_is_reused(store, tmp_path):
+    store.describe()
+    assert list((tmp_path / "index").glob("*.zip.idx"))
+    fresh = logstore.LogStore(LOGS, tmp_path / "index")
+    assert [item["records"] for item in fresh.describe()] == [item["records"] for item in store.describe()]
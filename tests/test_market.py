@@ -0,0 +1,98 @@
+import asyncio
+
+from entari_plugin_webui.market import MarketEntry, MarketIndex, parse_catalog
+
+CATALOG = [
+    {"name": "entari-plugin-weather", "summary": "查询天气预报", "tags": ["weather", "tool"], "author": "alice"},
+    {"name": "entari-plugin-webhook", "summary": "Receive webhooks", "tags": ["tool"], "author": "bob"},
+    {"name": "entari-plugin-music", "summary": "Music search", "tags": ["fun"], "author": {"name": "carol"}},
+    {"name": "entari-plugin-server", "summary": "HTTP server for weather bots", "author": "bob"},
+]
+
+
+def make_index(tmp_path) -> MarketIndex:
+    index = MarketIndex(tmp_path / "market.json")
+    index.merge_catalog(parse_catalog(CATALOG))
+    return index
+
+
+def names(index: MarketIndex, q: str, **kwargs) -> list[str]:
+    _, entries = index.search(q, **kwargs)
+    return [entry.name for entry in entries]
+
+
+def test_exact_match_ranks_name_above_summary(tmp_path):
+    index = make_index(tmp_path)
+    # weather 同时出现在名称与 server 的简介中，名称权重更高
+    assert names(index, "weather") == ["entari-plugin-weather", "entari-plugin-server"]
+    assert names(index, "entari-plugin-music") == ["entari-plugin-music"]
+    assert names(index, "天气") == ["entari-plugin-weather"]
+
+
+def test_prefix_match(tmp_path):
+    index = make_index(tmp_path)
+    assert names(index, "web") == ["entari-plugin-webhook"]
+    assert names(index, "mus") == ["entari-plugin-music"]
+
+
+def test_exact_hits_outrank_prefix_hits(tmp_path):
+    index = make_index(tmp_path)
+    index.merge_catalog(parse_catalog([{"name": "entari-plugin-notes"}, {"name": "entari-plugin-note"}]))
+    assert names(index, "note") == ["entari-plugin-note", "entari-plugin-notes"]
+
+
+def test_fuzzy_match_tolerates_typos(tmp_path):
+    index = make_index(tmp_path)
+    assert names(index, "wether") == ["entari-plugin-weather", "entari-plugin-server"]
+    assert names(index, "musci") == []  # 三元组重合太少
+    assert names(index, "muisc") == []
+    assert names(index, "webhok") == ["entari-plugin-webhook"]
+    # 过短的词不做拼写容错
+    assert names(index, "mu") == ["entari-plugin-music"]
+    assert names(index, "xy") == []
+
+
+def test_multiple_terms_are_intersected(tmp_path):
+    index = make_index(tmp_path)
+    assert names(index, "bob weather") == ["entari-plugin-server"]
+    assert names(index, "bob music") == []
+
+
+def test_filters_and_paging(tmp_path):
+    index = make_index(tmp_path)
+    assert names(index, "", tag="tool") == ["entari-plugin-weather", "entari-plugin-webhook"]
+    total, entries = index.search("", page=2, size=3)
+    assert total == 4 and [entry.name for entry in entries] == ["entari-plugin-webhook"]
+    index.apply_installed({"entari-plugin-music": "1.0"}, {"entari-plugin-music": MarketEntry(name="entari-plugin-music", installed="1.0")})
+    assert names(index, "", installed=True) == ["entari-plugin-music"]
+
+
+def test_removed_entries_leave_index(tmp_path):
+    index = make_index(tmp_path)
+    meta = MarketEntry(name="entari-plugin-extra", summary="extra", installed="1.0")
+    index.apply_installed({"entari-plugin-extra": "1.0"}, {"entari-plugin-extra": meta})
+    assert names(index, "extra") == ["entari-plugin-extra"]
+    index.apply_installed({}, {})
+    assert names(index, "extra") == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = make_index(tmp_path)
+    index.save(index.dump())
+    assert not index.dirty
+    assert [p.name for p in tmp_path.iterdir()] == ["market.json"]
+    loaded = MarketIndex(index.path)
+    loaded.load()
+    assert loaded.entries == index.entries
+    assert names(loaded, "wether") == names(index, "wether")
+
+
+def test_lock_is_created_lazily(tmp_path):
+    index = make_index(tmp_path)
+    assert index._lock is None
+
+    async def main():
+        async with index.lock:
+            assert index.lock.locked()
+
+    asyncio.run(main())
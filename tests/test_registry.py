@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from entari_plugin_webui.registry import InstanceRegistry
+
+ROWS = [
+    {"id": 1, "user_id": 1, "filename": "a.yml", "state": "stopped", "plugins": ["echo"]},
+    {"id": 2, "user_id": 2, "filename": "b.yml", "state": "running", "plugins": []},
+]
+
+
+def make_registry(flush=None, **kwargs) -> tuple[InstanceRegistry, list]:
+    batches: list = []
+
+    async def record(rows):
+        batches.append(rows)
+
+    registry = InstanceRegistry(flush or record, **kwargs)
+    registry.load(ROWS)
+    return registry, batches
+
+
+def test_reads_come_from_memory():
+    registry, _ = make_registry()
+    assert registry.get(1).filename == "a.yml"
+    assert [r.id for r in registry.owned_by(2)] == [2]
+    assert [r.id for r in registry.in_states(["running"])] == [2]
+    assert list(registry.by_filename(["a.yml", "c.yml"])) == ["a.yml"]
+
+
+def test_only_changed_columns_are_written_with_latest_values():
+    registry, batches = make_registry()
+    assert registry.update(1, {"state": "running", "filename": "a.yml"})
+    assert registry.update(1, {"state": "error"})
+    assert registry.update(2, {"state": "running"})  # 值未变，不记为脏
+    assert not registry.update(3, {"state": "running"})
+    assert registry.pending() == 1
+    asyncio.run(registry.flush())
+    assert batches == [[{"id": 1, "state": "error"}]]
+    assert registry.pending() == 0
+    asyncio.run(registry.flush())
+    assert len(batches) == 1
+
+
+def test_flushed_values_are_copies():
+    registry, batches = make_registry()
+    plugins = ["echo", "help"]
+    registry.update(1, {"plugins": plugins})
+    plugins.append("mutated")
+    assert registry.get(1).plugins == ["echo", "help"]
+    asyncio.run(registry.flush())
+    registry.get(1).plugins.append("later")
+    assert batches == [[{"id": 1, "plugins": ["echo", "help"]}]]
+
+
+def test_failed_flush_merges_dirty_columns_back():
+    calls = []
+
+    async def flush(rows):
+        calls.append(rows)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+
+    async def main():
+        registry, _ = make_registry(flush)
+        registry.update(1, {"state": "running"})
+        with pytest.raises(RuntimeError):
+            await registry.flush()
+        registry.update(1, {"plugins": []})
+        await registry.flush()
+        assert registry.flushes == 1
+
+    asyncio.run(main())
+    assert calls[1] == [{"id": 1, "plugins": [], "state": "running"}]
+
+
+def test_removed_rows_are_not_written():
+    registry, batches = make_registry()
+    registry.update(1, {"state": "running"})
+    registry.update(2, {"state": "stopped"})
+    registry.remove(2)
+    asyncio.run(registry.flush())
+    assert batches == [[{"id": 1, "state": "running"}]]
+
+
+def test_row_removed_during_failed_flush_is_dropped():
+    async def flush(rows):
+        registry.remove(1)
+        raise RuntimeError("database is locked")
+
+    registry, _ = make_registry(flush)
+    registry.update(1, {"state": "running"})
+    with pytest.raises(RuntimeError):
+        asyncio.run(registry.flush())
+    assert registry.pending() == 0
+
+
+def test_put_and_load_clear_dirty_state():
+    registry, _ = make_registry()
+    registry.update(1, {"state": "running"})
+    registry.put({**ROWS[0], "state": "stopped"})
+    assert registry.pending() == 0 and registry.get(1).state == "stopped"
+    registry.update(2, {"state": "stopped"})
+    registry.load(ROWS)
+    assert registry.pending() == 0
+
+
+def test_background_task_wakes_on_max_dirty_and_flushes_on_stop():
+    async def main():
+        registry, batches = make_registry(interval=60, max_dirty=2)
+        registry.start()
+        registry.update(1, {"state": "running"})
+        await asyncio.sleep(0.05)
+        assert batches == []
+        registry.update(2, {"state": "stopped"})
+        for _ in range(100):
+            if batches:
+                break
+            await asyncio.sleep(0.01)
+        assert batches == [[{"id": 1, "state": "running"}, {"id": 2, "state": "stopped"}]]
+        registry.update(1, {"state": "error"})
+        await registry.stop()
+        assert batches[-1] == [{"id": 1, "state": "error"}]
+
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field
+from typing import Literal, Optional
+
+from entari_plugin_webui.reload import (
+    ConfigReloader,
+    check_fields,
+    diff_plugins,
+    normalize_plugins,
+    plugin_section_key,
+)
+
+
+def plan(old: dict, new: dict) -> list[tuple[str, str, list[str], Optional[bool]]]:
+    changes = diff_plugins(normalize_plugins({"plugins": old}), normalize_plugins({"plugins": new}))
+    return [(c.name, c.action, c.keys, c.enable) for c in changes]
+
+
+def test_normalize_prefixes_and_metadata():
+    doc = {"entari": {"plugins": {"$prelude": ["a"], "~a": None, "?b": {"x": 1}, "c": {}}}}
+    assert normalize_plugins(doc) == {"a": {"$disable": True}, "b": {"x": 1, "$optional": True}, "c": {}}
+    assert plugin_section_key(doc, "a") == "~a"
+    assert plugin_section_key(doc, "b") == "?b"
+    assert plugin_section_key(doc, "d") is None
+
+
+def test_unchanged_plugins_are_skipped():
+    assert plan({"a": {"x": 1}}, {"a": {"x": 1}}) == []
+    # entari 运行时写入的 $path 不算变化
+    assert plan({"a": {"x": 1, "$path": "p"}}, {"a": {"x": 1}}) == []
+
+
+def test_changes_are_ordered_unload_reconfigure_load():
+    old = {"a": {}, "b": {"x": 1}}
+    new = {"c": {}, "b": {"x": 2, "y": 1}}
+    assert plan(old, new) == [
+        ("a", "unload", [], None),
+        ("b", "reconfigure", ["x", "y"], None),
+        ("c", "load", [], None),
+    ]
+
+
+def test_disable_prefix_toggles():
+    assert plan({"a": {}}, {"~a": {}}) == [("a", "toggle", [], False)]
+    assert plan({"~a": {}}, {"a": {}}) == [("a", "toggle", [], True)]
+    # 同时修改配置与启停状态时归为重新配置，并带上目标状态
+    assert plan({"a": {"x": 1}}, {"~a": {"x": 2}}) == [("a", "reconfigure", ["x"], False)]
+    # 新增但处于停用状态的插件仍需加载，只是不启用
+    assert plan({}, {"~a": {}}) == [("a", "load", [], False)]
+
+
+def test_optional_plugins_are_not_loaded():
+    assert plan({}, {"?a": {}}) == []
+    assert plan({"?a": {"x": 1}}, {"?a": {"x": 2}}) == [("a", "reconfigure", ["x"], None)]
+
+
+def test_dry_plugins_are_not_reconfigured():
+    assert plan({"a": {"x": 1}}, {"a": {"x": 2, "$dry": True}}) == []
+    assert plan({"a": {"$dry": True}}, {"a": {}}) == []
+    assert plan({"a": {"$dry": True}}, {"a": {"$dry": True, "$disable": True}}) == [("a", "toggle", [], False)]
+
+
+def test_reloader_plans_against_remembered_copy():
+    reloader = ConfigReloader()
+    doc = {"plugins": {"a": {"x": 1}}}
+    reloader.remember(doc)
+    doc["plugins"]["a"]["x"] = 2
+    assert [c.action for c in reloader.plan(doc)] == ["reconfigure"]
+    assert [c.action for c in ConfigReloader().plan(doc)] == ["load"]
+
+
+@dataclass
+class Inner:
+    port: int = 0
+
+
+@dataclass
+class Model:
+    name: str = ""
+    count: int = 0
+    ratio: float = 0.0
+    enabled: bool = False
+    mode: Literal["a", "b"] = "a"
+    tags: list[str] = field(default_factory=list)
+    extra: Optional[dict] = None
+    inner: Inner = field(default_factory=Inner)
+
+
+def test_check_fields_accepts_valid_values():
+    data = {
+        "name": "x",
+        "count": 1,
+        "ratio": 1,
+        "enabled": True,
+        "mode": "b",
+        "tags": ["t"],
+        "extra": None,
+        "inner": {"port": 1},
+        "unknown": object(),
+        "$disable": True,
+    }
+    assert check_fields(Model, data) == {}
+
+
+def test_check_fields_reports_type_errors():
+    errors = check_fields(
+        Model,
+        {"name": 1, "count": True, "enabled": "yes", "mode": "c", "tags": ["t", 1], "extra": [], "inner": {"port": "x"}},
+    )
+    assert set(errors) == {"name", "count", "enabled", "mode", "tags", "extra", "inner"}
+    assert errors["tags"].startswith("[1]")
+    assert errors["inner"].startswith("port:")
+
+
+def test_check_fields_ignores_non_dataclass_models():
+    assert check_fields(dict, {"a": 1}) == {}
+
+
+def test_failed_plugins_keep_previous_baseline():
+    reloader = ConfigReloader()
+    reloader.remember({"plugins": {"a": {"x": 1}, "~b": {}}})
+    doc = {"plugins": {"a": {"x": 2}, "b": {"y": 1}, "c": {}}}
+    reloader.remember(doc, ["b", "c"])
+    # a 已生效；b 的修改与 c 的加载失败，下次重载时仍计入差异
+    assert [(c.name, c.action) for c in reloader.plan(doc)] == [("b", "reconfigure"), ("c", "load")]
+    assert reloader.applied["plugins"] == {"a": {"x": 2}, "~b": {}}
+
+
+def test_lock_is_created_lazily():
+    reloader = ConfigReloader()
+    assert reloader._lock is None
+    assert reloader.lock is reloader.lock
@@ -0,0 +1,150 @@
+import asyncio
+import sys
+
+from entari_plugin_webui.tasks import InstallTask, PipScheduler, parse_progress
+
+
+class ScriptScheduler(PipScheduler):
+    """用一段 Python 脚本代替真实的 pip 进程"""
+
+    scripts = {
+        "ok": "print('Collecting demo'); print('Successfully installed demo-1.0')",
+        "slow": "import time; print('Collecting demo', flush=True); time.sleep(30)",
+        "fail": "import sys; print('ERROR: no matching distribution'); sys.exit(1)",
+    }
+
+    @staticmethod
+    def command(task: InstallTask) -> list[str]:
+        return [sys.executable, "-c", ScriptScheduler.scripts[task.plugin_id]]
+
+
+async def wait_for(predicate, timeout: float = 10):
+    for _ in range(int(timeout / 0.02)):
+        if predicate():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("等待超时")
+
+
+def test_parse_progress_never_goes_back():
+    assert parse_progress("Collecting demo", 0) == 15
+    assert parse_progress("Collecting other", 75) == 75
+    assert parse_progress("unrelated", 40) == 40
+
+
+def test_duplicate_submit_reuses_unfinished_task():
+    async def main():
+        scheduler = ScriptScheduler({})
+        first = scheduler.submit("install", "slow")
+        assert scheduler.submit("install", "slow") is first
+        # 动作不同视为不同任务
+        other = scheduler.submit("uninstall", "slow")
+        assert other is not first
+        for task in (first, other):
+            await scheduler.cancel(task.task_id)
+        await wait_for(lambda: first.finished and other.finished)
+        # 结束后再提交会新建任务
+        again = scheduler.submit("install", "slow")
+        assert again is not first
+        await scheduler.cancel(again.task_id)
+        await wait_for(lambda: again.finished)
+
+    asyncio.run(main())
+
+
+def test_success_and_failure_are_reported():
+    finished = []
+
+    async def on_finish(task):
+        finished.append((task.plugin_id, task.status))
+
+    async def main():
+        scheduler = ScriptScheduler({}, on_finish=on_finish)
+        ok = scheduler.submit("install", "ok")
+        fail = scheduler.submit("install", "fail")
+        await wait_for(lambda: ok.finished and fail.finished)
+        assert (ok.status, ok.percent) == ("success", 100)
+        assert "Successfully installed" in ok.log
+        assert fail.status == "failed"
+        assert fail.percent < 100
+
+    asyncio.run(main())
+    assert sorted(finished) == [("fail", "failed"), ("ok", "success")]
+
+
+def test_cancel_kills_running_process_and_notifies():
+    async def main():
+        scheduler = ScriptScheduler({})
+        task = scheduler.submit("install", "slow")
+        queue = scheduler.subscribe(task.task_id)
+        await wait_for(lambda: task.percent == 15)
+        proc = scheduler._procs[task.task_id]
+        assert await scheduler.cancel(task.task_id)
+        await wait_for(lambda: task.finished)
+        assert task.status == "cancelled"
+        assert proc.returncode is not None
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        assert events[-1]["status"] == "cancelled"
+        # 已结束的任务不能再取消
+        assert not await scheduler.cancel(task.task_id)
+        assert not await scheduler.cancel("missing")
+
+    asyncio.run(main())
+
+
+def test_concurrency_limit_queues_tasks():
+    async def main():
+        scheduler = ScriptScheduler({}, concurrency=1)
+        first = scheduler.submit("install", "slow")
+        second = scheduler.submit("uninstall", "slow")
+        await wait_for(lambda: first.status == "running")
+        await asyncio.sleep(0.1)
+        assert second.status == "pending"
+        await scheduler.cancel(first.task_id)
+        await wait_for(lambda: second.status == "running")
+        await scheduler.cancel(second.task_id)
+        await wait_for(lambda: second.finished)
+
+    asyncio.run(main())
+
+
+def test_shutdown_kills_process_but_keeps_task_unfinished():
+    finished = []
+
+    async def on_finish(task):
+        finished.append(task.task_id)
+
+    async def main():
+        scheduler = ScriptScheduler({}, on_finish=on_finish)
+        task = scheduler.submit("install", "slow")
+        await wait_for(lambda: task.task_id in scheduler._procs)
+        proc = scheduler._procs[task.task_id]
+        scheduler.shutdown()
+        await wait_for(lambda: not scheduler._runners)
+        assert proc.returncode is not None
+        # 未完成的任务保持原状，下次启动时重新排队
+        assert task.status == "running" and not task.finished
+
+    asyncio.run(main())
+    assert finished == []
+
+
+def test_evict_runs_callback_in_tracked_task():
+    evicted = []
+
+    async def on_evict(task_ids):
+        evicted.extend(task_ids)
+
+    async def main():
+        old = InstallTask("old", "demo", status="success", finished_at=1.0)
+        fresh = InstallTask("fresh", "demo", status="pending")
+        scheduler = ScriptScheduler({"old": old, "fresh": fresh}, ttl=60, on_evict=on_evict)
+        scheduler.evict()
+        assert list(scheduler.tasks) == ["fresh"]
+        assert len(scheduler._background) == 1
+        await wait_for(lambda: not scheduler._background)
+
+    asyncio.run(main())
+    assert evicted == ["old"]